@@ -2,8 +2,12 @@
 from flask import Flask, request, jsonify
 from flask_cors import CORS
 import os
+import uuid
 import warnings
 from services.chat_service import ChatService
+from services.warmup import WarmupManager
+from utils.embedding_cache import embedding_cache_stats
+from utils.model_registry import registry
 
 warnings.filterwarnings("ignore")
 
@@ -11,6 +15,23 @@ app = Flask(__name__)
 CORS(app, resources={r"/api/*": {"origins": "*"}})
 chat_service = ChatService()
 
+# Models and indexes load in the background so the worker can answer liveness
+# checks immediately; /readyz reports when it is warm enough to take traffic.
+warmup = WarmupManager(chat_service.warmup_steps())
+if os.getenv("WARMUP_ON_START", "1") != "0":
+    warmup.start()
+
+@app.route('/healthz', methods=['GET'])
+def healthz():
+    return jsonify({'status': 'ok'})
+
+@app.route('/readyz', methods=['GET'])
+def readyz():
+    status = warmup.status()
+    status['models'] = registry.status()
+    status['embedding_cache'] = embedding_cache_stats()
+    return jsonify(status), 200 if status['ready'] else 503
+
 @app.route('/api/chat', methods=['POST'])
 def chat():
     try:
@@ -42,12 +63,21 @@ def chat():
                 'error': 'Message must be a non-empty string'
             }), 400
             
-        response = chat_service.generate_response(user_input)
+        session_id = data.get('session_id') or uuid.uuid4().hex
+
+        if not isinstance(session_id, str) or len(session_id) > 128:
+            return jsonify({
+                'success': False,
+                'error': 'session_id must be a string of at most 128 characters'
+            }), 400
+            
+        response = chat_service.generate_response(user_input, session_id=session_id)
         
         return jsonify({
             'success': True,
             'data': {
-                'response': response
+                'response': response,
+                'session_id': session_id
             }
         })
         
@@ -57,6 +87,19 @@ def chat():
             'error': str(e)
         }), 500
 
+@app.route('/api/insights', methods=['GET'])
+def insights():
+    try:
+        return jsonify({
+            'success': True,
+            'data': chat_service.get_learning_insights()
+        })
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
 @app.route('/api/update_responses', methods=['POST'])
 def update_responses():
     """Update responses for a specific topic"""
@@ -0,0 +1,97 @@
+"""Recall vs latency of the FAISS index types in utils.ann_index.
+
+Embeds nothing: uses synthetic clustered unit vectors of sentence-embedding
+size so the sweep runs anywhere. Exhaustive flat search provides the ground
+truth; each approximate index is swept over its query-time knob and reports
+recall@k, single-query latency and index size, so a setting can be chosen per
+corpus size.
+
+    python -m script.benchmark_ann [--sizes 100000 1000000] [--dim 384] [--queries 500]
+"""
+import argparse
+import statistics
+import time
+
+import faiss
+import numpy as np
+
+from utils.ann_index import build_index, configure_search
+
+SWEEPS = {
+    "hnsw": ("ef_search", [16, 32, 64, 128, 256]),
+    "ivf_flat": ("nprobe", [1, 4, 16, 64]),
+    "ivf_pq": ("nprobe", [4, 16, 64]),
+    "sq8": (None, [None]),
+    "ivf_sq8": ("nprobe", [4, 16, 64]),
+}
+
+
+def make_vectors(n: int, dim: int, rng: np.random.Generator, n_clusters: int = 1000) -> np.ndarray:
+    centers = rng.standard_normal((n_clusters, dim), dtype=np.float32)
+    vectors = centers[rng.integers(0, n_clusters, n)] + 0.6 * rng.standard_normal((n, dim), dtype=np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors
+
+
+def search_latencies(index: faiss.Index, queries: np.ndarray, k: int):
+    latencies = []
+    results = np.empty((len(queries), k), dtype=np.int64)
+    for i in range(len(queries)):
+        start = time.perf_counter()
+        _, ids = index.search(queries[i:i + 1], k)
+        latencies.append((time.perf_counter() - start) * 1000)
+        results[i] = ids[0]
+    latencies.sort()
+    return results, statistics.median(latencies), latencies[int(len(latencies) * 0.95) - 1]
+
+
+def recall_at_k(results: np.ndarray, truth: np.ndarray) -> float:
+    return float(np.mean([len(set(r) & set(t)) / len(t) for r, t in zip(results, truth)]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100000, 1000000])
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--types", nargs="+", default=list(SWEEPS))
+    parser.add_argument("--threads", type=int, default=1, help="FAISS OpenMP threads for searches")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    build_threads = faiss.omp_get_max_threads()
+    for size in sorted(args.sizes):
+        vectors = make_vectors(size + args.queries, args.dim, rng)
+        corpus, queries = vectors[:size], vectors[size:]
+
+        faiss.omp_set_num_threads(args.threads)
+        flat = build_index(corpus, "flat")
+        truth, p50, p95 = search_latencies(flat, queries, args.k)
+        print(f"\n{size} vectors x {args.dim} dims, recall@{args.k} against flat search")
+        print(f"{'index':<10} {'setting':<14} {'recall':>7} {'p50 ms':>8} {'p95 ms':>8} {'MB':>8} {'build s':>8}")
+        print(f"{'flat':<10} {'-':<14} {1.0:>7.3f} {p50:>8.3f} {p95:>8.3f} "
+              f"{faiss.serialize_index(flat).nbytes / 1024 ** 2:>8.0f} {'-':>8}")
+        del flat
+
+        for index_type in args.types:
+            knob, values = SWEEPS[index_type]
+            faiss.omp_set_num_threads(build_threads)
+            start = time.perf_counter()
+            index = build_index(corpus, index_type)
+            build_seconds = time.perf_counter() - start
+            size_mb = faiss.serialize_index(index).nbytes / 1024 ** 2
+            faiss.omp_set_num_threads(args.threads)
+            for value in values:
+                if knob:
+                    configure_search(index, **{knob: value})
+                results, p50, p95 = search_latencies(index, queries, args.k)
+                setting = f"{knob}={value}" if knob else "-"
+                print(f"{index_type:<10} {setting:<14} {recall_at_k(results, truth):>7.3f} {p50:>8.3f} "
+                      f"{p95:>8.3f} {size_mb:>8.0f} {build_seconds:>8.1f}")
+            del index
+
+
+if __name__ == "__main__":
+    main()
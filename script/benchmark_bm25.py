@@ -0,0 +1,64 @@
+"""Build time, index size and query latency of the BM25 index at several corpus sizes.
+
+Uses the synthetic counselling-style corpus from benchmark_retrieval, builds
+each index into a temporary directory, reopens it memory-mapped and times
+top-5 queries.
+
+    python -m script.benchmark_bm25 [--sizes 100000 1000000] [--queries 500]
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+from types import SimpleNamespace
+
+from script.benchmark_retrieval import make_question, perturb
+from utils.bm25_index import BM25Index, build_bm25_index, published_dir
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100000, 1000000])
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in sorted(args.sizes):
+            questions = [make_question(rng) for _ in range(size)]
+            docs = (SimpleNamespace(page_content=f"Question: {q}\nAnswer: answer {i}")
+                    for i, q in enumerate(questions))
+            index_dir = os.path.join(tmp, f"bm25_{size}")
+
+            start = time.perf_counter()
+            build_bm25_index(docs, index_dir)
+            build_seconds = time.perf_counter() - start
+            version_dir = published_dir(index_dir)
+            index_mb = sum(os.path.getsize(os.path.join(version_dir, f)) for f in os.listdir(version_dir)) / 1024 ** 2
+
+            start = time.perf_counter()
+            index = BM25Index(index_dir)
+            open_ms = (time.perf_counter() - start) * 1000
+
+            targets = [rng.randrange(size) for _ in range(args.queries)]
+            queries = [perturb(questions[t], rng) for t in targets]
+            latencies = []
+            hits = 0
+            for target, query in zip(targets, queries):
+                start = time.perf_counter()
+                results = index.search(query, k=5)
+                latencies.append((time.perf_counter() - start) * 1000)
+                hits += any(doc_id == target for doc_id, _, _ in results)
+            latencies.sort()
+            print(f"{size:>9} docs: build {build_seconds:.1f}s, {index_mb:.0f} MB on disk, open {open_ms:.1f} ms, "
+                  f"search p50 {statistics.median(latencies):.3f} ms, "
+                  f"p95 {latencies[int(len(latencies) * 0.95) - 1]:.3f} ms, "
+                  f"target in top 5: {hits}/{len(queries)}")
+            index.close()
+
+
+if __name__ == "__main__":
+    main()
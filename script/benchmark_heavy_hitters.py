@@ -0,0 +1,75 @@
+"""Compare sketch-based top-k topics/bigrams with exact counts on a replayed corpus.
+
+Replays user messages (data/conversations by default, or a text file with one
+message per line) through both counter modes of ConversationStats and reports
+top-k overlap, the largest count error among the reported keys, and the
+documented error bounds. Exits non-zero if any sketch estimate breaks the
+Space-Saving bound.
+
+    python -m script.benchmark_heavy_hitters [--messages file.txt] [--budget 65536] [--repeat 20]
+"""
+import argparse
+import re
+import sys
+import tempfile
+
+from services.conversation_log import ConversationLog
+from services.conversation_stats import ConversationStats
+
+
+def load_messages(path: str = None):
+    if path:
+        with open(path, 'r', encoding='utf-8') as f:
+            return [line.strip() for line in f if line.strip()]
+    log = ConversationLog("data/conversations")
+    return [m["content"] for session in log.read_sessions().values()
+            for m in session["conversation"] if m["role"] == "user"]
+
+
+def replay(stats: ConversationStats, messages, repeat: int):
+    for _ in range(repeat):
+        for message in messages:
+            words = re.findall(r'\w+', message.lower())
+            stats.record_terms(
+                [w for w in words if len(w) > 3],
+                [f"{words[i]} {words[i+1]}" for i in range(len(words) - 1)]
+            )
+
+
+def compare(name, exact, sketch, k):
+    exact_top = exact.most_common(k)
+    sketch_top = sketch.most_common(k)
+    overlap = len({key for key, _ in exact_top} & {key for key, _ in sketch_top})
+    max_error = max((count - exact[key] for key, count in sketch_top), default=0)
+    bound = sketch.summary.error_bound()
+    print(f"{name}: {len(exact)} distinct exact, {len(sketch)} tracked by sketch")
+    print(f"  top-{k} overlap: {overlap}/{len(exact_top)}")
+    print(f"  max overestimate in sketch top-{k}: {max_error} (Space-Saving bound {bound:.1f})")
+    print(f"  count-min bound: {sketch.sketch.error_bound():.1f}")
+    return max_error <= bound
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", help="file with one message per line")
+    parser.add_argument("--budget", type=int, default=64 * 1024, help="sketch memory budget in bytes")
+    parser.add_argument("--repeat", type=int, default=20, help="times to replay the corpus")
+    parser.add_argument("--top", type=int, default=10)
+    args = parser.parse_args()
+
+    messages = load_messages(args.messages)
+    with tempfile.TemporaryDirectory() as tmp:
+        exact = ConversationStats(f"{tmp}/exact.json", top_k=args.top)
+        sketch = ConversationStats(f"{tmp}/sketch.json", top_k=args.top,
+                                   counter_mode="sketch", sketch_bytes=args.budget)
+    replay(exact, messages, args.repeat)
+    replay(sketch, messages, args.repeat)
+
+    print(f"{len(messages)} messages x {args.repeat} replays, budget {args.budget} bytes per counter")
+    ok = compare("topics", exact.topics, sketch.topics, args.top)
+    ok = compare("patterns", exact.patterns, sketch.patterns, args.top) and ok
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""Per-query latency of DocumentRetrievalService.search at several corpus sizes.
+
+Generates synthetic counselling-style Q&A corpora, measures load time,
+corpus memory and indexed search latency at each size, and checks the indexed search against
+the linear difflib scorer on the smallest corpus.
+
+    python -m script.benchmark_retrieval [--sizes 10000 100000 1000000] [--queries 200]
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import tempfile
+import time
+
+from services.document_retrieval import DocumentRetrievalService
+
+OPENERS = ["how can i", "why do i", "what should i do when i", "is it normal to", "how do i stop",
+           "what helps when i", "why can't i", "how should i"]
+VERBS = ["feel", "handle", "cope with", "talk about", "deal with", "manage", "stop", "understand"]
+OBJECTS = ["anxiety", "panic attacks", "stress at work", "loneliness", "grief", "low self-esteem",
+           "overthinking", "insomnia", "burnout", "social anxiety", "anger", "a breakup",
+           "exam pressure", "intrusive thoughts", "my family", "my partner", "sadness", "guilt"]
+CONTEXTS = ["at night", "every morning", "after work", "at school", "around people", "on weekends",
+            "when i am alone", "during exams", "since last year", "all the time", "", ""]
+
+
+def make_question(rng: random.Random) -> str:
+    parts = [rng.choice(OPENERS), rng.choice(VERBS), rng.choice(OBJECTS), rng.choice(CONTEXTS),
+             f"#{rng.randint(0, 10 ** 6)}"]
+    return " ".join(p for p in parts if p) + "?"
+
+
+def perturb(question: str, rng: random.Random) -> str:
+    words = question.split()
+    if len(words) > 3 and rng.random() < 0.5:
+        words.pop(rng.randrange(len(words)))
+    if rng.random() < 0.5:
+        i = rng.randrange(len(words))
+        words[i] = words[i][::-1]
+    return " ".join(words)
+
+
+def write_corpus(path: str, size: int, rng: random.Random):
+    questions = []
+    with open(path, 'w', encoding='utf-8') as f:
+        for i in range(size):
+            question = make_question(rng)
+            questions.append(question)
+            f.write(json.dumps({"question": question, "answer": f"answer {i}"}) + "\n")
+    return questions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000, 1000000])
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    with tempfile.TemporaryDirectory() as tmp:
+        for index, size in enumerate(sorted(args.sizes)):
+            path = os.path.join(tmp, f"corpus_{size}.jsonl")
+            questions = write_corpus(path, size, rng)
+
+            start = time.perf_counter()
+            service = DocumentRetrievalService(path)
+            load_seconds = time.perf_counter() - start
+
+            queries = [perturb(rng.choice(questions), rng) for _ in range(args.queries // 2)]
+            queries += [make_question(rng) for _ in range(args.queries - len(queries))]
+
+            latencies = []
+            for query in queries:
+                start = time.perf_counter()
+                service.search(query)
+                latencies.append((time.perf_counter() - start) * 1000)
+            latencies.sort()
+            compact_path = os.path.join(tmp, f"compact_{size}")
+            DocumentRetrievalService(path, compact_path=compact_path)
+            start = time.perf_counter()
+            DocumentRetrievalService(path, compact_path=compact_path)
+            mmap_seconds = time.perf_counter() - start
+            corpus_mb = (service.questions.nbytes + service.answers.nbytes) / 1024 ** 2
+
+            print(f"{size:>9} pairs: load {load_seconds:.1f}s (mmap reload {mmap_seconds:.1f}s), "
+                  f"corpus {corpus_mb:.1f} MB, "
+                  f"search p50 {statistics.median(latencies):.2f} ms, "
+                  f"p95 {latencies[int(len(latencies) * 0.95) - 1]:.2f} ms")
+
+            if index == 0:
+                mismatches = [q for q in queries if service.search(q) != service._search_linear(q)]
+                assert not mismatches, f"search differs from the linear scorer for {len(mismatches)} queries, e.g. {mismatches[:3]}"
+                print(f"{'':>9} equivalence with linear scorer: {len(queries)}/{len(queries)} queries")
+
+
+if __name__ == "__main__":
+    main()
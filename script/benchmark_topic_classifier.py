@@ -0,0 +1,109 @@
+"""Agreement benchmark: prototype topic classifier vs. zero-shot bart-large-mnli.
+
+Runs both classifiers over user messages from the conversation log (read
+through ConversationLog) plus a set of off-topic questions, and reports how
+often the prototype decision agrees with the zero-shot decision at each
+candidate threshold, with per-message latency. Latency is timed on the
+models themselves, not through the request micro-batcher, so its batching
+window is not counted.
+
+    python -m script.benchmark_topic_classifier [--messages file.txt] [--conversations data/conversations]
+"""
+import argparse
+import time
+
+from services.conversation_log import ConversationLog
+from utils.model_registry import ZERO_SHOT_CLASSIFIER, get_model
+from utils.topic_checker import (
+    CANDIDATE_LABELS,
+    MENTAL_HEALTH_LABELS,
+    TOPIC_PROTOTYPE_CLASSIFIER,
+    ZERO_SHOT_THRESHOLD,
+    contains_mental_health_keywords
+)
+
+OFF_TOPIC_MESSAGES = [
+    "What is the capital of Australia?",
+    "How do I change a flat tire?",
+    "Who won the NBA finals last year?",
+    "Recommend a sci-fi movie",
+    "How does a nuclear reactor generate electricity?",
+    "When was the Roman Empire founded?",
+    "What's the weather like in Tokyo in April?",
+    "Write a python function to reverse a list",
+    "How many players are on a soccer team?",
+    "What is the tallest building in the world?",
+    "Explain quantum entanglement simply",
+    "Best pizza toppings?"
+]
+
+THRESHOLDS = [0.2, 0.25, 0.3, 0.35, 0.4, 0.45, 0.5]
+
+
+def load_messages(path: str = None, conversations_dir: str = "data/conversations"):
+    if path:
+        with open(path, 'r', encoding='utf-8') as f:
+            return [line.strip() for line in f if line.strip()]
+
+    # Log segments and any legacy per-turn snapshots, as the app stores them
+    messages = []
+    for session in ConversationLog(conversations_dir).read_sessions().values():
+        messages.extend(m["content"] for m in session["conversation"] if m.get("role") == "user")
+    return list(dict.fromkeys(messages + OFF_TOPIC_MESSAGES))
+
+
+def classify(message, mode):
+    """One classify_topic result from the model directly"""
+    if mode == "prototype":
+        return get_model(TOPIC_PROTOTYPE_CLASSIFIER).score_batch([message])[0]
+    return get_model(ZERO_SHOT_CLASSIFIER)(message, candidate_labels=CANDIDATE_LABELS)
+
+
+def run(messages, mode):
+    results = []
+    start = time.perf_counter()
+    for message in messages:
+        results.append(classify(message, mode))
+    elapsed = time.perf_counter() - start
+    return results, elapsed / max(len(messages), 1)
+
+
+def report(name, messages, zero_shot, prototype):
+    reference = [r["labels"][0] in MENTAL_HEALTH_LABELS and r["scores"][0] > ZERO_SHOT_THRESHOLD for r in zero_shot]
+    print(f"\n{name}: {len(messages)} messages, {sum(reference)} on-topic by zero-shot")
+    print(f"{'threshold':>10} {'agreement':>10} {'precision':>10} {'recall':>8}")
+    for threshold in THRESHOLDS:
+        predicted = [r["labels"][0] in MENTAL_HEALTH_LABELS and r["scores"][0] > threshold for r in prototype]
+        agree = sum(p == r for p, r in zip(predicted, reference))
+        true_pos = sum(p and r for p, r in zip(predicted, reference))
+        precision = true_pos / max(sum(predicted), 1)
+        recall = true_pos / max(sum(reference), 1)
+        print(f"{threshold:>10.2f} {agree / max(len(messages), 1):>10.1%} {precision:>10.1%} {recall:>8.1%}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", help="file with one message per line")
+    parser.add_argument("--conversations", default="data/conversations", help="conversation log directory")
+    args = parser.parse_args()
+
+    messages = load_messages(args.messages, args.conversations)
+    # Warm both models so load time is not counted as latency
+    classify("warmup", "zero-shot")
+    classify("warmup", "prototype")
+
+    zero_shot, zero_shot_latency = run(messages, "zero-shot")
+    prototype, prototype_latency = run(messages, "prototype")
+    print(f"zero-shot latency: {zero_shot_latency * 1000:.1f} ms/message")
+    print(f"prototype latency: {prototype_latency * 1000:.1f} ms/message")
+
+    report("all messages", messages, zero_shot, prototype)
+
+    # Only messages without keywords ever reach the classifier in is_mental_health_topic
+    misses = [i for i, m in enumerate(messages) if not contains_mental_health_keywords(m)]
+    report("keyword misses", [messages[i] for i in misses],
+           [zero_shot[i] for i in misses], [prototype[i] for i in misses])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+"""Check that syncing an unchanged, enriched corpus is a no-op.
+
+Builds a vector store from a small JSONL dataset with enrichment on, then
+syncs it against the same dataset and expects no additions or removals and
+the labels still in place; then edits one record and expects exactly one
+replacement, labelled like the rest. Then builds a store from files with
+near-duplicate chunks, adds a copy of a file and removes it again, and
+expects the provenance this records to leave document ids unchanged and the
+rebuilds to add and remove nothing. Embeddings and classifiers are
+deterministic stand-ins so the check runs anywhere; it exercises document
+ids and sync, not model quality.
+
+    python -m script.check_incremental_sync
+"""
+import hashlib
+import json
+import os
+import tempfile
+from typing import List
+
+from langchain_core.embeddings import Embeddings
+
+from services.retrieval_service import MentalHealthRetrievalService
+from utils.index_builder import IndexBuildPipeline
+from utils.enrichment import KNOWLEDGE_TOPIC_CLASSIFIER
+from utils.model_registry import EMOTION_CLASSIFIER, registry
+
+DIM = 16
+
+
+class HashEmbeddings(Embeddings):
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self.embed_query(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        digest = hashlib.blake2b(text.encode("utf-8"), digest_size=DIM).digest()
+        return [b / 255.0 for b in digest]
+
+
+def keyword_emotions(texts, **kwargs):
+    return [[{"label": "sadness" if "sad" in text else "neutral", "score": 0.9}] for text in texts]
+
+
+class KeywordTopics:
+    def score_batch(self, texts):
+        return [{"labels": ["sleep", "anxiety"] if "sleep" in text else ["anxiety", "sleep"],
+                 "scores": [0.8, 0.2]} for text in texts]
+
+
+def write_dataset(path: str, edited: bool = False):
+    with open(path, "w", encoding="utf-8") as f:
+        for i in range(200):
+            question = f"Question {i}: I feel sad" if i % 2 else f"Question {i}: I cannot sleep"
+            answer = f"Answer {i}" + (" (revised)" if edited and i == 7 else "")
+            record = {"question": question, "answer": answer}
+            if i % 5 == 0:
+                record["topic"] = "grief"
+            f.write(json.dumps(record) + "\n")
+
+
+def paragraph(i: int, variant: bool = False) -> str:
+    words = [f"word{i}x{j}" for j in range(60)]
+    if variant:
+        words[30] = "changed"
+    return f"Paragraph {i} " + " ".join(words)
+
+
+def stored_docs(service: MentalHealthRetrievalService) -> dict:
+    store = service.vector_store
+    return {doc_id: store.docstore.search(doc_id) for doc_id in store.index_to_docstore_id.values()}
+
+
+def check_near_duplicates(root: str):
+    data_dir = os.path.join(root, "resources")
+    os.makedirs(data_dir)
+    text = "\n\n".join(paragraph(i) for i in range(5))
+    with open(os.path.join(data_dir, "a.txt"), "w", encoding="utf-8") as f:
+        f.write(text)
+    # A near-duplicate of paragraph 0 in another file
+    with open(os.path.join(data_dir, "b.txt"), "w", encoding="utf-8") as f:
+        f.write(paragraph(0, variant=True))
+    service = MentalHealthRetrievalService(os.path.join(root, "resources_store"), reload_interval=0,
+                                           load_local_data=False, enrich=False, embeddings=HashEmbeddings())
+
+    def build(step: str) -> dict:
+        output_dir = os.path.join(root, f"build-{step}")
+        stats = IndexBuildPipeline(data_dir, service, workers=1, output_dir=output_dir, enrich=False).run()
+        docs = stored_docs(service)
+        print(f"{step}: added {stats['added']}, removed {stats['removed']}, updated {stats['updated']}")
+        assert all(doc_id == service._document_id(doc) for doc_id, doc in docs.items()), step
+        return stats
+
+    build("near-duplicates")
+    ids = set(stored_docs(service))
+    assert len(ids) == 5 and any(doc.metadata.get("duplicates") for doc in stored_docs(service).values())
+
+    copy_path = os.path.join(data_dir, "copy_of_a.txt")
+    with open(copy_path, "w", encoding="utf-8") as f:
+        f.write(text)
+    stats = build("copy added")
+    assert stats["added"] == 0 and stats["removed"] == 0 and stats["updated"] == 5, stats
+    assert set(stored_docs(service)) == ids
+
+    os.remove(copy_path)
+    stats = build("copy removed")
+    assert stats["added"] == 0 and stats["removed"] == 0, stats
+    assert set(stored_docs(service)) == ids
+
+
+def main():
+    registry.register(EMOTION_CLASSIFIER, lambda: keyword_emotions)
+    registry.register(KNOWLEDGE_TOPIC_CLASSIFIER, KeywordTopics)
+
+    with tempfile.TemporaryDirectory() as root:
+        os.environ["EMBEDDING_CACHE_DIR"] = ""
+        dataset = os.path.join(root, "dataset.jsonl")
+        write_dataset(dataset)
+        service = MentalHealthRetrievalService(os.path.join(root, "vector_store"), reload_interval=0,
+                                               dataset_path=dataset, embeddings=HashEmbeddings())
+        store = service.vector_store
+        assert len(store.index_to_docstore_id) == 200
+
+        result = service.sync_local_data()
+        print(f"unchanged corpus: {result}")
+        assert result["added"] == 0 and result["removed"] == 0, result
+        docs = [store.docstore.search(doc_id) for doc_id in store.index_to_docstore_id.values()]
+        assert all(doc.metadata.get("emotion") and "emotion_scores" in doc.metadata for doc in docs)
+        assert sum(doc.metadata["topic"] == "grief" for doc in docs) == 40
+
+        write_dataset(dataset, edited=True)
+        result = service.sync_local_data()
+        print(f"one record edited: {result}")
+        assert result["added"] == 1 and result["removed"] == 1, result
+        store = service.vector_store
+        docs = [store.docstore.search(doc_id) for doc_id in store.index_to_docstore_id.values()]
+        revised = [doc for doc in docs if "(revised)" in doc.page_content]
+        assert len(revised) == 1 and revised[0].metadata["emotion"] == "sadness", revised
+
+        check_near_duplicates(root)
+        print("OK")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,15 +1,16 @@
 import os
 import json
 import random
-from transformers import AutoModelForCausalLM, AutoTokenizer
-import torch
-from services.document_retrieval import DocumentRetrievalService
+import threading
+from services.document_retrieval import BM25RetrievalService, DocumentRetrievalService
 from utils.response_validator import MentalHealthResponseValidator
-from utils.topic_checker import is_mental_health_topic
+from utils.topic_checker import is_mental_health_topic, topic_classifier_name
 from dotenv import load_dotenv
-from utils.llm_dynamic_generator import generate_dynamic_llm
+from utils.llm_dynamic_generator import GEMINI_MODEL, generate_dynamic_llm
+from utils.model_registry import get_model
 from services.conversation_learning import ConversationLearning
-from typing import List
+from services.session_store import DEFAULT_SESSION_ID, Session, SessionStore
+from typing import Any, Callable, Dict, List, Tuple
 
 load_dotenv()
 
@@ -33,27 +34,56 @@ class ChatService:
         self.responses = load_json_folder("data/responses")
         self.advice = load_json_folder("data/advice")
         self.validator = MentalHealthResponseValidator()
-        self.retriever = DocumentRetrievalService(
-            "data/mental_health_resources/mental_health_dataset_improved.jsonl"
-        )
+        self.retriever_path = "data/mental_health_resources/mental_health_dataset_improved.jsonl"
+        # Memory-mapped copy of the Q&A corpus; set RETRIEVER_COMPACT_PATH= (empty) to disable
+        self.retriever_compact_path = os.getenv("RETRIEVER_COMPACT_PATH", "vector_store/qa_corpus") or None
+        # "fuzzy" (difflib over the trigram shortlist) or "bm25" (memory-mapped sparse index)
+        self.retrieval_backend = os.getenv("RETRIEVAL_BACKEND", "fuzzy")
+        self.bm25_index_dir = os.getenv("BM25_INDEX_DIR", "vector_store/bm25")
+        self._retriever = None
+        self._retriever_lock = threading.Lock()
         self.learning = ConversationLearning()
 
-        model_name = "microsoft/DialoGPT-small"
-        self.tokenizer = AutoTokenizer.from_pretrained(model_name)
-        self.model = AutoModelForCausalLM.from_pretrained(model_name)
-        self.model.eval()
-        if torch.cuda.is_available():
-            self.model.to('cuda')
-
-        self.conversation_history = []
+        self.sessions = SessionStore(
+            max_messages=int(os.getenv("SESSION_MAX_MESSAGES", "50")),
+            ttl_seconds=float(os.getenv("SESSION_TTL_SECONDS", "1800")),
+            max_sessions=int(os.getenv("SESSION_MAX_SESSIONS", "10000")),
+            max_total_bytes=int(os.getenv("SESSION_MAX_TOTAL_BYTES", str(64 * 1024 * 1024)))
+        )
 
-    def generate_response(self, user_input: str) -> str:
+    @property
+    def retriever(self):
+        """Q&A retriever for the configured backend, loaded on first use or during warmup"""
+        if self._retriever is None:
+            with self._retriever_lock:
+                if self._retriever is None:
+                    if self.retrieval_backend == "bm25":
+                        self._retriever = BM25RetrievalService(self.retriever_path, self.bm25_index_dir)
+                    else:
+                        self._retriever = DocumentRetrievalService(
+                            self.retriever_path, compact_path=self.retriever_compact_path
+                        )
+        return self._retriever
+
+    def warmup_steps(self) -> List[Tuple[str, Callable[[], Any], bool]]:
+        """Slow loads to run before taking traffic, in the order they are needed, with whether each is required.
+
+        The topic classifier and Gemini have fallbacks (keyword matching and a
+        canned reply), so their failure degrades the service without making it unready.
+        """
+        return [
+            (topic_classifier_name(), lambda: get_model(topic_classifier_name()), False),
+            ("document-retriever", lambda: self.retriever, True),
+            (GEMINI_MODEL, lambda: get_model(GEMINI_MODEL), False)
+        ]
+
+    def generate_response(self, user_input: str, session_id: str = DEFAULT_SESSION_ID) -> str:
         try:
             user_input_clean = user_input.strip()
-            self.conversation_history.append({"role": "user", "content": user_input_clean})
+            session, message = self.sessions.append(session_id, "user", user_input_clean)
 
-            
-            self.learning.analyze_conversation(self.conversation_history)
+            # Analysed once, off the request thread
+            self.learning.record_message(message)
 
             if not is_mental_health_topic(user_input_clean):
                 redirection_response = (
@@ -61,55 +91,48 @@ class ChatService:
                     "I don't provide general knowledge or answer non-mental health related questions. "
                     "Would you like to talk about how you're feeling or any emotional challenges you're facing?"
                 )
-                self.conversation_history.append({"role": "assistant", "content": redirection_response})
-                self._save_conversation()
-                return redirection_response
+                return self._reply(session, message, redirection_response)
 
             lower = user_input_clean.lower()
             for topic, replies in self.responses.items():
                 if topic in lower:
-                    response = random.choice(replies)
-                    self.conversation_history.append({"role": "assistant", "content": response})
-                    self._save_conversation()
-                    return response
+                    return self._reply(session, message, random.choice(replies))
 
             for topic, advice_section in self.advice.items():
                 if topic in lower:
-                    response = random.choice(list(advice_section.values()))
-                    self.conversation_history.append({"role": "assistant", "content": response})
-                    self._save_conversation()
-                    return response
-
-            last_user_input = ""
-            for item in reversed(self.conversation_history):
-                if item["role"] == "user" and item["content"] != user_input_clean:
-                    last_user_input = item["content"]
-                    break
-            combined_input = f"{last_user_input} {user_input_clean}".strip()
+                    return self._reply(session, message, random.choice(list(advice_section.values())))
+
+            combined_input = f"{session.previous_user_input} {user_input_clean}".strip()
 
             
             fallback = self.retriever.search(combined_input)
             if fallback:
-                self.conversation_history.append({"role": "assistant", "content": fallback})
-                self._save_conversation()
-                return fallback
+                return self._reply(session, message, fallback)
 
             
             dyn_resp = self._generate_dynamic(combined_input)
             validated = self.validator.validate_response(user_input_clean, dyn_resp)
             final = validated if validated else dyn_resp
-            self.conversation_history.append({"role": "assistant", "content": final})
-            self._save_conversation()
-            return final
+            return self._reply(session, message, final)
 
         except Exception as e:
             print(f"Error in generate_response: {e}")
             return "I'm here to support you. Could you tell me more about how you're feeling?"
 
-    def _save_conversation(self):
-        """Save the current conversation for learning"""
-        if len(self.conversation_history) >= 2: 
-            self.learning.save_conversation(self.conversation_history)
+    def _reply(self, session: Session, user_message: Dict[str, str], response: str) -> str:
+        """Record the assistant turn and persist the conversation"""
+        # The session may have been evicted during the turn; log against the one written to
+        session, reply = self.sessions.append(session.session_id, "assistant", response)
+        self._save_conversation(session, [user_message, reply])
+        return response
+
+    def _save_conversation(self, session: Session, new_messages: List[Dict[str, str]]):
+        """Append this turn's messages to the conversation log for learning"""
+        self.learning.save_conversation(
+            new_messages,
+            session_id=session.session_id,
+            new_conversation=session.message_count <= len(new_messages)
+        )
 
     def get_learning_insights(self):
         """Get insights from conversation analysis"""
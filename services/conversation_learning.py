@@ -1,48 +1,147 @@
+import atexit
 import json
 import os
+import queue
+import threading
 from datetime import datetime
-from collections import defaultdict
 import re
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
+from services.conversation_log import ConversationLog
+from services.conversation_stats import ConversationStats
 
 class ConversationLearning:
-    def __init__(self, conversation_storage_path: str = "data/conversations"):
+    def __init__(self, conversation_storage_path: str = "data/conversations", analytics_queue_size: int = 10000):
         self.conversation_storage_path = conversation_storage_path
         self.ensure_storage_directory()
-        self.patterns = defaultdict(int)
-        self.topics = defaultdict(int)
+        self.log = ConversationLog(conversation_storage_path)
+
+        # New messages are analysed once, on a background worker fed by a bounded queue
+        self._analytics_queue = queue.Queue(maxsize=analytics_queue_size)
+        self._analytics_worker = None
+        self._analytics_lock = threading.Lock()
+        self.processed_messages = 0
+        self.dropped_messages = 0
+
+        # Totals and top-k are kept up to date as messages arrive and persisted,
+        # so insights never have to rescan the archive. Workers share the stats
+        # file; loading it, or rebuilding it from the archive when it does not
+        # exist yet, happens in the background so startup never scans the archive.
+        self.stats = ConversationStats(
+            os.path.join(conversation_storage_path, "stats.json"),
+            counter_mode=os.getenv("CONVERSATION_COUNTER_MODE", "exact"),
+            sketch_bytes=int(os.getenv("CONVERSATION_SKETCH_BYTES", str(4 * 1024 * 1024)))
+        )
+        self.stats_ready = threading.Event()
+        self._started_at = datetime.now().isoformat(timespec="seconds")
+        threading.Thread(target=self._load_stats, name="conversation-stats", daemon=True).start()
+        atexit.register(self.stats.save)
         
     def ensure_storage_directory(self):
         """Ensure the conversation storage directory exists"""
         os.makedirs(self.conversation_storage_path, exist_ok=True)
+
+    @property
+    def topics(self):
+        return self.stats.topics
+
+    @property
+    def patterns(self):
+        return self.stats.patterns
+
+    def _load_stats(self):
+        try:
+            self.stats.initialize(self._rebuild_stats)
+        except Exception as e:
+            print(f"Error loading conversation stats: {e}")
+        finally:
+            self.stats_ready.set()
+
+    def _rebuild_stats(self, stats: ConversationStats):
+        """One-off pass over the stored archive when no persisted stats exist yet.
+
+        Messages logged since this process started are left out, since they
+        are already counted as they arrive.
+        """
+        for session in self.log.read_sessions(before=self._started_at).values():
+            conversation = session["conversation"]
+            stats.record_turn(len(conversation), new_conversation=True)
+            for message in conversation:
+                self._analyze_message(message, stats)
         
-    def save_conversation(self, conversation: List[Dict[str, str]], user_id: str = "anonymous"):
-        """Save a conversation to storage"""
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = f"{user_id}_{timestamp}.json"
-        filepath = os.path.join(self.conversation_storage_path, filename)
-        
-        with open(filepath, 'w', encoding='utf-8') as f:
-            json.dump({
-                "timestamp": timestamp,
-                "user_id": user_id,
-                "conversation": conversation
-            }, f, indent=2)
+    def save_conversation(self, conversation: List[Dict[str, str]], user_id: str = "anonymous",
+                          session_id: Optional[str] = None, new_conversation: bool = False):
+        """Append new conversation messages to the session log.
+
+        Pass only the messages not saved before; the log is append-only and
+        read_conversations() rebuilds whole sessions.
+        """
+        if session_id is None:
+            session_id = f"{user_id}_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+            new_conversation = True
+        self.log.append(session_id, conversation, user_id=user_id)
+        self.stats.record_turn(len(conversation), new_conversation)
+
+    def read_conversations(self) -> Dict[str, Dict[str, Any]]:
+        """Rebuild every stored session from the log"""
+        self.log.flush()
+        return self.log.read_sessions()
             
     def analyze_conversation(self, conversation: List[Dict[str, str]]):
-        """Analyze conversation patterns and update learning"""
+        """Analyze each message in conversation exactly once, synchronously"""
         for message in conversation:
-            if message["role"] == "user":
-                text = message["content"].lower()
-                words = re.findall(r'\w+', text)
-                
-                for word in words:
-                    if len(word) > 3: 
-                        self.topics[word] += 1
-                        
-                for i in range(len(words) - 1):
-                    pattern = f"{words[i]} {words[i+1]}"
-                    self.patterns[pattern] += 1
+            self._analyze_message(message)
+
+    def _analyze_message(self, message: Dict[str, str], stats: Optional[ConversationStats] = None):
+        """Update topic and pattern counts from a single message"""
+        if message["role"] != "user":
+            return
+        text = message["content"].lower()
+        words = re.findall(r'\w+', text)
+
+        topics = [word for word in words if len(word) > 3]
+        patterns = [f"{words[i]} {words[i+1]}" for i in range(len(words) - 1)]
+        if stats is not None:
+            stats.record_terms(topics, patterns)
+            return
+        self.stats.record_terms(topics, patterns)
+        self.processed_messages += 1
+
+    def record_message(self, message: Dict[str, str]) -> bool:
+        """Queue a new message for background analysis without blocking.
+
+        Returns False if the queue is full and the message was dropped.
+        """
+        self._ensure_analytics_worker()
+        try:
+            self._analytics_queue.put_nowait(message)
+            return True
+        except queue.Full:
+            self.dropped_messages += 1
+            return False
+
+    def flush_analytics(self):
+        """Block until every queued message has been analysed"""
+        self._analytics_queue.join()
+
+    def _ensure_analytics_worker(self):
+        if self._analytics_worker is None:
+            with self._analytics_lock:
+                if self._analytics_worker is None:
+                    self._analytics_worker = threading.Thread(
+                        target=self._run_analytics, name="conversation-analytics", daemon=True
+                    )
+                    self._analytics_worker.start()
+
+    def _run_analytics(self):
+        while True:
+            message = self._analytics_queue.get()
+            try:
+                self._analyze_message(message)
+                self.stats.maybe_save()
+            except Exception as e:
+                print(f"Error analyzing message: {e}")
+            finally:
+                self._analytics_queue.task_done()
                     
     def update_responses(self, response_file: str, new_responses: List[str]):
         """Update response file with new responses"""
@@ -64,18 +163,17 @@ class ConversationLearning:
             
     def get_common_topics(self, n: int = 10) -> List[str]:
         """Get the n most common topics from conversations"""
-        return sorted(self.topics.items(), key=lambda x: x[1], reverse=True)[:n]
+        with self.stats.lock:
+            return self.topics.most_common(n)
         
     def get_common_patterns(self, n: int = 10) -> List[str]:
         """Get the n most common patterns from conversations"""
-        return sorted(self.patterns.items(), key=lambda x: x[1], reverse=True)[:n]
+        with self.stats.lock:
+            return self.patterns.most_common(n)
         
     def generate_insights(self) -> Dict[str, Any]:
-        """Generate insights from conversation analysis"""
-        return {
-            "common_topics": self.get_common_topics(),
-            "common_patterns": self.get_common_patterns(),
-            "total_conversations": len(os.listdir(self.conversation_storage_path)),
-            "total_messages": sum(len(json.load(open(os.path.join(self.conversation_storage_path, f)))["conversation"]) 
-                                for f in os.listdir(self.conversation_storage_path) if f.endswith('.json'))
-        } 
\ No newline at end of file
+        """Generate insights from the pre-aggregated stats in constant time"""
+        if not self.stats_ready.is_set():
+            # Until the persisted stats are loaded only this process's new counts are known
+            return {"status": "warming_up"}
+        return {"status": "ready", **self.stats.snapshot()} 
\ No newline at end of file
@@ -0,0 +1,195 @@
+# services/conversation_log.py
+import atexit
+import glob
+import json
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional
+
+SEGMENT_PREFIX = "conversations-"
+SEGMENT_SUFFIX = ".jsonl"
+
+
+class ConversationLog:
+    """Append-only JSONL log of conversation turns with a write-behind buffer.
+
+    Callers append only the new messages of a turn; a background thread batches
+    them into one write per flush interval. Segments rotate by size and age and
+    are named per process, so several workers can share one directory.
+    """
+
+    def __init__(
+        self,
+        directory: str = "data/conversations",
+        segment_max_bytes: int = 64 * 1024 * 1024,
+        segment_max_seconds: float = 3600,
+        flush_interval: float = 1.0,
+        max_buffered: int = 1000
+    ):
+        self.directory = directory
+        self.segment_max_bytes = segment_max_bytes
+        self.segment_max_seconds = segment_max_seconds
+        self.flush_interval = flush_interval
+        self.max_buffered = max_buffered
+        os.makedirs(directory, exist_ok=True)
+
+        self._buffer: List[str] = []
+        self._pending = 0
+        self._cond = threading.Condition()
+        self._writer: Optional[threading.Thread] = None
+        self._closed = False
+        self._segment = None
+        self._segment_path = None
+        self._segment_opened = 0.0
+        self._segment_seq = 0
+        atexit.register(self.close)
+
+    def append(self, session_id: str, messages: List[Dict[str, str]], user_id: str = "anonymous"):
+        """Buffer messages for writing; never blocks on disk I/O"""
+        timestamp = datetime.now().isoformat(timespec="seconds")
+        lines = [
+            json.dumps({
+                "timestamp": timestamp,
+                "session_id": session_id,
+                "user_id": user_id,
+                "role": message["role"],
+                "content": message["content"]
+            }, ensure_ascii=False) + "\n"
+            for message in messages
+        ]
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("Conversation log is closed")
+            self._buffer.extend(lines)
+            self._pending += len(lines)
+            if len(self._buffer) >= self.max_buffered:
+                self._cond.notify_all()
+        self._ensure_writer()
+
+    def flush(self, timeout: float = None):
+        """Block until everything appended so far is written"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            self._cond.notify_all()
+            while self._pending:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+
+    def close(self):
+        if self._writer is not None:
+            self.flush(timeout=10)
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+            if self._segment is not None:
+                self._segment.close()
+                self._segment = None
+
+    def _ensure_writer(self):
+        if self._writer is None:
+            with self._cond:
+                if self._writer is None:
+                    self._writer = threading.Thread(target=self._run, name="conversation-log", daemon=True)
+                    self._writer.start()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._buffer and not self._closed:
+                    self._cond.wait()
+                if self._closed and not self._buffer:
+                    return
+                # Let a batch accumulate unless it is already large
+                if len(self._buffer) < self.max_buffered and not self._closed:
+                    self._cond.wait(self.flush_interval)
+                lines, self._buffer = self._buffer, []
+
+            try:
+                self._write(lines)
+            except Exception as e:
+                print(f"Error writing conversation log: {e}")
+            finally:
+                with self._cond:
+                    self._pending -= len(lines)
+                    self._cond.notify_all()
+
+    def _write(self, lines: List[str]):
+        data = "".join(lines).encode("utf-8")
+        segment = self._current_segment(len(data))
+        segment.write(data)
+        segment.flush()
+
+    def _current_segment(self, incoming_bytes: int):
+        now = time.time()
+        if self._segment is not None:
+            too_big = self._segment.tell() + incoming_bytes > self.segment_max_bytes and self._segment.tell() > 0
+            too_old = now - self._segment_opened > self.segment_max_seconds
+            if too_big or too_old:
+                self._segment.close()
+                self._segment = None
+
+        if self._segment is None:
+            self._segment_seq += 1
+            stamp = datetime.fromtimestamp(now).strftime("%Y%m%d_%H%M%S")
+            name = f"{SEGMENT_PREFIX}{stamp}-{os.getpid()}-{self._segment_seq:04d}{SEGMENT_SUFFIX}"
+            self._segment_path = os.path.join(self.directory, name)
+            self._segment = open(self._segment_path, "ab")
+            self._segment_opened = now
+        return self._segment
+
+    def segments(self) -> List[str]:
+        """Segment files in write order"""
+        return sorted(glob.glob(os.path.join(self.directory, f"{SEGMENT_PREFIX}*{SEGMENT_SUFFIX}")))
+
+    def read_records(self) -> Iterator[Dict[str, Any]]:
+        """Stream every logged message record across all segments"""
+        for path in self.segments():
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        yield json.loads(line)
+                    except json.JSONDecodeError:
+                        # A crash can leave a partial last line
+                        continue
+
+    def read_sessions(self, include_legacy: bool = True, before: Optional[str] = None) -> Dict[str, Dict[str, Any]]:
+        """Rebuild full sessions as {session_id: {"user_id", "conversation"}}.
+
+        With before (an ISO timestamp), only messages logged earlier are included.
+        """
+        sessions: Dict[str, Dict[str, Any]] = {}
+        if include_legacy:
+            for session_id, session in self._read_legacy_snapshots():
+                sessions[session_id] = session
+
+        for record in self.read_records():
+            if before is not None and record.get("timestamp", "") >= before:
+                continue
+            session = sessions.setdefault(record["session_id"], {
+                "user_id": record.get("user_id", "anonymous"),
+                "conversation": []
+            })
+            session["conversation"].append({"role": record["role"], "content": record["content"]})
+        return sessions
+
+    def _read_legacy_snapshots(self):
+        """Per-turn JSON snapshots written before the log existed"""
+        for path in sorted(glob.glob(os.path.join(self.directory, "*.json"))):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+                if "conversation" not in data:
+                    continue
+                yield os.path.basename(path)[:-len(".json")], {
+                    "user_id": data.get("user_id", "anonymous"),
+                    "conversation": data.get("conversation", [])
+                }
+            except (json.JSONDecodeError, OSError, TypeError):
+                continue
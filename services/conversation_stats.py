@@ -0,0 +1,285 @@
+# services/conversation_stats.py
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+from utils.sketches import HeavyHitterCounter
+
+try:
+    import fcntl
+except ImportError:  # Windows: in-process locking only
+    fcntl = None
+
+
+class TopKTracker:
+    """Maintains the k largest keys of a counter whose counts only grow.
+
+    A key can only enter the top k at the moment its count is incremented past
+    the current minimum, so each update costs O(k) instead of a full sort.
+    """
+
+    def __init__(self, k: int):
+        self.k = k
+        self._top: Dict[str, int] = {}
+
+    def update(self, key: str, count: int):
+        if key in self._top or len(self._top) < self.k:
+            self._top[key] = count
+            return
+        min_key = min(self._top, key=self._top.get)
+        if count > self._top[min_key]:
+            del self._top[min_key]
+            self._top[key] = count
+
+    def most_common(self, n: int = None) -> List[Tuple[str, int]]:
+        ranked = sorted(self._top.items(), key=lambda x: x[1], reverse=True)
+        return ranked if n is None else ranked[:n]
+
+
+class FrequencyCounter:
+    """Exact counter with a cached top-k"""
+
+    def __init__(self, top_k: int = 10):
+        self.counts = defaultdict(int)
+        self.top = TopKTracker(top_k)
+
+    def add(self, key: str, n: int = 1):
+        self.counts[key] += n
+        self.top.update(key, self.counts[key])
+
+    def __getitem__(self, key: str) -> int:
+        return self.counts.get(key, 0)
+
+    def __len__(self) -> int:
+        return len(self.counts)
+
+    def items(self):
+        return self.counts.items()
+
+    def most_common(self, n: int = 10) -> List[Tuple[str, int]]:
+        if n <= self.top.k:
+            return self.top.most_common(n)
+        return sorted(self.counts.items(), key=lambda x: x[1], reverse=True)[:n]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"type": "exact", "counts": dict(self.counts)}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any], top_k: int = 10) -> "FrequencyCounter":
+        counter = cls(top_k)
+        for key, count in data.get("counts", {}).items():
+            counter.add(key, count)
+        return counter
+
+
+class ConversationStats:
+    """Running totals and top-k topics/bigrams, persisted so insights never rescan the archive.
+
+    counter_mode "exact" keeps every distinct topic and bigram; "sketch" keeps
+    them in HeavyHitterCounter sketches of sketch_bytes each, so memory stays
+    fixed however large the vocabulary grows (see utils.sketches for the error
+    bounds).
+
+    Several workers can share one stats file. Each keeps the counts it has
+    not saved yet, and save merges them into the file under an exclusive lock
+    on <path>.lock, so no worker overwrites another's counts.
+    """
+
+    def __init__(self, path: str = "data/conversations/stats.json", top_k: int = 10,
+                 save_interval: float = 30.0, counter_mode: str = "exact",
+                 sketch_bytes: int = 4 * 1024 * 1024):
+        self.path = path
+        self.top_k = top_k
+        self.save_interval = save_interval
+        self.counter_mode = counter_mode
+        self.sketch_bytes = sketch_bytes
+        self.total_conversations = 0
+        self.total_messages = 0
+        self.topics = self._new_counter()
+        self.patterns = self._new_counter()
+        self.lock = threading.Lock()
+        self._dirty = False
+        self._last_saved = time.monotonic()
+        # Counts recorded since the last save, merged into the file by the next one
+        self._pending = self._new_pending()
+
+    @staticmethod
+    def _new_pending() -> Dict[str, Any]:
+        return {"conversations": 0, "messages": 0, "topics": defaultdict(int), "patterns": defaultdict(int)}
+
+    def record_turn(self, n_messages: int, new_conversation: bool):
+        with self.lock:
+            self.total_messages += n_messages
+            self._pending["messages"] += n_messages
+            if new_conversation:
+                self.total_conversations += 1
+                self._pending["conversations"] += 1
+            self._dirty = True
+
+    def record_terms(self, topics: Iterable[str], patterns: Iterable[str]):
+        with self.lock:
+            for topic in topics:
+                self.topics.add(topic)
+                self._pending["topics"][topic] += 1
+            for pattern in patterns:
+                self.patterns.add(pattern)
+                self._pending["patterns"][pattern] += 1
+            self._dirty = True
+
+    def snapshot(self, n: int = 10) -> Dict[str, Any]:
+        with self.lock:
+            return {
+                "common_topics": self.topics.most_common(n),
+                "common_patterns": self.patterns.most_common(n),
+                "total_conversations": self.total_conversations,
+                "total_messages": self.total_messages
+            }
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "total_conversations": self.total_conversations,
+            "total_messages": self.total_messages,
+            "topics": self.topics.to_dict(),
+            "patterns": self.patterns.to_dict()
+        }
+
+    def _new_counter(self):
+        if self.counter_mode == "sketch":
+            return HeavyHitterCounter.from_memory_budget(self.sketch_bytes, top_k=self.top_k)
+        return FrequencyCounter(self.top_k)
+
+    def _load_counter(self, data: Optional[Dict[str, Any]]):
+        """Restore a persisted counter, converting it if the mode changed"""
+        data = data or {}
+        stored_mode = "sketch" if data.get("type") == "sketch" else "exact"
+        if stored_mode == self.counter_mode:
+            if stored_mode == "sketch":
+                return HeavyHitterCounter.from_dict(data, self.top_k)
+            return FrequencyCounter.from_dict(data, self.top_k)
+
+        counter = self._new_counter()
+        source = (HeavyHitterCounter.from_dict(data, self.top_k) if stored_mode == "sketch"
+                  else FrequencyCounter.from_dict(data, self.top_k))
+        for key, count in source.items():
+            counter.add(key, count)
+        return counter
+
+    @contextmanager
+    def _file_lock(self):
+        """Exclusive lock on the stats file across processes"""
+        with open(f"{self.path}.lock", "a") as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _read_file(self) -> Optional[Dict[str, Any]]:
+        if not os.path.exists(self.path):
+            return None
+        with open(self.path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def _write_file(self, data: Dict[str, Any]):
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(self.path) or ".", suffix=".tmp")
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(data, f)
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    def _from_data(self, data: Dict[str, Any]) -> "ConversationStats":
+        """A private ConversationStats holding data, built without touching self"""
+        stats = ConversationStats(self.path, self.top_k, counter_mode=self.counter_mode,
+                                  sketch_bytes=self.sketch_bytes)
+        stats.total_conversations = data.get("total_conversations", 0)
+        stats.total_messages = data.get("total_messages", 0)
+        stats.topics = self._load_counter(data.get("topics"))
+        stats.patterns = self._load_counter(data.get("patterns"))
+        return stats
+
+    @staticmethod
+    def _add_pending(stats: "ConversationStats", pending: Dict[str, Any]):
+        stats.total_conversations += pending["conversations"]
+        stats.total_messages += pending["messages"]
+        for key, count in pending["topics"].items():
+            stats.topics.add(key, count)
+        for key, count in pending["patterns"].items():
+            stats.patterns.add(key, count)
+
+    def _swap_in(self, stats: "ConversationStats"):
+        """Serve stats plus the counts not saved yet.
+
+        stats is built outside self.lock; under it only the counts recorded
+        since are added before the references are swapped, so recording and
+        snapshots never wait for a full counter rebuild.
+        """
+        with self.lock:
+            self._add_pending(stats, self._pending)
+            self.total_conversations = stats.total_conversations
+            self.total_messages = stats.total_messages
+            self.topics = stats.topics
+            self.patterns = stats.patterns
+
+    def load(self) -> bool:
+        """Load persisted stats; returns False if there are none yet"""
+        with self._file_lock():
+            data = self._read_file()
+        if data is None:
+            return False
+        self._swap_in(self._from_data(data))
+        return True
+
+    def initialize(self, rebuild: Callable[["ConversationStats"], None]):
+        """Load persisted stats, building them first with rebuild if none exist.
+
+        rebuild fills a fresh ConversationStats from the archive. It runs under
+        the file lock, so when several workers start together only one of them
+        rebuilds and the others load its result.
+        """
+        with self._file_lock():
+            data = self._read_file()
+            if data is None:
+                fresh = ConversationStats(self.path, self.top_k, counter_mode=self.counter_mode,
+                                          sketch_bytes=self.sketch_bytes)
+                rebuild(fresh)
+                data = fresh.to_dict()
+                self._write_file(data)
+        self._swap_in(self._from_data(data))
+
+    def save(self):
+        """Merge the counts recorded since the last save into the stats file"""
+        with self.lock:
+            pending, self._pending = self._pending, self._new_pending()
+            self._dirty = False
+            self._last_saved = time.monotonic()
+        try:
+            with self._file_lock():
+                merged = self._from_data(self._read_file() or {})
+                self._add_pending(merged, pending)
+                self._write_file(merged.to_dict())
+        except BaseException:
+            # Keep the counts for the next save
+            with self.lock:
+                for field in ("conversations", "messages"):
+                    self._pending[field] += pending[field]
+                for field in ("topics", "patterns"):
+                    for key, count in pending[field].items():
+                        self._pending[field][key] += count
+                self._dirty = True
+            raise
+        # Pick up what other workers saved
+        self._swap_in(merged)
+
+    def maybe_save(self):
+        """Save if anything changed and the save interval has passed"""
+        if self._dirty and time.monotonic() - self._last_saved >= self.save_interval:
+            self.save()
@@ -1,38 +1,311 @@
 import json
 import os
 import difflib
+import tempfile
+from array import array
+from collections import Counter, defaultdict
+from itertools import chain
+from typing import Optional
+
+import numpy as np
+
+from utils.compact_store import CompactTextStore
+
+# Character buckets for the per-question histograms that bound difflib's ratio
+_CHAR_BUCKETS = 48
+# Trigram postings, lengths and histograms saved next to the compact stores
+SEARCH_INDEX_SUFFIX = ".search.npz"
+
+
+def _char_bucket(ch: str) -> int:
+    code = ord(ch)
+    if 97 <= code <= 122:
+        return code - 97
+    if 48 <= code <= 57:
+        return 26 + code - 48
+    punctuation = " ?.,'!-#"
+    if ch in punctuation:
+        return 36 + punctuation.index(ch)
+    return 44 + code % 4
+
+
+def _char_histogram(text: str) -> bytes:
+    """Bucketed character counts, saturating at 255"""
+    counts = [0] * _CHAR_BUCKETS
+    for ch in text:
+        counts[_char_bucket(ch)] += 1
+    return bytes(min(c, 255) for c in counts)
+
 
 class DocumentRetrievalService:
-    def __init__(self, jsonl_path: str):
-        self.data = self._load_jsonl(jsonl_path)
+    """Fuzzy Q&A lookup over a JSONL file of question/answer pairs.
+
+    A character trigram inverted index over the questions shortlists the
+    questions that share the most trigrams with the query, and the difflib
+    ratio is computed for that shortlist first. The result is then made exact:
+    per-question lengths and bucketed character histograms give an upper bound
+    on the ratio (as quick_ratio does), and every question whose bound can
+    still reach the best score or the threshold is scored as well. search
+    therefore returns what the linear scan (_search_linear) returns. The
+    histograms cost 48 bytes per question.
+
+    Only what search needs is kept: lowercased questions and answers live in
+    CompactTextStores (one UTF-8 buffer plus offsets each). With compact_path
+    set, they are also saved next to each other on disk together with the
+    trigram postings, lengths and histograms, and later loads memory-map the
+    stores and read the search index instead of re-parsing the JSONL and
+    re-indexing every question. The search index records the questions
+    store's save token and is rebuilt if it does not match.
+    """
+
+    def __init__(self, jsonl_path: str, candidate_count: int = 50, max_df_ratio: float = 0.2,
+                 max_postings: int = 20000, compact_path: Optional[str] = None):
+        self.candidate_count = candidate_count
+        self.max_df_ratio = max_df_ratio
+        self.max_postings = max_postings
+        self._postings = defaultdict(lambda: array('I'))
+        self._gram_counts = array('I')
+        self._lengths = array('I')
+        self._histograms = bytearray()
+        self._bound_arrays = None
+
+        if compact_path and self._compact_is_fresh(jsonl_path, compact_path) and self._open_compact(compact_path):
+            if not self._load_search_index(compact_path + SEARCH_INDEX_SUFFIX):
+                for question in self.questions:
+                    self._index(question)
+                self._save_search_index(compact_path + SEARCH_INDEX_SUFFIX)
+        else:
+            self.questions = CompactTextStore()
+            self.answers = CompactTextStore()
+            self._load_jsonl(jsonl_path)
+            if compact_path:
+                self.questions.save(f"{compact_path}.questions")
+                self.answers.save(f"{compact_path}.answers")
+                self._save_search_index(compact_path + SEARCH_INDEX_SUFFIX)
+
+    @staticmethod
+    def _compact_is_fresh(jsonl_path: str, compact_path: str) -> bool:
+        prefixes = (f"{compact_path}.questions", f"{compact_path}.answers")
+        if not all(CompactTextStore.exists(prefix) for prefix in prefixes):
+            return False
+        if not os.path.exists(jsonl_path):
+            return True
+        source_mtime = os.path.getmtime(jsonl_path)
+        return all(os.path.getmtime(prefix + ".bin") >= source_mtime for prefix in prefixes)
+
+    def _open_compact(self, compact_path: str) -> bool:
+        try:
+            self.questions = CompactTextStore.open(f"{compact_path}.questions")
+            self.answers = CompactTextStore.open(f"{compact_path}.answers")
+            return True
+        except ValueError as e:
+            # A save interrupted between its two files; rebuild from the JSONL
+            print(f"Ignoring compact store {compact_path}: {e}")
+            return False
+
+    def _save_search_index(self, path: str):
+        """Write the trigram postings, lengths and histograms through a temp file"""
+        grams = list(self._postings)
+        postings = array('I')
+        for gram in grams:
+            postings.extend(self._postings[gram])
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or ".", prefix=os.path.basename(path))
+        try:
+            with os.fdopen(fd, "wb") as f:
+                np.savez(
+                    f,
+                    token=np.frombuffer(self.questions.token, dtype=np.uint8),
+                    grams=np.array(grams, dtype="<U3"),
+                    posting_counts=np.array([len(self._postings[gram]) for gram in grams], dtype=np.uint32),
+                    postings=np.frombuffer(postings, dtype=np.uint32),
+                    gram_counts=np.frombuffer(self._gram_counts, dtype=np.uint32),
+                    lengths=np.frombuffer(self._lengths, dtype=np.uint32),
+                    histograms=np.frombuffer(bytes(self._histograms), dtype=np.uint8)
+                )
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    def _load_search_index(self, path: str) -> bool:
+        """Read a saved search index; False if missing or saved for other questions"""
+        if not os.path.exists(path):
+            return False
+        with np.load(path) as data:
+            if data["token"].tobytes() != self.questions.token:
+                return False
+            postings = memoryview(array('I', data["postings"].astype(np.uint32).tobytes()))
+            ends = np.cumsum(data["posting_counts"], dtype=np.int64).tolist()
+            self._postings = {gram: postings[start:end]
+                              for gram, start, end in zip(data["grams"].tolist(), [0] + ends[:-1], ends)}
+            self._gram_counts = array('I', data["gram_counts"].astype(np.uint32).tobytes())
+            self._lengths = array('I', data["lengths"].astype(np.uint32).tobytes())
+            self._histograms = bytearray(data["histograms"].tobytes())
+        return True
+
+    @staticmethod
+    def _ngrams(text: str, n: int = 3):
+        padded = f" {text} "
+        return {padded[i:i + n] for i in range(len(padded) - n + 1)}
 
     def _load_jsonl(self, path: str):
-        items = []
         with open(path, 'r', encoding='utf-8') as f:
             for line in f:
                 try:
-                    items.append(json.loads(line.strip()))
+                    item = json.loads(line.strip())
                 except json.JSONDecodeError:
                     continue
-        return items
+                question = item.get("question", "")
+                answer = item.get("answer", "")
+                if not question or not answer:
+                    continue
+                self._add(question.lower(), answer)
+
+    def _add(self, question: str, answer: str):
+        self.questions.append(question)
+        self.answers.append(answer)
+        self._index(question)
+
+    def _index(self, question: str):
+        doc_id = len(self._gram_counts)
+        grams = self._ngrams(question)
+        for gram in grams:
+            self._postings[gram].append(doc_id)
+        self._gram_counts.append(len(grams))
+        self._lengths.append(len(question))
+        self._histograms += _char_histogram(question)
+        self._bound_arrays = None
+
+    def _candidates(self, query: str):
+        """Doc ids sharing the most trigrams with query, in corpus order"""
+        grams = self._ngrams(query)
+        postings = sorted(
+            (self._postings[g] for g in grams if g in self._postings),
+            key=len
+        )
+        if not postings:
+            return []
+
+        # Very common trigrams carry little signal; use the rarest ones first and
+        # stop once the posting budget is spent
+        max_df = max(int(self.max_df_ratio * len(self.questions)), 1)
+        selective = []
+        budget = self.max_postings
+        for posting in postings:
+            if selective and (len(posting) > max_df or len(posting) > budget):
+                break
+            selective.append(posting)
+            budget -= len(posting)
+
+        shared = Counter(chain.from_iterable(selective))
+
+        # Rank a wider pool by shared trigrams, then by Dice overlap
+        query_count = len(grams)
+        gram_counts = self._gram_counts
+        pool = shared.most_common(self.candidate_count * 4)
+        pool.sort(key=lambda x: x[1] / (query_count + gram_counts[x[0]]), reverse=True)
+        return sorted(doc_id for doc_id, _ in pool[:self.candidate_count])
+
+    def _ratio_bounds(self, query: str) -> np.ndarray:
+        """Upper bound on difflib's ratio between query and every question"""
+        if self._bound_arrays is None:
+            lengths = np.frombuffer(self._lengths, dtype=np.uint32).astype(np.float32)
+            histograms = np.frombuffer(bytes(self._histograms), dtype=np.uint8).reshape(-1, _CHAR_BUCKETS)
+            saturated = np.flatnonzero((histograms == 255).any(axis=1))
+            self._bound_arrays = (lengths, histograms, saturated)
+        lengths, histograms, saturated = self._bound_arrays
+
+        query_counts = np.zeros(_CHAR_BUCKETS, dtype=np.int64)
+        for ch in query:
+            query_counts[_char_bucket(ch)] += 1
+        shared = np.minimum(histograms, np.minimum(query_counts, 255).astype(np.uint8)).sum(axis=1, dtype=np.int64)
+        # A saturated bucket may hold any count, so it is bounded by the query's count alone
+        for doc_id in saturated.tolist():
+            row = histograms[doc_id].astype(np.int64)
+            shared[doc_id] = np.where(row == 255, query_counts, np.minimum(row, query_counts)).sum()
+        total = lengths + len(query)
+        return np.divide(2.0 * shared, total, out=np.zeros(len(lengths)), where=total > 0)
 
     def search(self, user_input: str, threshold: float = 0.6):
+        query = user_input.lower()
+        matcher = difflib.SequenceMatcher(None, query, "")
         best_match = None
         best_score = 0
 
-        for item in self.data:
-            question = item.get("question", "")
-            answer = item.get("answer", "")
-            if not question or not answer:
-                continue
+        def consider(doc_id):
+            nonlocal best_match, best_score
+            matcher.set_seq2(self.questions[doc_id])
+            # Both quick ratios are upper bounds on ratio(); skip candidates that cannot win.
+            # Ties go to the lower doc id, as in the linear scan
+            tie_wins = best_match is None or doc_id < best_match
+            for bound in (matcher.real_quick_ratio(), matcher.quick_ratio()):
+                if bound < best_score or (bound == best_score and not tie_wins):
+                    return
+            score = matcher.ratio()
+            if score > best_score or (score == best_score and score > 0 and tie_wins):
+                best_score = score
+                best_match = doc_id
 
-            score = difflib.SequenceMatcher(None, user_input.lower(), question.lower()).ratio()
+        shortlist = self._candidates(query)
+        for doc_id in shortlist:
+            consider(doc_id)
+
+        # Score every other question that could still match or beat the shortlist's best
+        if len(self.questions):
+            bounds = self._ratio_bounds(query)
+            reachable = np.flatnonzero(bounds >= max(best_score, threshold) - 1e-12)
+            # Highest bounds first, so the best score rises early and ends the scan sooner
+            reachable = reachable[np.argsort(-bounds[reachable], kind="stable")]
+            scored = set(shortlist)
+            for doc_id in reachable.tolist():
+                if bounds[doc_id] < best_score - 1e-12:
+                    break
+                if doc_id not in scored:
+                    consider(doc_id)
+
+        if best_match is not None and best_score >= threshold:
+            return self.answers[best_match]
+        else:
+            return None
+
+    def _search_linear(self, user_input: str, threshold: float = 0.6):
+        """Reference scorer: difflib ratio against every question"""
+        best_match = None
+        best_score = 0
+
+        for doc_id, question in enumerate(self.questions):
+            score = difflib.SequenceMatcher(None, user_input.lower(), question).ratio()
 
             if score > best_score:
                 best_score = score
-                best_match = item
+                best_match = doc_id
 
-        if best_score >= threshold:
-            return best_match["answer"]
+        if best_match is not None and best_score >= threshold:
+            return self.answers[best_match]
         else:
             return None
+
+
+class BM25RetrievalService:
+    """Q&A lookup backed by the memory-mapped BM25 index in utils.bm25_index.
+
+    Built from the JSONL on first use if index_dir does not hold an index yet;
+    build it ahead of time with ``python -m utils.bm25_index`` for large corpora.
+    """
+
+    def __init__(self, jsonl_path: str, index_dir: str = "vector_store/bm25"):
+        from utils.bm25_index import BM25Index, build_bm25_index
+
+        if not BM25Index.exists(index_dir):
+            from utils.document_loader import DocumentLoader
+            build_bm25_index(DocumentLoader().load_jsonl(jsonl_path), index_dir)
+        self.index = BM25Index(index_dir)
+
+    def search(self, user_input: str, threshold: float = 0.35):
+        """Answer of the best match if its normalized BM25 score reaches threshold"""
+        hits = self.index.search(user_input, k=1)
+        if not hits or hits[0][2] < threshold:
+            return None
+        content = self.index.documents[hits[0][0]]
+        _, sep, answer = content.partition("\nAnswer: ")
+        return answer if sep else content
@@ -1,78 +1,336 @@
 # services/retrieval_service.py
 import os
 import json
-import torch
+import threading
+import time
+from itertools import islice
 from datasets import load_dataset
 from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_community.docstore.in_memory import InMemoryDocstore
 from langchain_community.vectorstores import FAISS
-from langchain_community.embeddings import HuggingFaceEmbeddings
-from typing import List
+from typing import Dict, Iterator, List, Optional, Tuple
+import faiss
+from utils.embeddings import SharedSentenceEmbeddings
+from utils.enrichment import DocumentEnricher, source_metadata
+from utils.hashing import content_hash
+from utils.index_versions import current_dir, new_version_dir, prune_versions, publish, unpublished_versions
+from utils.partitioned_index import PartitionedIndex, partition_key
+
+DATASET_PATH = "data/mental_health_resources/mental_health_dataset_improved.jsonl"
+INGEST_CHECKPOINT = "ingest_checkpoint.json"
+INGEST_CHECKPOINT_EVERY = 20
 
 class MentalHealthRetrievalService:
-    def __init__(self, vector_store_path: str = "vector_store"):
+    """FAISS vector store over versioned directories (see utils.index_versions).
+
+    Every save writes a new version and publishes it atomically. A background
+    watcher notices versions published by other processes, loads them off the
+    request path and swaps them in; queries already running keep the store
+    they started with, which is released once they finish.
+
+    The store and its emotion/topic partitions are held as one (store,
+    partitions) pair and replaced in a single assignment, so a query never
+    sees a new store with the old partitions. The partitions copy every
+    vector once per field, so with both fields the service holds about 3x the
+    store's vector memory. During a reload the old pair stays alive until
+    running queries finish, so expect up to 6x for a short while.
+    """
+
+    def __init__(self, vector_store_path: str = "vector_store", reload_interval: Optional[float] = None,
+                 dataset_path: str = DATASET_PATH, ingest_batch_size: int = 512, load_local_data: bool = True,
+                 enrich: bool = True, embeddings: Optional[Embeddings] = None):
         self.vector_store_path = vector_store_path
         os.makedirs(vector_store_path, exist_ok=True)
+        self.dataset_path = dataset_path
+        self.ingest_batch_size = ingest_batch_size
+        self.load_local_data = load_local_data
+        # Emotion/topic labels for ingested records, computed once at index time
+        self.enricher = DocumentEnricher() if enrich else None
         
-        self.embeddings = HuggingFaceEmbeddings(
-            model_name="sentence-transformers/all-MiniLM-L6-v2",
-            model_kwargs={"device": "cuda" if torch.cuda.is_available() else "cpu"}
-        )
+        self.embeddings = embeddings or SharedSentenceEmbeddings("sentence-transformers/all-MiniLM-L6-v2")
         
-        self.vector_store = self._init_vector_store()
+        self.store_dir = current_dir(vector_store_path)
+        # (store, partitions or None), always replaced as a whole under _active_lock
+        self._active: Tuple[Optional[FAISS], Optional[PartitionedIndex]] = (None, None)
+        self._active_lock = threading.Lock()
+        vector_store = self._init_vector_store()
+        # A store built from local data was activated when it was published
+        if self.vector_store is not vector_store:
+            self._activate(vector_store)
+
+        if reload_interval is None:
+            reload_interval = float(os.getenv("INDEX_RELOAD_INTERVAL", "30"))
+        self.reload_interval = reload_interval
+        self._stop_watching = threading.Event()
+        if reload_interval > 0:
+            threading.Thread(target=self._watch_for_new_versions, name="vector-store-reload", daemon=True).start()
+
+    @property
+    def vector_store(self) -> FAISS:
+        return self._active[0]
+
+    @vector_store.setter
+    def vector_store(self, vector_store: FAISS):
+        # For stores being built; published stores are swapped in with their partitions by _activate
+        with self._active_lock:
+            self._active = (vector_store, None)
+
+    def _activate(self, vector_store: FAISS):
+        """Build vector_store's partitions, then swap the pair in together"""
+        partitions = PartitionedIndex(vector_store)
+        with self._active_lock:
+            self._active = (vector_store, partitions)
 
     def _init_vector_store(self):
         """Initialize FAISS vector store"""
-        if os.path.exists(f"{self.vector_store_path}/index.faiss"):
-            print("Loading existing vector store...")
-            return FAISS.load_local(
-                self.vector_store_path,
-                self.embeddings,
-                allow_dangerous_deserialization=True
-            )
+        if self.store_dir:
+            print(f"Loading existing vector store from {self.store_dir}...")
+            return self._load_store(self.store_dir)
+        if not self.load_local_data:
+            return self._empty_vector_store()
         
         print("Creating new vector store from local data...")
         return self._create_vector_store_from_local_data()
 
+    def _load_store(self, store_dir: str) -> FAISS:
+        return FAISS.load_local(
+            store_dir,
+            self.embeddings,
+            allow_dangerous_deserialization=True
+        )
+
+    def save(self, vector_store: Optional[FAISS] = None):
+        """Write the store as a new version and publish it"""
+        self._publish(vector_store or self.vector_store, new_version_dir(self.vector_store_path))
+
+    def _publish(self, vector_store: FAISS, version_dir: str):
+        vector_store.save_local(version_dir)
+        publish(self.vector_store_path, version_dir)
+        self._activate(vector_store)
+        self.store_dir = version_dir
+        prune_versions(self.vector_store_path)
+
+    def reload(self) -> bool:
+        """Swap in the published version if it changed; returns True if it did"""
+        target = current_dir(self.vector_store_path)
+        if not target or target == self.store_dir:
+            return False
+        # Partitions are ready before the swap, so the first filtered query does not build them
+        self._activate(self._load_store(target))
+        self.store_dir = target
+        print(f"Reloaded vector store from {target}")
+        return True
+
+    def _watch_for_new_versions(self):
+        while not self._stop_watching.wait(self.reload_interval):
+            try:
+                self.reload()
+            except Exception as e:
+                print(f"Vector store reload error: {e}")
+
+    def stop_watching(self):
+        self._stop_watching.set()
+
+    def _iter_local_documents(self, offset: int = 0, line_num: int = 0) -> Iterator[Tuple[Document, int, int]]:
+        """Stream (document, byte offset after its line, line number) from the local JSONL dataset"""
+        with open(self.dataset_path, "rb") as f:
+            f.seek(offset)
+            for raw in iter(f.readline, b""):
+                line_num += 1
+                offset += len(raw)
+                line = raw.strip()
+                if not line:
+                    continue
+                try:
+                    item = json.loads(line)
+                except json.JSONDecodeError as e:
+                    raise ValueError(f"Invalid JSON at line {line_num} of {self.dataset_path}: {e}") from e
+                doc = self._record_to_document(item)
+                if doc is not None:
+                    yield doc, offset, line_num
+
+    @staticmethod
+    def _record_to_document(item: dict) -> Optional[Document]:
+        """Map a question/answer, instruction/output or user_input/therapist_response record"""
+        for question, answer in (("question", "answer"), ("instruction", "output"),
+                                 ("user_input", "therapist_response")):
+            if item.get(question) and item.get(answer):
+                return Document(
+                    page_content=f"Client: {item[question]}\nTherapist: {item[answer]}",
+                    metadata={
+                        "emotion": item.get("emotion") or item.get("emotion_label", ""),
+                        "topic": item.get("topic", "general")
+                    }
+                )
+        return None
+
+    def _dataset_signature(self) -> Dict[str, object]:
+        stat = os.stat(self.dataset_path)
+        return {"dataset": self.dataset_path, "size": stat.st_size, "mtime": int(stat.st_mtime)}
+
+    def _resumable_ingest(self) -> Tuple[Optional[str], Dict[str, object]]:
+        """Unpublished version and checkpoint of an interrupted ingest of the current dataset"""
+        signature = self._dataset_signature()
+        for version_dir in unpublished_versions(self.vector_store_path):
+            path = os.path.join(version_dir, INGEST_CHECKPOINT)
+            if os.path.exists(path):
+                with open(path, "r", encoding="utf-8") as f:
+                    checkpoint = json.load(f)
+                if all(checkpoint.get(key) == value for key, value in signature.items()):
+                    return version_dir, checkpoint
+        return None, {}
+
+    def _save_ingest_checkpoint(self, version_dir: str, checkpoint: Dict[str, object]):
+        # The store is saved first; everything before the offset is then guaranteed to be in it
+        self.vector_store.save_local(version_dir)
+        tmp_path = os.path.join(version_dir, f"{INGEST_CHECKPOINT}.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(checkpoint, f)
+        os.replace(tmp_path, os.path.join(version_dir, INGEST_CHECKPOINT))
+
     def _create_vector_store_from_local_data(self):
-        """Create vector store from local JSON data"""
+        """Build the store from the local JSONL dataset in fixed-size batches.
+
+        Only one batch of documents is held besides the store itself. Progress
+        is checkpointed into the unpublished version being built, and a build
+        interrupted on the same dataset file resumes from its checkpoint.
+        """
+        if not os.path.exists(self.dataset_path):
+            raise FileNotFoundError(f"Local dataset not found: {self.dataset_path}")
+        version_dir, checkpoint = self._resumable_ingest()
+        if version_dir:
+            print(f"Resuming local data ingest at line {checkpoint['line']} in {version_dir}")
+            self.vector_store = self._load_store(version_dir)
+        else:
+            version_dir = new_version_dir(self.vector_store_path)
+            checkpoint = {**self._dataset_signature(), "offset": 0, "line": 0}
+            self.vector_store = self._empty_vector_store()
+
+        started = time.perf_counter()
+        records = self._iter_local_documents(checkpoint["offset"], checkpoint["line"])
+        batches = 0
+        while True:
+            batch = list(islice(records, self.ingest_batch_size))
+            if not batch:
+                break
+            docs = [doc for doc, _, _ in batch]
+            if self.enricher is not None:
+                self.enricher.enrich(docs)
+            if not self.index_documents(docs, save=False):
+                raise RuntimeError(f"Indexing local data failed after line {checkpoint['line']}")
+            _, offset, line_num = batch[-1]
+            checkpoint.update(offset=offset, line=line_num)
+            batches += 1
+            if batches % INGEST_CHECKPOINT_EVERY == 0:
+                self._save_ingest_checkpoint(version_dir, checkpoint)
+                print(f"Indexed {len(self.vector_store.index_to_docstore_id)} documents through line "
+                      f"{line_num} ({time.perf_counter() - started:.1f}s)")
+
+        if not self.vector_store.index_to_docstore_id:
+            raise ValueError(f"No question/answer records in {self.dataset_path}")
+        checkpoint_path = os.path.join(version_dir, INGEST_CHECKPOINT)
+        if os.path.exists(checkpoint_path):
+            os.remove(checkpoint_path)
+        self._publish(self.vector_store, version_dir)
+        return self.vector_store
+
+    @staticmethod
+    def _document_id(doc: Document) -> str:
+        """Content hash of a document's text and source metadata, used as its docstore id.
+
+        Enrichment labels and near-duplicate provenance are left out, so a
+        record keeps its id when it is labelled or absorbs a duplicate.
+        """
+        metadata = source_metadata(doc.metadata)
+        return content_hash(doc.page_content + json.dumps(metadata, sort_keys=True, default=str))
+
+    def _unique_by_id(self, docs: List[Document]) -> Dict[str, Document]:
+        unique = {}
+        for doc in docs:
+            unique.setdefault(self._document_id(doc), doc)
+        return unique
+
+    def sync_documents(self, docs: List[Document]) -> Dict[str, int]:
+        """Make the store hold exactly docs, embedding only new or changed ones.
+
+        Docstore ids are content hashes, so the saved docstore doubles as the
+        manifest of what is indexed. Stores built before that have random ids
+        and are fully replaced on their first sync.
+        """
+        wanted = self._unique_by_id(docs)
+        existing = set(self.vector_store.index_to_docstore_id.values())
+        added = [doc_id for doc_id in wanted if doc_id not in existing]
+        removed = [doc_id for doc_id in existing if doc_id not in wanted]
+
+        if removed:
+            self.vector_store.delete(removed)
+        if added:
+            new_docs = [wanted[doc_id] for doc_id in added]
+            if self.enricher is not None:
+                self.enricher.enrich(new_docs)
+            self.vector_store.add_documents(new_docs, ids=added)
+        if added or removed:
+            self.save()
+        return {"added": len(added), "removed": len(removed), "unchanged": len(wanted) - len(added)}
+
+    def sync_local_data(self) -> Dict[str, int]:
+        """Sync the store with the local dataset"""
+        return self.sync_documents([doc for doc, _, _ in self._iter_local_documents()])
+
+    def _empty_vector_store(self) -> FAISS:
+        model = getattr(self.embeddings, "model", None)
+        if model is not None:
+            dim = model.get_sentence_embedding_dimension()
+        else:
+            dim = len(self.embeddings.embed_query("dimension"))
+        return FAISS(
+            embedding_function=self.embeddings,
+            index=faiss.IndexFlatL2(dim),
+            docstore=InMemoryDocstore(),
+            index_to_docstore_id={}
+        )
+
+    def index_documents(self, docs: List[Document], embeddings: Optional[List[List[float]]] = None,
+                        save: bool = True) -> bool:
+        """Add documents not indexed yet, optionally with precomputed embeddings"""
         try:
-            json_path = "data/mental_health_resources/mental_health_dataset_improved.jsonl"
-            if os.path.exists(json_path):
-                with open(json_path, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                
-                
-                docs = []
-                for item in data:
-                    
-                    if "user_input" in item and "therapist_response" in item:
-                        docs.append(Document(
-                            page_content=f"Client: {item['user_input']}\nTherapist: {item['therapist_response']}",
-                            metadata={
-                                "emotion": item.get("emotion_label", ""),
-                                "topic": item.get("topic", "general")
-                            }
-                        ))
-                
-                if not docs:
-                    
-                    docs = self._get_sample_documents()
-            else:
-                
-                docs = self._get_sample_documents()
-            
-            
-            vector_store = FAISS.from_documents(docs, self.embeddings)
-            vector_store.save_local(self.vector_store_path)
-            return vector_store
-            
+            # The docstore's dict answers membership directly; rebuilding an id set per batch
+            # made ingest quadratic in the store size
+            stored = self.vector_store.docstore._dict
+            batch_ids = set()
+            new = []
+            for i, doc in enumerate(docs):
+                doc_id = self._document_id(doc)
+                if doc_id not in stored and doc_id not in batch_ids:
+                    batch_ids.add(doc_id)
+                    new.append((i, doc_id))
+            if new:
+                texts = [docs[i].page_content for i, _ in new]
+                if embeddings is None:
+                    vectors = self.embeddings.embed_documents(texts)
+                else:
+                    vectors = [embeddings[i] for i, _ in new]
+                self.vector_store.add_embeddings(
+                    zip(texts, vectors),
+                    metadatas=[docs[i].metadata for i, _ in new],
+                    ids=[doc_id for _, doc_id in new]
+                )
+            if save:
+                self.save()
+            return True
         except Exception as e:
-            print(f"Error creating vector store from local data: {e}")
-           
-            docs = self._get_sample_documents()
-            vector_store = FAISS.from_documents(docs, self.embeddings)
-            vector_store.save_local(self.vector_store_path)
-            return vector_store
+            print(f"Error indexing documents: {e}")
+            return False
+
+    def clear_index(self) -> bool:
+        """Publish an empty store; earlier versions stay on disk until pruned"""
+        try:
+            self.save(self._empty_vector_store())
+            return True
+        except Exception as e:
+            print(f"Error clearing index: {e}")
+            return False
 
     def _get_sample_documents(self):
         """Get sample documents for fallback"""
@@ -119,22 +377,40 @@ class MentalHealthRetrievalService:
                 ))
             
             
-            self.vector_store.add_documents(docs)
-            self.vector_store.save_local(self.vector_store_path)
-            print(f"Added {len(docs)} documents from HuggingFace dataset")
+            stored = self.vector_store.docstore._dict
+            new_docs = {doc_id: doc for doc_id, doc in self._unique_by_id(docs).items() if doc_id not in stored}
+            if new_docs:
+                if self.enricher is not None:
+                    self.enricher.enrich(list(new_docs.values()))
+                self.vector_store.add_documents(list(new_docs.values()), ids=list(new_docs))
+                self.save()
+            print(f"Added {len(new_docs)} new documents from HuggingFace dataset")
             
         except Exception as e:
             print(f"Dataset loading error: {e}")
 
-    def get_context(self, query: str, emotion: str = "", k: int = 3) -> List[str]:
-        """Retrieve context with emotion filtering"""
-        filter_dict = {"emotion": emotion} if emotion else None
+    def get_context(self, query: str, emotion: str = "", k: int = 3, topic: str = "") -> List[str]:
+        """Retrieve context, searching only the emotion/topic partition when given.
+
+        Values with no documents give no context rather than unfiltered results.
+        """
+        filters = {field: value for field, value in (("emotion", emotion), ("topic", topic)) if value}
+        # A reload may swap the store mid-query; this query finishes on the pair it started with
+        vector_store, partitions = self._active
         try:
-            docs = self.vector_store.similarity_search(
-                query, 
-                k=k, 
-                filter=filter_dict
-            )
+            query_vector = self.embeddings.embed_query(query)
+            if not filters:
+                docs = vector_store.similarity_search_by_vector(query_vector, k=k)
+            elif partitions is not None and partitions.is_current(vector_store):
+                docs = [vector_store.docstore.search(doc_id)
+                        for doc_id in partitions.search(query_vector, filters, k)]
+            else:
+                # Changed in place since it was activated; partitions are only built when publishing,
+                # so filter over every vector until then
+                docs = vector_store.similarity_search_by_vector(
+                    query_vector, k=k, fetch_k=vector_store.index.ntotal,
+                    filter=lambda metadata: all(partition_key(metadata.get(field)) == partition_key(value)
+                                                for field, value in filters.items()))
             return [doc.page_content for doc in docs]
         except Exception as e:
             print(f"Retrieval error: {e}")
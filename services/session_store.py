@@ -0,0 +1,141 @@
+# services/session_store.py
+import sys
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Dict, List, Optional, Tuple
+
+DEFAULT_SESSION_ID = "default"
+
+
+class Session:
+    """Bounded message window for one conversation"""
+
+    def __init__(self, session_id: str, max_messages: int):
+        self.session_id = session_id
+        self.messages = deque(maxlen=max_messages)
+        self.size_bytes = 0
+        self.message_count = 0
+        self.created_at = time.time()
+        self.last_access = time.monotonic()
+        self.previous_user_input = ""
+        self._last_user_input = ""
+
+    def append(self, role: str, content: str) -> Dict[str, str]:
+        """Append a message, dropping the oldest one once the window is full"""
+        if len(self.messages) == self.messages.maxlen:
+            self.size_bytes -= sys.getsizeof(self.messages[0]["content"])
+        message = {"role": role, "content": content}
+        self.messages.append(message)
+        self.size_bytes += sys.getsizeof(content)
+        self.message_count += 1
+
+        # Track the most recent earlier user message that differs from the latest one
+        if role == "user" and content != self._last_user_input:
+            self.previous_user_input = self._last_user_input
+            self._last_user_input = content
+        return message
+
+    def history(self) -> List[Dict[str, str]]:
+        return list(self.messages)
+
+
+class SessionStore:
+    """Per-session conversation windows with LRU/TTL eviction and a memory ceiling"""
+
+    def __init__(
+        self,
+        max_messages: int = 50,
+        ttl_seconds: float = 1800,
+        max_sessions: int = 10000,
+        max_total_bytes: int = 64 * 1024 * 1024
+    ):
+        self.max_messages = max_messages
+        self.ttl_seconds = ttl_seconds
+        self.max_sessions = max_sessions
+        self.max_total_bytes = max_total_bytes
+        self._sessions: "OrderedDict[str, Session]" = OrderedDict()
+        self._total_bytes = 0
+        self._lock = threading.RLock()
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def __contains__(self, session_id: str) -> bool:
+        return session_id in self._sessions
+
+    def get(self, session_id: str) -> Optional[Session]:
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                return None
+            if self._expired(session, time.monotonic()):
+                self._remove(session_id)
+                return None
+            self._touch(session)
+            return session
+
+    def get_or_create(self, session_id: str) -> Session:
+        with self._lock:
+            session = self.get(session_id)
+            if session is None:
+                session = Session(session_id, self.max_messages)
+                self._sessions[session_id] = session
+                self._evict()
+            return session
+
+    def append(self, session_id: str, role: str, content: str) -> Tuple[Session, Dict[str, str]]:
+        """Append a message to a session, creating it if needed.
+
+        Returns the session written to with the message. A session object held
+        from before may have been evicted since, so callers use this one.
+        """
+        with self._lock:
+            session = self.get_or_create(session_id)
+            before = session.size_bytes
+            message = session.append(role, content)
+            self._total_bytes += session.size_bytes - before
+            self._touch(session)
+            self._evict()
+            return session, message
+
+    def delete(self, session_id: str):
+        with self._lock:
+            self._remove(session_id)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "sessions": len(self._sessions),
+                "total_bytes": self._total_bytes,
+                "evictions": self.evictions
+            }
+
+    def _touch(self, session: Session):
+        session.last_access = time.monotonic()
+        self._sessions.move_to_end(session.session_id)
+
+    def _expired(self, session: Session, now: float) -> bool:
+        return self.ttl_seconds is not None and now - session.last_access > self.ttl_seconds
+
+    def _remove(self, session_id: str):
+        session = self._sessions.pop(session_id, None)
+        if session is not None:
+            self._total_bytes -= session.size_bytes
+
+    def _evict(self):
+        """Drop expired sessions, then least recently used ones until within limits"""
+        now = time.monotonic()
+        # Sessions are kept in access order, so expired ones are at the front
+        while self._sessions:
+            oldest_id, oldest = next(iter(self._sessions.items()))
+            over_limit = (len(self._sessions) > self.max_sessions
+                          or self._total_bytes > self.max_total_bytes)
+            if not (self._expired(oldest, now) or over_limit):
+                break
+            if len(self._sessions) == 1 and not self._expired(oldest, now):
+                # Never evict the session currently being written to
+                break
+            self._remove(oldest_id)
+            self.evictions += 1
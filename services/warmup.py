@@ -0,0 +1,100 @@
+# services/warmup.py
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+PENDING = "pending"
+LOADING = "loading"
+READY = "ready"
+FAILED = "failed"
+
+
+class WarmupManager:
+    """Runs slow startup steps (model and index loading) off the import path.
+
+    Steps run in order on a background thread; status() reports progress so the
+    app can answer liveness checks immediately and readiness once warm.
+
+    Readiness waits only for required steps. An optional step (one whose
+    failure the app can serve around, e.g. with a fallback) never blocks it;
+    a failed optional step is reported under "degraded" instead.
+    """
+
+    def __init__(self, steps: List[Tuple] = None):
+        self._steps: List[Tuple[str, Callable[[], Any]]] = []
+        self._state: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self._thread = None
+        self._started_at = None
+        # Each step is (name, callable) or (name, callable, required)
+        for name, step, *options in steps or []:
+            self.add_step(name, step, *options)
+
+    def add_step(self, name: str, step: Callable[[], Any], required: bool = True):
+        with self._lock:
+            self._steps.append((name, step))
+            self._state[name] = {"state": PENDING, "seconds": 0.0, "error": None, "required": required}
+
+    def start(self, background: bool = True):
+        """Start warming up; a second call is a no-op"""
+        with self._lock:
+            if self._started_at is not None:
+                return
+            self._started_at = time.time()
+
+        if background:
+            self._thread = threading.Thread(target=self._run, name="warmup", daemon=True)
+            self._thread.start()
+        else:
+            self._run()
+
+    def wait(self, timeout: float = None) -> bool:
+        """Block until warmup finishes; returns readiness"""
+        if self._thread is not None:
+            self._thread.join(timeout)
+        return self.ready
+
+    def _run(self):
+        for name, step in self._steps:
+            self._set(name, state=LOADING)
+            start = time.perf_counter()
+            try:
+                step()
+                self._set(name, state=READY, seconds=round(time.perf_counter() - start, 3))
+                logger.info(f"Warmup step {name} ready")
+            except Exception as e:
+                self._set(name, state=FAILED, seconds=round(time.perf_counter() - start, 3), error=str(e))
+                logger.error(f"Warmup step {name} failed: {e}")
+
+    def _set(self, name: str, **fields):
+        with self._lock:
+            self._state[name].update(fields)
+
+    @property
+    def started(self) -> bool:
+        return self._started_at is not None
+
+    @staticmethod
+    def _is_ready(steps) -> bool:
+        return all(step["state"] == READY for step in steps if step["required"])
+
+    @property
+    def ready(self) -> bool:
+        with self._lock:
+            return self._is_ready(self._state.values())
+
+    def status(self) -> Dict[str, Any]:
+        with self._lock:
+            steps = {name: dict(step) for name, step in self._state.items()}
+        completed = sum(1 for step in steps.values() if step["state"] in (READY, FAILED))
+        return {
+            "ready": self._is_ready(steps.values()),
+            "degraded": [name for name, step in steps.items() if not step["required"] and step["state"] == FAILED],
+            "started": self.started,
+            "completed": completed,
+            "total": len(steps),
+            "steps": steps
+        }
@@ -0,0 +1,136 @@
+# utils/ann_index.py
+"""FAISS index construction for the semantic retrievers.
+
+Index types, all with L2 distance:
+
+* flat      exhaustive float32 search (exact, the previous behaviour)
+* hnsw      graph search over float32 vectors; no training, tune ef_search
+* ivf_flat  inverted lists of float32 vectors; tune nprobe
+* ivf_pq    inverted lists of product-quantized codes (pq_m bytes per vector)
+* sq8       exhaustive search over 8-bit scalar-quantized vectors (4x smaller)
+* ivf_sq8   inverted lists of 8-bit scalar-quantized vectors
+
+Trained state (coarse centroids, codebooks) is part of the written index, and
+the settings used to build it are saved alongside so a reload can tell whether
+a rebuild is needed.
+"""
+import json
+import logging
+import math
+import os
+from typing import Any, Dict, Optional
+
+import faiss
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+INDEX_TYPES = ("flat", "hnsw", "ivf_flat", "ivf_pq", "sq8", "ivf_sq8")
+# FAISS wants at least this many training points per IVF list
+MIN_POINTS_PER_LIST = 39
+MAX_TRAINING_POINTS = 100000
+
+
+def default_nlist(n_vectors: int) -> int:
+    return max(1, min(int(4 * math.sqrt(n_vectors)), n_vectors // MIN_POINTS_PER_LIST))
+
+
+def default_pq_m(dim: int) -> int:
+    """Largest number of sub-quantizers <= dim / 8 that divides dim"""
+    for m in range(max(dim // 8, 1), 0, -1):
+        if dim % m == 0:
+            return m
+    return 1
+
+
+def factory_string(index_type: str, dim: int, n_vectors: int, nlist: Optional[int] = None,
+                   hnsw_m: int = 32, pq_m: Optional[int] = None) -> str:
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"Unknown index type {index_type!r}; expected one of {', '.join(INDEX_TYPES)}")
+    nlist = nlist or default_nlist(n_vectors)
+    return {
+        "flat": "Flat",
+        "hnsw": f"HNSW{hnsw_m}",
+        "ivf_flat": f"IVF{nlist},Flat",
+        "ivf_pq": f"IVF{nlist},PQ{pq_m or default_pq_m(dim)}",
+        "sq8": "SQ8",
+        "ivf_sq8": f"IVF{nlist},SQ8",
+    }[index_type]
+
+
+def build_index(embeddings: np.ndarray, index_type: str = "flat", nlist: Optional[int] = None,
+                hnsw_m: int = 32, pq_m: Optional[int] = None, seed: int = 0,
+                ids: Optional[np.ndarray] = None) -> faiss.Index:
+    """Create, train if needed, and fill an index of the given type.
+
+    With ids, the index is wrapped in an IndexIDMap2 so vectors keep those
+    ids across later additions and removals.
+    """
+    embeddings = np.ascontiguousarray(embeddings, dtype="float32")
+    n_vectors, dim = embeddings.shape
+    description = factory_string(index_type, dim, n_vectors, nlist, hnsw_m, pq_m)
+    index = faiss.index_factory(dim, description)
+
+    if not index.is_trained:
+        if n_vectors > MAX_TRAINING_POINTS:
+            sample = np.random.default_rng(seed).choice(n_vectors, MAX_TRAINING_POINTS, replace=False)
+            training = embeddings[np.sort(sample)]
+        else:
+            training = embeddings
+        logger.info(f"Training {description} on {len(training)} vectors")
+        index.train(training)
+
+    if ids is None:
+        index.add(embeddings)
+        return index
+    id_index = faiss.IndexIDMap2(index)
+    id_index.add_with_ids(embeddings, np.asarray(ids, dtype="int64"))
+    return id_index
+
+
+def base_index(index: faiss.Index) -> faiss.Index:
+    """The index inside an IndexIDMap/IndexIDMap2 wrapper, or the index itself"""
+    if isinstance(index, (faiss.IndexIDMap, faiss.IndexIDMap2)):
+        return faiss.downcast_index(index.index)
+    return index
+
+
+def reconstruct_by_ids(index: faiss.Index, ids: np.ndarray) -> np.ndarray:
+    """Stored vectors for ids of an IndexIDMap2, in the order given.
+
+    An IVF index inside the map must never have had ids removed, since removal
+    leaves its lists out of step with the map.
+    """
+    stored = base_index(index).reconstruct_n(0, index.ntotal)
+    id_map = faiss.vector_to_array(index.id_map)
+    order = np.argsort(id_map)
+    return stored[order[np.searchsorted(id_map, ids, sorter=order)]]
+
+
+def configure_search(index: faiss.Index, nprobe: Optional[int] = None, ef_search: Optional[int] = None):
+    """Apply query-time accuracy/speed knobs that the index supports"""
+    index = base_index(index)
+    params = faiss.ParameterSpace()
+    if nprobe is not None and faiss.try_extract_index_ivf(index) is not None:
+        params.set_index_parameter(index, "nprobe", nprobe)
+    if ef_search is not None and "HNSW" in type(index).__name__:
+        params.set_index_parameter(index, "efSearch", ef_search)
+
+
+def config_path(index_path: str) -> str:
+    return f"{index_path}.json"
+
+
+def save_config(index_path: str, config: Dict[str, Any]):
+    tmp_path = f"{config_path(index_path)}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(config, f, indent=2)
+    os.replace(tmp_path, config_path(index_path))
+
+
+def load_config(index_path: str) -> Dict[str, Any]:
+    """Build settings of a saved index; indexes written before configs existed are flat"""
+    if not os.path.exists(config_path(index_path)):
+        return {"index_type": "flat"}
+    with open(config_path(index_path), "r", encoding="utf-8") as f:
+        return json.load(f)
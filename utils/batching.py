@@ -0,0 +1,167 @@
+# utils/batching.py
+"""Dynamic micro-batching for model calls shared across request threads.
+
+Concurrent callers submit single items; a worker thread collects whatever
+arrives within a short window (up to a maximum batch size), runs one batched
+forward pass per group of compatible calls, and hands each caller its own
+result. A request that finds the worker idle and nothing queued behind it
+runs without waiting, and if a batch fails its items are retried one by one
+so an error only reaches the caller whose item caused it.
+"""
+import os
+import queue
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from utils.model_registry import get_model
+
+MAX_BATCH_SIZE = int(os.getenv("BATCH_MAX_SIZE", "16"))
+MAX_WAIT_MS = float(os.getenv("BATCH_MAX_WAIT_MS", "5"))
+
+
+def _freeze(value: Any) -> Any:
+    """Hashable form of call kwargs so identical calls can share a batch"""
+    if isinstance(value, dict):
+        return tuple(sorted((k, _freeze(v)) for k, v in value.items()))
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(v) for v in value)
+    return value
+
+
+class _Request:
+    __slots__ = ("item", "kwargs", "key", "done", "result", "error")
+
+    def __init__(self, item: Any, kwargs: Dict[str, Any]):
+        self.item = item
+        self.kwargs = kwargs
+        self.key = _freeze(kwargs)
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class MicroBatcher:
+    def __init__(
+        self,
+        batch_fn: Callable[..., List[Any]],
+        max_batch_size: int = MAX_BATCH_SIZE,
+        max_wait_ms: float = MAX_WAIT_MS,
+        name: str = "batcher"
+    ):
+        """
+        Args:
+            batch_fn: called as batch_fn(items, **kwargs); must return one result per item
+            max_batch_size: largest number of items run in one call
+            max_wait_ms: how long the first item waits for others to join its batch
+        """
+        self.batch_fn = batch_fn
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max_wait_ms / 1000.0
+        self.name = name
+        self._queue: "queue.Queue[_Request]" = queue.Queue()
+        self._worker: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self.stats = {"items": 0, "batches": 0, "max_batch": 0}
+
+    def submit(self, item: Any, **kwargs) -> Any:
+        """Run item through batch_fn together with concurrent submissions"""
+        self._ensure_worker()
+        request = _Request(item, kwargs)
+        self._queue.put(request)
+        request.done.wait()
+        if request.error is not None:
+            raise request.error
+        return request.result
+
+    def _ensure_worker(self):
+        if self._worker is None:
+            with self._lock:
+                if self._worker is None:
+                    self._worker = threading.Thread(target=self._run, name=self.name, daemon=True)
+                    self._worker.start()
+
+    def _collect(self) -> List[_Request]:
+        try:
+            batch = [self._queue.get_nowait()]
+            busy = True
+        except queue.Empty:
+            batch = [self._queue.get()]
+            busy = False
+        # An item that reached an idle worker with nothing behind it runs at once; the
+        # window is only worth waiting for when requests queued up behind a running batch
+        if not busy and self._queue.empty():
+            return batch
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            groups: Dict[Any, List[_Request]] = {}
+            for request in self._collect():
+                groups.setdefault(request.key, []).append(request)
+            for requests in groups.values():
+                self._run_group(requests)
+
+    def _call(self, requests: List[_Request]):
+        results = self.batch_fn([r.item for r in requests], **requests[0].kwargs)
+        # Some pipelines unwrap single-item batches
+        if len(requests) == 1 and isinstance(results, dict):
+            results = [results]
+        if len(results) != len(requests):
+            raise RuntimeError(f"{self.name}: expected {len(requests)} results, got {len(results)}")
+        for request, result in zip(requests, results):
+            request.result = result
+
+    def _run_group(self, requests: List[_Request]):
+        try:
+            self._call(requests)
+        except Exception as e:
+            if len(requests) == 1:
+                requests[0].error = e
+            else:
+                # Retry one by one, so only the items that fail on their own get the error
+                for request in requests:
+                    try:
+                        self._call([request])
+                    except Exception as item_error:
+                        request.error = item_error
+        finally:
+            self.stats["items"] += len(requests)
+            self.stats["batches"] += 1
+            self.stats["max_batch"] = max(self.stats["max_batch"], len(requests))
+            for request in requests:
+                request.done.set()
+
+
+_batchers: Dict[Tuple[str, Optional[str]], MicroBatcher] = {}
+_batchers_lock = threading.Lock()
+
+
+def get_batcher(model_name: str, method: Optional[str] = None) -> MicroBatcher:
+    """Shared batcher around a registry model, or one of its methods (e.g. "encode")"""
+    key = (model_name, method)
+    batcher = _batchers.get(key)
+    if batcher is None:
+        with _batchers_lock:
+            batcher = _batchers.get(key)
+            if batcher is None:
+                def batch_fn(items, **kwargs):
+                    model = get_model(model_name)
+                    fn = getattr(model, method) if method else model
+                    return fn(items, **kwargs)
+                batcher = MicroBatcher(batch_fn, name=f"batch:{model_name}")
+                _batchers[key] = batcher
+    return batcher
+
+
+def batching_stats() -> Dict[str, Dict[str, int]]:
+    """Items, batches and largest batch seen per batcher"""
+    return {batcher.name + (f".{method}" if method else ""): dict(batcher.stats)
+            for (_, method), batcher in _batchers.items()}
@@ -0,0 +1,245 @@
+# utils/bm25_index.py
+"""Persistent BM25 index over the JSONL Q&A knowledge base.
+
+The index is built offline into a directory of flat files that workers open
+read-only with mmap, so every process shares one copy through the page cache.
+Each build writes a new version under <index_dir>/versions and publishes it
+through the CURRENT pointer (utils.index_versions), so a worker never opens
+a half-written or half-deleted index. A version holds:
+
+* vocab.bin / vocab.idx       sorted terms (CompactTextStore), binary searched
+* term_offsets.npy            uint64, postings of term t are [off[t], off[t+1])
+* term_idf.npy                float32 idf per term
+* postings_docs.npy           uint32 doc ids, ascending within a term
+* postings_weights.npy        float32 precomputed BM25 term weight per posting
+* doc_lengths.npy             uint32 tokens per document
+* documents.bin / .idx        page_content of each document
+* meta.json                   k1, b, average length and counts
+
+Weights are computed at build time, so a query is a few binary searches, a
+sum over the postings of its rarest terms, and a binary-search lookup of the
+common terms for the best of those candidates only. Documents matching
+nothing but common terms can be missed; raise max_postings to trade latency
+for exactness.
+"""
+import argparse
+import json
+import logging
+import os
+import re
+from array import array
+from bisect import bisect_left
+from collections import Counter, defaultdict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from utils.compact_store import CompactTextStore
+from utils.index_versions import current_dir, new_version_dir, prune_versions, publish
+
+logger = logging.getLogger(__name__)
+
+FORMAT_VERSION = 1
+META_FILE = "meta.json"
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:'[a-z]+)?")
+
+
+def tokenize(text: str) -> List[str]:
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+class _SortedTerms:
+    """Sequence view over a sorted CompactTextStore for bisect"""
+
+    def __init__(self, store: CompactTextStore):
+        self.store = store
+
+    def __len__(self) -> int:
+        return len(self.store)
+
+    def __getitem__(self, index: int) -> str:
+        return self.store[index]
+
+
+def build_bm25_index(documents: Iterable, output_dir: str, k1: float = 1.2, b: float = 0.75) -> int:
+    """Index documents (anything with page_content) into output_dir; returns the doc count"""
+    postings_docs = defaultdict(lambda: array("I"))
+    postings_tfs = defaultdict(lambda: array("I"))
+    doc_lengths = array("I")
+    texts = CompactTextStore()
+
+    for doc in documents:
+        doc_id = len(doc_lengths)
+        tokens = tokenize(doc.page_content)
+        for term, tf in Counter(tokens).items():
+            postings_docs[term].append(doc_id)
+            postings_tfs[term].append(tf)
+        doc_lengths.append(len(tokens))
+        texts.append(doc.page_content)
+
+    num_docs = len(doc_lengths)
+    terms = sorted(postings_docs)
+    lengths = np.frombuffer(doc_lengths, dtype=np.uint32) if num_docs else np.zeros(0, dtype=np.uint32)
+    avgdl = float(lengths.mean()) if num_docs else 0.0
+
+    offsets = np.zeros(len(terms) + 1, dtype=np.uint64)
+    offsets[1:] = np.cumsum([len(postings_docs[t]) for t in terms], dtype=np.uint64)
+    df = np.diff(offsets).astype(np.float64)
+    idf = np.log(1 + (num_docs - df + 0.5) / (df + 0.5)).astype(np.float32)
+
+    docs = np.empty(int(offsets[-1]), dtype=np.uint32)
+    tfs = np.empty(int(offsets[-1]), dtype=np.float32)
+    for i, term in enumerate(terms):
+        start, end = int(offsets[i]), int(offsets[i + 1])
+        docs[start:end] = np.frombuffer(postings_docs.pop(term), dtype=np.uint32)
+        tfs[start:end] = np.frombuffer(postings_tfs.pop(term), dtype=np.uint32)
+    term_of_posting = np.repeat(np.arange(len(terms)), np.diff(offsets).astype(np.int64))
+    # Corpora of empty documents have avgdl 0 (and no postings)
+    norm = k1 * (1 - b + b * lengths[docs] / (avgdl or 1.0)) if num_docs else np.zeros(0)
+    weights = (idf[term_of_posting] * tfs * (k1 + 1) / (tfs + norm)).astype(np.float32)
+
+    version_dir = new_version_dir(output_dir)
+    CompactTextStore(terms).save(os.path.join(version_dir, "vocab"))
+    texts.save(os.path.join(version_dir, "documents"))
+    np.save(os.path.join(version_dir, "term_offsets.npy"), offsets)
+    np.save(os.path.join(version_dir, "term_idf.npy"), idf)
+    np.save(os.path.join(version_dir, "postings_docs.npy"), docs)
+    np.save(os.path.join(version_dir, "postings_weights.npy"), weights)
+    np.save(os.path.join(version_dir, "doc_lengths.npy"), lengths)
+    with open(os.path.join(version_dir, META_FILE), "w", encoding="utf-8") as f:
+        json.dump({"version": FORMAT_VERSION, "k1": k1, "b": b, "avgdl": avgdl,
+                   "num_docs": num_docs, "num_terms": len(terms), "num_postings": len(docs)}, f)
+
+    publish(output_dir, version_dir)
+    # Files of a pruned version stay readable to workers that still have them mapped
+    prune_versions(output_dir)
+    logger.info(f"Indexed {num_docs} documents, {len(terms)} terms, {len(docs)} postings into {version_dir}")
+    return num_docs
+
+
+def published_dir(index_dir: str) -> Optional[str]:
+    """Directory of the published BM25 index under index_dir, or None"""
+    return current_dir(index_dir, legacy_marker=META_FILE)
+
+
+class BM25Index:
+    """Read-only BM25 index opened from a build_bm25_index directory"""
+
+    def __init__(self, index_dir: str, max_postings: int = 5000, rescore_count: int = 200,
+                 term_cache_size: int = 100000):
+        self.index_dir = published_dir(index_dir)
+        if self.index_dir is None:
+            raise FileNotFoundError(f"No BM25 index in {index_dir}")
+        self.max_postings = max_postings
+        self.rescore_count = rescore_count
+        self.term_cache_size = term_cache_size
+        self._term_cache: Dict[str, int] = {}
+        with open(os.path.join(self.index_dir, META_FILE), "r", encoding="utf-8") as f:
+            self.meta = json.load(f)
+        if self.meta.get("version") != FORMAT_VERSION:
+            raise ValueError(f"Unsupported BM25 index version in {self.index_dir}: {self.meta.get('version')}")
+        self.k1 = self.meta["k1"]
+
+        self.vocab = CompactTextStore.open(os.path.join(self.index_dir, "vocab"))
+        self.documents = CompactTextStore.open(os.path.join(self.index_dir, "documents"))
+        self._terms = _SortedTerms(self.vocab)
+        self.term_offsets = self._load("term_offsets.npy")
+        self.term_idf = self._load("term_idf.npy")
+        self.postings_docs = self._load("postings_docs.npy")
+        self.postings_weights = self._load("postings_weights.npy")
+        self.doc_lengths = self._load("doc_lengths.npy")
+
+    @staticmethod
+    def exists(index_dir: str) -> bool:
+        return published_dir(index_dir) is not None
+
+    def _load(self, filename: str) -> np.ndarray:
+        path = os.path.join(self.index_dir, filename)
+        # np.load cannot mmap zero-length arrays
+        if os.path.getsize(path) <= 128:
+            return np.load(path)
+        # Plain ndarray view of the map; np.memmap indexing is noticeably slower
+        return np.load(path, mmap_mode="r").view(np.ndarray)
+
+    def __len__(self) -> int:
+        return len(self.documents)
+
+    def term_id(self, term: str) -> int:
+        """Vocabulary id of term, or -1; recent lookups are cached per process"""
+        cached = self._term_cache.get(term)
+        if cached is not None:
+            return cached
+        i = bisect_left(self._terms, term)
+        term_id = i if i < len(self.vocab) and self.vocab[i] == term else -1
+        if len(self._term_cache) >= self.term_cache_size:
+            self._term_cache.clear()
+        self._term_cache[term] = term_id
+        return term_id
+
+    def search(self, query: str, k: int = 5) -> List[Tuple[int, float, float]]:
+        """Top k (doc_id, score, normalized score) for query, best first.
+
+        The normalized score divides by the largest score the query terms
+        could reach, so it lies in [0, 1] whatever the corpus size.
+        """
+        term_ids = [t for t in map(self.term_id, set(tokenize(query))) if t >= 0]
+        if not term_ids:
+            return []
+        max_score = float(sum(self.term_idf[t] for t in term_ids)) * (self.k1 + 1)
+
+        # Rarest terms carry the most weight: their postings pick the candidates,
+        # then the common terms are looked up for those candidates only
+        spans = sorted(((int(self.term_offsets[t]), int(self.term_offsets[t + 1])) for t in term_ids),
+                       key=lambda span: span[1] - span[0])
+        selected = []
+        budget = self.max_postings
+        for start, end in spans:
+            if selected and end - start > budget:
+                break
+            selected.append((start, end))
+            budget -= end - start
+
+        if len(selected) == 1:
+            start, end = selected[0]
+            doc_ids = np.asarray(self.postings_docs[start:end])
+            scores = np.asarray(self.postings_weights[start:end], dtype=np.float64)
+        else:
+            all_docs = np.concatenate([self.postings_docs[start:end] for start, end in selected])
+            all_weights = np.concatenate([self.postings_weights[start:end] for start, end in selected])
+            doc_ids, inverse = np.unique(all_docs, return_inverse=True)
+            scores = np.bincount(inverse, weights=all_weights)
+
+        if len(selected) < len(spans):
+            if len(scores) > self.rescore_count:
+                keep = np.sort(np.argpartition(-scores, self.rescore_count - 1)[:self.rescore_count])
+                doc_ids, scores = doc_ids[keep], scores[keep]
+            for start, end in spans[len(selected):]:
+                posting = self.postings_docs[start:end]
+                # Postings are sorted by doc id, so membership is a binary search
+                pos = np.minimum(np.searchsorted(posting, doc_ids), end - start - 1)
+                found = posting[pos] == doc_ids
+                scores[found] += self.postings_weights[start:end][pos[found]]
+
+        if len(scores) > k:
+            top = np.argpartition(-scores, k - 1)[:k]
+        else:
+            top = np.arange(len(scores))
+        top = top[np.lexsort((doc_ids[top], -scores[top]))]
+        return [(int(doc_ids[i]), float(scores[i]), float(scores[i]) / max_score) for i in top]
+
+    def close(self):
+        self.vocab.close()
+        self.documents.close()
+
+
+if __name__ == "__main__":
+    from utils.document_loader import DocumentLoader
+
+    parser = argparse.ArgumentParser(description="Build the BM25 index for a JSONL Q&A file")
+    parser.add_argument("jsonl_path", nargs="?",
+                        default="data/mental_health_resources/mental_health_dataset_improved.jsonl")
+    parser.add_argument("--output", default="vector_store/bm25")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    build_bm25_index(DocumentLoader().load_jsonl(args.jsonl_path), args.output)
@@ -0,0 +1,171 @@
+# utils/compact_store.py
+"""Compact string storage: one UTF-8 blob plus an offsets array.
+
+Strings are appended to a contiguous buffer and decoded only when accessed, so
+a large corpus costs roughly its UTF-8 size instead of one Python object per
+string. A saved store is two files (<prefix>.bin and <prefix>.idx) that can
+be memory-mapped read-only and shared between processes through the page cache.
+
+Both files carry the same random save token (a trailer after the blob, a
+header before the offsets), and .idx is replaced last, so a reader that
+catches a save between the two replaces sees mismatched tokens and retries
+instead of pairing a new blob with old offsets. The token is also exposed as
+``token``, so files derived from a store can be checked against the save
+they were built from.
+"""
+import mmap
+import os
+import sys
+import tempfile
+import time
+from array import array
+from typing import Iterable, Iterator, Optional, Union
+
+BLOB_SUFFIX = ".bin"
+OFFSETS_SUFFIX = ".idx"
+MAGIC = b"CTSIDX1\0"
+TOKEN_BYTES = 16
+HEADER_BYTES = len(MAGIC) + TOKEN_BYTES
+OPEN_ATTEMPTS = 5
+
+
+def _native_offsets(data: Union[bytes, memoryview]) -> array:
+    offsets = array("Q")
+    offsets.frombytes(bytes(data))
+    if sys.byteorder != "little":
+        offsets.byteswap()
+    return offsets
+
+
+class CompactTextStore:
+    def __init__(self, texts: Iterable[str] = ()):
+        self._blob: Union[bytearray, mmap.mmap] = bytearray()
+        self._offsets: Union[array, memoryview] = array("Q", [0])
+        self._files = []
+        self._maps = []
+        # Token of the save this store was written as or opened from
+        self.token: Optional[bytes] = None
+        for text in texts:
+            self.append(text)
+
+    def append(self, text: str) -> int:
+        """Add a string and return its index"""
+        if not isinstance(self._blob, bytearray):
+            raise TypeError("Memory-mapped stores are read-only")
+        self._blob.extend(text.encode("utf-8"))
+        self._offsets.append(len(self._blob))
+        return len(self._offsets) - 2
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def __getitem__(self, index: int) -> str:
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(index)
+        return self._blob[self._offsets[index]:self._offsets[index + 1]].decode("utf-8")
+
+    def __iter__(self) -> Iterator[str]:
+        for i in range(len(self)):
+            yield self[i]
+
+    @property
+    def nbytes(self) -> int:
+        return len(self._blob) + len(self._offsets) * 8
+
+    def save(self, prefix: str):
+        """Write <prefix>.bin and then <prefix>.idx, each through a unique temp file"""
+        directory = os.path.dirname(prefix)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        offsets = array("Q", self._offsets)
+        if sys.byteorder != "little":
+            offsets.byteswap()
+        token = os.urandom(TOKEN_BYTES)
+        for suffix, parts in ((BLOB_SUFFIX, (self._blob, token)), (OFFSETS_SUFFIX, (MAGIC, token, offsets))):
+            fd, tmp_path = tempfile.mkstemp(dir=directory or ".", prefix=os.path.basename(prefix) + suffix)
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    for part in parts:
+                        f.write(part)
+                os.replace(tmp_path, f"{prefix}{suffix}")
+            except BaseException:
+                os.unlink(tmp_path)
+                raise
+        self.token = token
+
+    @staticmethod
+    def exists(prefix: str) -> bool:
+        return os.path.exists(prefix + BLOB_SUFFIX) and os.path.exists(prefix + OFFSETS_SUFFIX)
+
+    @classmethod
+    def open(cls, prefix: str, use_mmap: bool = True) -> "CompactTextStore":
+        """Load a saved store, memory-mapping it read-only by default"""
+        for attempt in range(OPEN_ATTEMPTS):
+            store = cls()
+            try:
+                if store._open_files(prefix, use_mmap):
+                    return store
+            except BaseException:
+                store.close()
+                raise
+            store.close()
+            time.sleep(0.05 * (attempt + 1))
+        raise ValueError(f"{prefix}{BLOB_SUFFIX} and {prefix}{OFFSETS_SUFFIX} are from different saves")
+
+    def _check_header(self, prefix: str, blob, offsets) -> bool:
+        """Check the index header and that both files share a save token"""
+        if offsets[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"{prefix}{OFFSETS_SUFFIX} is not a compact store index")
+        token = bytes(offsets[len(MAGIC):HEADER_BYTES])
+        if blob[-TOKEN_BYTES:] != token:
+            return False
+        self.token = token
+        return True
+
+    def _open_files(self, prefix: str, use_mmap: bool) -> bool:
+        """Open both files; False if they are from different saves"""
+        if not use_mmap:
+            with open(prefix + BLOB_SUFFIX, "rb") as f:
+                blob = f.read()
+            with open(prefix + OFFSETS_SUFFIX, "rb") as f:
+                offsets = f.read()
+            if not self._check_header(prefix, blob, offsets):
+                return False
+            self._offsets = _native_offsets(memoryview(offsets)[HEADER_BYTES:])
+            # The token trailer lies past the last offset, so it is trimmed with it
+            self._blob = bytearray(blob[:self._offsets[-1]])
+            return True
+
+        blob_file = open(prefix + BLOB_SUFFIX, "rb")
+        self._files.append(blob_file)
+        offsets_file = open(prefix + OFFSETS_SUFFIX, "rb")
+        self._files.append(offsets_file)
+        offsets_map = mmap.mmap(offsets_file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._maps.append(offsets_map)
+        # mmap cannot map empty files
+        if os.fstat(blob_file.fileno()).st_size:
+            self._blob = mmap.mmap(blob_file.fileno(), 0, access=mmap.ACCESS_READ)
+            self._maps.append(self._blob)
+        else:
+            self._blob = b""
+
+        if not self._check_header(prefix, self._blob, offsets_map):
+            return False
+        if sys.byteorder == "little":
+            self._offsets = memoryview(offsets_map)[HEADER_BYTES:].cast("Q")
+        else:
+            self._offsets = _native_offsets(offsets_map[HEADER_BYTES:])
+        return True
+
+    def close(self):
+        if isinstance(self._offsets, memoryview):
+            self._offsets.release()
+            self._offsets = array("Q", [0])
+        for m in self._maps:
+            m.close()
+        for f in self._files:
+            f.close()
+        self._maps = []
+        self._files = []
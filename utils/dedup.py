@@ -0,0 +1,133 @@
+# utils/dedup.py
+"""Near-duplicate detection for chunks with MinHash and LSH banding.
+
+Each text is reduced to its set of word shingles, and a MinHash signature of
+``num_perm`` values estimates the Jaccard similarity of two such sets as the
+fraction of equal values. Signatures are split into ``bands`` bands; texts
+sharing any band become candidates, and a candidate counts as a duplicate
+when its estimated similarity reaches ``threshold``. With the defaults (16
+bands of 8 rows) a pair at similarity 0.85 is a candidate with probability
+above 0.99, and a pair at 0.5 with probability under 0.07.
+
+Memory grows with the number of kept texts: one signature and one bucket
+entry per band each.
+"""
+import re
+import zlib
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+_WORD_PATTERN = re.compile(r"\w+")
+# Provenance entries kept per surviving chunk; duplicate_count keeps the full tally
+MAX_DUPLICATE_REFS = 20
+# Metadata merge_provenance writes; not part of a chunk's identity
+PROVENANCE_FIELDS = ("duplicates", "duplicate_count")
+
+
+def shingles(text: str, size: int = 3) -> List[str]:
+    """Word n-grams of the normalized text; short texts give a single shingle"""
+    words = _WORD_PATTERN.findall(text.lower())
+    if len(words) <= size:
+        return [" ".join(words)]
+    return [" ".join(words[i:i + size]) for i in range(len(words) - size + 1)]
+
+
+def provenance(metadata: Dict[str, Any]) -> str:
+    """Short reference to where a chunk came from, such as faq.jsonl:12 or book.pdf:p40"""
+    ref = str(metadata.get("source", ""))
+    if metadata.get("line") is not None:
+        ref += f":{metadata['line']}"
+    if metadata.get("page") is not None:
+        ref += f":p{metadata['page']}"
+    return ref
+
+
+def merge_provenance(kept: Dict[str, Any], dropped: Dict[str, Any]) -> bool:
+    """Record a dropped chunk, and any duplicates it had absorbed, in the metadata of the chunk kept.
+
+    References the kept chunk already has, including its own, are skipped, so
+    seeing the same copy again on a later build changes nothing. Returns True
+    if the metadata changed.
+    """
+    refs = kept.get("duplicates", [])
+    known = set(refs) | {provenance(kept)}
+    new_refs = [ref for ref in dict.fromkeys([provenance(dropped)] + dropped.get("duplicates", []))
+                if ref not in known]
+    if not new_refs:
+        return False
+    kept["duplicates"] = refs + new_refs[:max(MAX_DUPLICATE_REFS - len(refs), 0)]
+    kept["duplicate_count"] = kept.get("duplicate_count", 0) + len(new_refs)
+    return True
+
+
+class NearDuplicateFilter:
+    def __init__(self, threshold: float = 0.85, num_perm: int = 128, bands: int = 16,
+                 shingle_size: int = 3, seed: int = 0):
+        if num_perm % bands:
+            raise ValueError(f"num_perm ({num_perm}) must be a multiple of bands ({bands})")
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.shingle_size = shingle_size
+        # Below 2**32, so a * hash + b stays within uint64 for 32-bit hashes
+        rng = np.random.default_rng(seed)
+        self._a = rng.integers(1, 1 << 32, num_perm, dtype=np.uint64)
+        self._b = rng.integers(0, 1 << 32, num_perm, dtype=np.uint64)
+        self._buckets: Dict[Tuple[int, bytes], List[int]] = {}
+        self._signatures: List[np.ndarray] = []
+        self.seen = 0
+        self.dropped = 0
+
+    def signature(self, text: str) -> np.ndarray:
+        hashes = np.fromiter((zlib.crc32(s.encode("utf-8")) for s in shingles(text, self.shingle_size)),
+                             dtype=np.uint64)
+        return ((hashes[:, None] * self._a + self._b) % _MERSENNE_PRIME).min(axis=0)
+
+    def _band_keys(self, signature: np.ndarray):
+        for band in range(self.bands):
+            yield band, signature[band * self.rows:(band + 1) * self.rows].tobytes()
+
+    def find(self, signature: np.ndarray) -> Optional[int]:
+        """Index of a kept text at least threshold-similar to signature, or None"""
+        checked = set()
+        for key in self._band_keys(signature):
+            for candidate in self._buckets.get(key, ()):
+                if candidate in checked:
+                    continue
+                checked.add(candidate)
+                if np.mean(self._signatures[candidate] == signature) >= self.threshold:
+                    return candidate
+        return None
+
+    def register(self, signature: np.ndarray) -> int:
+        """Keep a signature without checking it; returns its index"""
+        index = len(self._signatures)
+        self._signatures.append(signature)
+        for key in self._band_keys(signature):
+            self._buckets.setdefault(key, []).append(index)
+        return index
+
+    def add(self, text: str) -> Optional[int]:
+        """Keep text and return None, or return the index of the kept text it duplicates"""
+        self.seen += 1
+        signature = self.signature(text)
+        match = self.find(signature)
+        if match is not None:
+            self.dropped += 1
+            return match
+        self.register(signature)
+        return None
+
+    def __len__(self) -> int:
+        return len(self._signatures)
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "seen": self.seen,
+            "kept": self.seen - self.dropped,
+            "dropped": self.dropped,
+            "dropped_ratio": self.dropped / self.seen if self.seen else 0.0
+        }
@@ -1,24 +1,59 @@
 # utils/document_processor.py
+import io
 import json
+import multiprocessing
 import os
 import logging
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
 from pathlib import Path
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Iterable, Iterator, Optional, Tuple
 from langchain.schema import Document
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain_community.document_loaders import (
-    PyPDFLoader,
     CSVLoader,
     TextLoader,
     JSONLoader
 )
+from pypdf import PdfReader
+
+from utils.dedup import NearDuplicateFilter, merge_provenance
+from utils.extraction_cache import ExtractionCache, get_extraction_cache
+from utils.hashing import file_hash
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Bump when parsing changes, so cached extractions from older code are not reused
+PROCESSOR_VERSION = 1
+PDF_PAGES_PER_TASK = 32
+
+# (path, start, end, first line, file digest); start is None for whole-file units. Ranges
+# are pages for PDFs and line-aligned bytes for JSONL files
+ExtractionUnit = Tuple[str, Optional[int], Optional[int], int, Optional[str]]
+
+_worker_processor: Optional["MentalHealthDocumentProcessor"] = None
+
+
+def _init_extraction_worker(dedup_threshold: Optional[float]):
+    global _worker_processor
+    _worker_processor = MentalHealthDocumentProcessor(workers=1, dedup_threshold=dedup_threshold)
+
+
+def _run_unit_in_worker(unit: ExtractionUnit, chunk: bool) -> Dict[str, Any]:
+    return _worker_processor.run_unit(unit, chunk)
+
+
+def pdf_page_count(file_path: str) -> int:
+    return len(PdfReader(str(file_path)).pages)
+
+
 class MentalHealthDocumentProcessor:
-    def __init__(self):
+    def __init__(self, workers: Optional[int] = None, cache: Optional[ExtractionCache] = None,
+                 dedup_threshold: Optional[float] = 0.85):
         self.text_splitter = RecursiveCharacterTextSplitter(
             chunk_size=600,
             chunk_overlap=150,
@@ -32,25 +67,72 @@ class MentalHealthDocumentProcessor:
             '.csv': self._process_csv,
             '.json': self._process_json
         }
+        self.workers = workers or os.cpu_count() or 1
+        # Estimated Jaccard similarity at which chunks count as near-duplicates; None disables
+        self.dedup_threshold = dedup_threshold
+        self.dedup_stats: Dict[str, float] = {}
+        self.cache = cache if cache is not None else get_extraction_cache()
+        # file name -> {"seconds", "cached", "pages": {page number: seconds}}
+        self.timings: Dict[str, Dict[str, Any]] = {}
+
+    def _cache_key(self, file_path: Path, unit: str, digest: Optional[str]) -> Optional[str]:
+        if self.cache is None:
+            return None
+        return self.cache.key(digest or file_hash(str(file_path)), f"{file_path.name}:{unit}", PROCESSOR_VERSION)
+
+    def _record_timing(self, file_path: Path, seconds: float, cached: bool,
+                       pages: Optional[Dict[int, float]] = None):
+        timing = self.timings.setdefault(file_path.name, {"seconds": 0.0, "cached": True, "pages": {}})
+        timing["seconds"] += seconds
+        timing["cached"] = timing["cached"] and cached
+        timing["pages"].update(pages or {})
+
+    def _merge_timings(self, timings: Dict[str, Dict[str, Any]]):
+        for name, timing in timings.items():
+            self._record_timing(Path(name), timing["seconds"], timing["cached"], timing["pages"])
+
+    def timing_report(self) -> Dict[str, Dict[str, Any]]:
+        """Extraction seconds per file, with page count and slowest page for PDFs"""
+        report = {}
+        for name, timing in self.timings.items():
+            entry = {"seconds": round(timing["seconds"], 3), "cached": timing["cached"]}
+            if timing["pages"]:
+                slowest = max(timing["pages"], key=timing["pages"].get)
+                entry.update(pages=len(timing["pages"]), slowest_page=slowest,
+                             slowest_page_seconds=round(timing["pages"][slowest], 3))
+            report[name] = entry
+        return report
 
-    def process_file(self, file_path: str) -> List[Document]:
-        """Process a single file based on its extension"""
+    def process_file(self, file_path: str, digest: Optional[str] = None) -> List[Document]:
+        """Process a single file based on its extension, reusing a cached extraction of the same content"""
         file_path = Path(file_path)
         if not file_path.exists():
             logger.error(f"File not found: {file_path}")
             return []
 
         ext = file_path.suffix.lower()
-        if ext in self.supported_extensions:
-            try:
-                return self.supported_extensions[ext](file_path)
-            except Exception as e:
-                logger.error(f"Error processing {file_path}: {e}")
-                return []
-        else:
+        if ext not in self.supported_extensions:
             logger.warning(f"Unsupported file type: {ext}")
             return []
 
+        started = time.perf_counter()
+        key = self._cache_key(file_path, "file", digest)
+        docs = self.cache.get(key) if key else None
+        if docs is not None:
+            self._record_timing(file_path, time.perf_counter() - started, cached=True)
+            return docs
+        try:
+            docs = self.supported_extensions[ext](file_path)
+        except Exception as e:
+            logger.error(f"Error processing {file_path}: {e}")
+            return []
+        # Failed loads return nothing and are retried next time
+        if key and docs:
+            self.cache.put(key, docs)
+        if ext != '.pdf':
+            self._record_timing(file_path, time.perf_counter() - started, cached=False)
+        return docs
+
     def _process_jsonl(self, file_path: Path) -> List[Document]:
         """Specialized processor for mental health Q&A JSONL files"""
         docs = []
@@ -67,52 +149,209 @@ class MentalHealthDocumentProcessor:
             logger.error(f"JSONL loading failed, falling back to manual parsing: {e}")
             # Fallback to manual processing
             with open(file_path, 'r', encoding='utf-8') as f:
-                for line_num, line in enumerate(f, 1):
-                    try:
-                        data = json.loads(line)
-                        content = ""
-                        metadata = {
-                            "source": file_path.name,
-                            "line": line_num,
-                            "type": "qa_pair"
-                        }
-
-                        # Handle multiple possible structures
-                        if "instruction" in data and "output" in data:
-                            content = f"Q: {data['instruction']}\nA: {data['output']}"
-                        elif "question" in data and "answer" in data:
-                            content = f"Q: {data['question']}\nA: {data['answer']}"
-                        elif "content" in data:
-                            content = data["content"]
-                        
-                        if content:
-                            # Add additional metadata fields
-                            for field in ["topic", "severity", "tags"]:
-                                if field in data:
-                                    metadata[field] = data[field]
-                            docs.append(Document(page_content=content, metadata=metadata))
-                    except json.JSONDecodeError:
-                        logger.warning(f"Invalid JSON at line {line_num} in {file_path}")
+                docs = self._parse_jsonl_lines(f, file_path)
         
         return docs
 
+    def _parse_jsonl_lines(self, lines, file_path: Path, first_line: int = 1) -> List[Document]:
+        """Parse Q&A JSONL lines into documents"""
+        docs = []
+        for line_num, line in enumerate(lines, first_line):
+            try:
+                data = json.loads(line)
+                content = ""
+                metadata = {
+                    "source": file_path.name,
+                    "line": line_num,
+                    "type": "qa_pair"
+                }
+
+                # Handle multiple possible structures
+                if "instruction" in data and "output" in data:
+                    content = f"Q: {data['instruction']}\nA: {data['output']}"
+                elif "question" in data and "answer" in data:
+                    content = f"Q: {data['question']}\nA: {data['answer']}"
+                elif "content" in data:
+                    content = data["content"]
+                
+                if content:
+                    # Add additional metadata fields
+                    for field in ["topic", "severity", "tags"]:
+                        if field in data:
+                            metadata[field] = data[field]
+                    docs.append(Document(page_content=content, metadata=metadata))
+            except json.JSONDecodeError:
+                logger.warning(f"Invalid JSON at line {line_num} in {file_path}")
+        return docs
+
+    def process_jsonl_range(self, file_path: str, start: int, end: int, first_line: int = 1) -> List[Document]:
+        """Parse the lines of a JSONL file that start within bytes [start, end)"""
+        file_path = Path(file_path)
+        with open(file_path, 'rb') as f:
+            f.seek(start)
+            data = f.read(end - start)
+        # Split on b"\n" only, like iterating the file; str.splitlines would also break on
+        # U+2028, \x85 and other characters that JSON strings may contain unescaped
+        lines = [line.decode('utf-8') for line in io.BytesIO(data)]
+        return self._parse_jsonl_lines(lines, file_path, first_line)
+
     def _process_pdf(self, file_path: Path) -> List[Document]:
         """Process PDF files with mental health content"""
         try:
-            loader = PyPDFLoader(str(file_path))
-            docs = loader.load()
-            for doc in docs:
-                doc.metadata.update({
-                    "source": file_path.name,
-                    "type": "book_page",
-                    "chunk_type": "pdf_text"
-                })
+            docs = self._extract_pdf_pages(file_path, 0, None)
             logger.info(f"Loaded {len(docs)} pages from {file_path.name}")
             return docs
         except Exception as e:
             logger.error(f"Failed to load PDF {file_path.name}: {e}")
             return []
 
+    def _extract_pdf_pages(self, file_path: Path, start: int, end: Optional[int]) -> List[Document]:
+        """One document per page in [start, end), with per-page timings"""
+        reader = PdfReader(str(file_path))
+        total = len(reader.pages)
+        end = total if end is None else min(end, total)
+        docs, seconds = [], {}
+        for page_number in range(start, end):
+            started = time.perf_counter()
+            text = reader.pages[page_number].extract_text().strip()
+            seconds[page_number] = time.perf_counter() - started
+            docs.append(Document(page_content=text, metadata={
+                "source": file_path.name,
+                "page": page_number,
+                "page_label": reader.page_labels[page_number],
+                "total_pages": total,
+                "type": "book_page",
+                "chunk_type": "pdf_text"
+            }))
+        self._record_timing(file_path, sum(seconds.values()), cached=False, pages=seconds)
+        return docs
+
+    def process_pdf_pages(self, file_path: str, start: int, end: int, digest: Optional[str] = None) -> List[Document]:
+        """Pages [start, end) of a PDF, reusing a cached extraction of the same content"""
+        file_path = Path(file_path)
+        started = time.perf_counter()
+        key = self._cache_key(file_path, f"pages:{start}-{end}", digest)
+        docs = self.cache.get(key) if key else None
+        if docs is not None:
+            self._record_timing(file_path, time.perf_counter() - started, cached=True)
+            return docs
+        try:
+            docs = self._extract_pdf_pages(file_path, start, end)
+        except Exception as e:
+            logger.error(f"Failed to load pages {start}-{end} of PDF {file_path.name}: {e}")
+            return []
+        if key and docs:
+            self.cache.put(key, docs)
+        return docs
+
+    def page_count(self, file_path: Path, digest: Optional[str] = None) -> int:
+        """Page count of a PDF, cached so planning does not reparse unchanged PDFs"""
+        key = self._cache_key(file_path, "page_count", digest)
+        pages = self.cache.get_value(key) if key else None
+        if pages is None:
+            pages = pdf_page_count(file_path)
+            if key:
+                self.cache.put_value(key, pages)
+        return pages
+
+    def plan_units(self, files: Iterable[Path], split_bytes: Optional[int] = None,
+                   digests: Optional[Dict[Path, Optional[str]]] = None) -> List[ExtractionUnit]:
+        """Extraction units for files, in file order.
+
+        PDFs are cut into ranges of PDF_PAGES_PER_TASK pages (whole with a
+        single worker, since each unit reopens the PDF) and JSONL files larger
+        than split_bytes into line-aligned byte ranges; other files are one
+        unit. Units carry the file digest, so workers do not hash files again.
+        """
+        units = []
+        for file_path in files:
+            file_path = Path(file_path)
+            if digests is not None and file_path in digests:
+                digest = digests[file_path]
+            else:
+                digest = file_hash(str(file_path)) if self.cache is not None else None
+            if file_path.suffix.lower() == '.pdf':
+                try:
+                    pages = self.page_count(file_path, digest)
+                except Exception as e:
+                    logger.error(f"Failed to load PDF {file_path.name}: {e}")
+                    continue
+                step = PDF_PAGES_PER_TASK if self.workers > 1 else max(pages, 1)
+                units.extend((str(file_path), start, min(start + step, pages), 1, digest)
+                             for start in range(0, pages, step))
+                continue
+            size = file_path.stat().st_size
+            if file_path.suffix.lower() != '.jsonl' or split_bytes is None or size <= split_bytes:
+                units.append((str(file_path), None, None, 1, digest))
+                continue
+            with open(file_path, "rb") as f:
+                start, first_line = 0, 1
+                while start < size:
+                    f.seek(min(start + split_bytes, size))
+                    f.readline()
+                    end = min(f.tell(), size)
+                    f.seek(start)
+                    lines = f.read(end - start).count(b"\n")
+                    units.append((str(file_path), start, end, first_line, digest))
+                    start, first_line = end, first_line + lines
+        return units
+
+    def extract_unit(self, unit: ExtractionUnit) -> List[Document]:
+        path, start, end, first_line, digest = unit
+        if start is None:
+            return self.process_file(path, digest)
+        if path.lower().endswith('.pdf'):
+            return self.process_pdf_pages(path, start, end, digest)
+        return self.process_jsonl_range(path, start, end, first_line)
+
+    def run_unit(self, unit: ExtractionUnit, chunk: bool = False) -> Dict[str, Any]:
+        """Extract one unit, and chunk it if asked.
+
+        Returns docs (the chunks with chunk), the number of documents
+        extracted, load and chunk seconds, near-duplicate chunks dropped and
+        the unit's extraction timings.
+        """
+        self.timings = {}
+        started = time.perf_counter()
+        docs = self.extract_unit(unit)
+        loaded = time.perf_counter()
+        result = {"documents": len(docs), "load_seconds": loaded - started, "chunk_seconds": 0.0, "dropped": 0}
+        if chunk:
+            docs = self.chunk_documents(docs)
+            result["chunk_seconds"] = time.perf_counter() - loaded
+            result["dropped"] = self.dedup_stats.get("dropped", 0)
+        result["docs"] = docs
+        result["timings"] = self.timings
+        return result
+
+    def run_units(self, units: Iterable[ExtractionUnit], chunk: bool = False) -> Iterator[Dict[str, Any]]:
+        """run_unit results in unit order.
+
+        With more than one worker, units run in a process pool with at most
+        2 x workers in flight, so memory is bounded by a few units' results
+        however many units there are.
+        """
+        units = list(units)
+        if self.workers <= 1 or len(units) <= 1:
+            for unit in units:
+                before = self.timings
+                result = self.run_unit(unit, chunk)
+                self.timings = before
+                yield result
+            return
+        # Spawned workers do not inherit model threads from this process
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=min(self.workers, len(units)), mp_context=context,
+                                 initializer=_init_extraction_worker, initargs=(self.dedup_threshold,)) as pool:
+            queue = iter(units)
+            in_flight = deque(pool.submit(_run_unit_in_worker, unit, chunk)
+                              for unit in islice(queue, 2 * self.workers))
+            while in_flight:
+                result = in_flight.popleft().result()
+                for unit in islice(queue, 1):
+                    in_flight.append(pool.submit(_run_unit_in_worker, unit, chunk))
+                yield result
+
     def _process_txt(self, file_path: Path) -> List[Document]:
         """Process text files with mental health articles"""
         try:
@@ -171,7 +410,12 @@ class MentalHealthDocumentProcessor:
             return []
 
     def process_directory(self, data_dir: str) -> List[Document]:
-        """Process all supported files in a directory"""
+        """Process all supported files in a directory.
+
+        Files whose content was extracted before come from the cache. The
+        rest are extracted in a process pool, PDFs in page ranges of
+        PDF_PAGES_PER_TASK, and the combined PDF is cached as a whole.
+        """
         docs = []
         data_path = Path(data_dir)
         
@@ -179,20 +423,68 @@ class MentalHealthDocumentProcessor:
             logger.error(f"Directory not found: {data_dir}")
             return docs
 
-        for file_path in data_path.iterdir():
-            if file_path.is_file():
-                docs.extend(self.process_file(file_path))
-        
-        logger.info(f"Loaded {len(docs)} documents total from {data_dir}")
+        started = time.perf_counter()
+        files = sorted(p for p in data_path.iterdir() if p.is_file())
+        results: Dict[Path, List[Document]] = {}
+        digests: Dict[Path, Optional[str]] = {}
+        to_extract = []
+        for file_path in files:
+            digest = digests[file_path] = file_hash(str(file_path)) if self.cache is not None else None
+            cached = None
+            if file_path.suffix.lower() in self.supported_extensions:
+                key = self._cache_key(file_path, "file", digest)
+                cached = self.cache.get(key) if key else None
+            if cached is not None:
+                results[file_path] = cached
+                self._record_timing(file_path, 0.0, cached=True)
+            else:
+                to_extract.append(file_path)
+
+        units = self.plan_units(to_extract, digests=digests)
+        for unit, result in zip(units, self.run_units(units)):
+            results.setdefault(Path(unit[0]), []).extend(result["docs"])
+            self._merge_timings(result["timings"])
+
+        pdf_units = {unit[0] for unit in units if unit[1] is not None}
+        for file_path in files:
+            file_docs = results.get(file_path, [])
+            # Page ranges are cached as one entry once every page was extracted
+            if (self.cache is not None and str(file_path) in pdf_units and file_docs
+                    and len(file_docs) == file_docs[0].metadata.get("total_pages")):
+                self.cache.put(self._cache_key(file_path, "file", digests[file_path]), file_docs)
+            docs.extend(file_docs)
+
+        for name, timing in self.timing_report().items():
+            logger.info(f"Extracted {name}: {timing}")
+        logger.info(f"Loaded {len(docs)} documents total from {data_dir} in {time.perf_counter() - started:.2f}s")
         return docs
 
+    def drop_near_duplicates(self, chunks: List[Document]) -> List[Document]:
+        """Keep the first of each group of near-duplicate chunks, with the others' provenance"""
+        dedup_filter = NearDuplicateFilter(self.dedup_threshold)
+        kept = []
+        for chunk in chunks:
+            match = dedup_filter.add(chunk.page_content)
+            if match is None:
+                kept.append(chunk)
+            else:
+                merge_provenance(kept[match].metadata, chunk.metadata)
+        self.dedup_stats = dedup_filter.stats()
+        if dedup_filter.dropped:
+            logger.info(f"Dropped {dedup_filter.dropped} of {dedup_filter.seen} chunks as near-duplicates "
+                        f"({self.dedup_stats['dropped_ratio']:.1%})")
+        return kept
+
     def chunk_documents(self, documents: List[Document]) -> List[Document]:
         """Split documents into chunks with mental health context preservation"""
+        self.dedup_stats = {}
         if not documents:
             return []
             
         try:
             chunks = self.text_splitter.split_documents(documents)
+            if self.dedup_threshold is not None:
+                chunks = self.drop_near_duplicates(chunks)
             # Add chunk-specific metadata
             for i, chunk in enumerate(chunks):
                 chunk.metadata["chunk_id"] = i
@@ -0,0 +1,177 @@
+# utils/embedding_cache.py
+"""Content-addressed on-disk cache of document embeddings.
+
+Each model gets its own directory holding two append-only files:
+
+* keys.bin     16-byte blake2b digest of each cached text, one per row
+* vectors.f32  float32 embedding rows in the same order
+
+Vectors are read through a read-only memory map; only the key -> row index is
+held in memory. Appends from several processes are serialised with a file
+lock, and each process picks up rows written by the others before appending.
+A torn final row from a crash is ignored and overwritten.
+
+Only document/passage embeddings are cached. User queries are never written
+to disk; they go through the in-memory query cache instead.
+"""
+import hashlib
+import json
+import os
+import re
+import threading
+from typing import Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: in-process locking only
+    fcntl = None
+
+KEY_BYTES = 16
+DEFAULT_CACHE_DIR = "vector_store/embedding_cache"
+
+
+def text_key(text: str) -> bytes:
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=KEY_BYTES).digest()
+
+
+class EmbeddingCache:
+    def __init__(self, directory: str, model_id: str):
+        self.model_id = model_id
+        self.directory = os.path.join(directory, re.sub(r"[^A-Za-z0-9._-]+", "__", model_id))
+        os.makedirs(self.directory, exist_ok=True)
+        self.keys_path = os.path.join(self.directory, "keys.bin")
+        self.vectors_path = os.path.join(self.directory, "vectors.f32")
+        self.meta_path = os.path.join(self.directory, "meta.json")
+        self.lock_path = os.path.join(self.directory, ".lock")
+
+        self.dim: Optional[int] = None
+        self._rows: Dict[bytes, int] = {}
+        self._count = 0
+        self._vectors: Optional[np.ndarray] = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+        if os.path.exists(self.meta_path):
+            with open(self.meta_path, "r", encoding="utf-8") as f:
+                self.dim = json.load(f)["dim"]
+        with self._lock:
+            self._refresh()
+
+    def _valid_rows(self) -> int:
+        """Rows fully present in both files"""
+        if self.dim is None or not os.path.exists(self.keys_path):
+            return 0
+        key_rows = os.path.getsize(self.keys_path) // KEY_BYTES
+        vector_rows = os.path.getsize(self.vectors_path) // (4 * self.dim) if os.path.exists(self.vectors_path) else 0
+        return min(key_rows, vector_rows)
+
+    def _refresh(self):
+        """Index rows appended since the last refresh, possibly by other processes"""
+        rows = self._valid_rows()
+        known = self._count
+        if rows > known:
+            with open(self.keys_path, "rb") as f:
+                f.seek(known * KEY_BYTES)
+                data = f.read((rows - known) * KEY_BYTES)
+            for i in range(rows - known):
+                self._rows.setdefault(data[i * KEY_BYTES:(i + 1) * KEY_BYTES], known + i)
+            self._count = rows
+        if rows and (self._vectors is None or len(self._vectors) != rows):
+            self._vectors = np.memmap(self.vectors_path, dtype=np.float32, mode="r", shape=(rows, self.dim))
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def get_many(self, texts: Sequence[str]) -> List[Optional[np.ndarray]]:
+        """Cached vector for each text, or None"""
+        with self._lock:
+            rows = [self._rows.get(text_key(text)) for text in texts]
+            found = sum(row is not None for row in rows)
+            self.hits += found
+            self.misses += len(rows) - found
+            return [None if row is None else np.array(self._vectors[row]) for row in rows]
+
+    def put_many(self, texts: Sequence[str], vectors: np.ndarray):
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        if not len(texts):
+            return
+        with self._lock, open(self.lock_path, "a") as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                if self.dim is None:
+                    self.dim = int(vectors.shape[1])
+                    with open(self.meta_path, "w", encoding="utf-8") as f:
+                        json.dump({"model_id": self.model_id, "dim": self.dim}, f)
+                elif vectors.shape[1] != self.dim:
+                    raise ValueError(f"Embedding cache for {self.model_id} holds {self.dim}-d vectors, "
+                                     f"got {vectors.shape[1]}-d")
+                self._refresh()
+
+                new_keys, new_rows = {}, []
+                for text, vector in zip(texts, vectors):
+                    key = text_key(text)
+                    if key not in self._rows and key not in new_keys:
+                        new_keys[key] = None
+                        new_rows.append(vector)
+                if not new_keys:
+                    return
+
+                # Truncate any torn tail so keys and vectors stay row-aligned
+                start = self._count
+                with open(self.vectors_path, "ab") as f:
+                    f.truncate(start * 4 * self.dim)
+                    f.write(np.vstack(new_rows).tobytes())
+                    f.flush()
+                    os.fsync(f.fileno())
+                with open(self.keys_path, "ab") as f:
+                    f.truncate(start * KEY_BYTES)
+                    f.write(b"".join(new_keys))
+                self._refresh()
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def embed(self, texts: Sequence[str], encode: Callable[[List[str]], np.ndarray]) -> np.ndarray:
+        """Embeddings for texts, calling encode only on texts not cached yet"""
+        vectors = self.get_many(texts)
+        missing = list(dict.fromkeys(text for text, vector in zip(texts, vectors) if vector is None))
+        if missing:
+            encoded = np.asarray(encode(missing), dtype=np.float32)
+            self.put_many(missing, encoded)
+            fresh = dict(zip(missing, encoded))
+            vectors = [fresh[text] if vector is None else vector for text, vector in zip(texts, vectors)]
+        if not vectors:
+            return np.zeros((0, self.dim or 0), dtype=np.float32)
+        return np.vstack(vectors)
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._rows),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0
+        }
+
+
+_caches: Dict[str, EmbeddingCache] = {}
+_caches_lock = threading.Lock()
+
+
+def get_embedding_cache(model_id: str) -> Optional[EmbeddingCache]:
+    """Shared cache for model_id under EMBEDDING_CACHE_DIR; None if the cache is disabled"""
+    directory = os.getenv("EMBEDDING_CACHE_DIR", DEFAULT_CACHE_DIR)
+    if not directory:
+        return None
+    with _caches_lock:
+        if model_id not in _caches:
+            _caches[model_id] = EmbeddingCache(directory, model_id)
+        return _caches[model_id]
+
+
+def embedding_cache_stats() -> Dict[str, Dict[str, float]]:
+    return {model_id: cache.stats() for model_id, cache in _caches.items()}
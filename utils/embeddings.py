@@ -0,0 +1,34 @@
+# utils/embeddings.py
+from typing import List
+from langchain_core.embeddings import Embeddings
+
+from utils.batching import get_batcher
+from utils.embedding_cache import get_embedding_cache
+from utils.model_registry import DEFAULT_EMBEDDING_MODEL, get_sentence_transformer, sentence_transformer_name
+
+
+class SharedSentenceEmbeddings(Embeddings):
+    """LangChain embeddings backed by the registry's shared SentenceTransformer.
+
+    Drop-in for HuggingFaceEmbeddings without loading a second copy of the model.
+    Document embeddings go through the on-disk embedding cache.
+    """
+
+    def __init__(self, model_name: str = DEFAULT_EMBEDDING_MODEL):
+        self.model_name = model_name
+
+    @property
+    def model(self):
+        return get_sentence_transformer(self.model_name)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        texts = [text.replace("\n", " ") for text in texts]
+        cache = get_embedding_cache(sentence_transformer_name(self.model_name))
+        if cache is None:
+            return self.model.encode(texts).tolist()
+        return cache.embed(texts, self.model.encode).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        # Single queries from concurrent requests are batched into one encode call
+        encoder = get_batcher(sentence_transformer_name(self.model_name), "encode")
+        return encoder.submit(text.replace("\n", " ")).tolist()
@@ -0,0 +1,125 @@
+# utils/enrichment.py
+"""Index-time emotion and topic labels for knowledge-base documents.
+
+Documents are classified once, in batches, while the index is built:
+
+* emotion  go_emotions classifier from the model registry (top 3 kept)
+* topic    PrototypeClassifier over the response and advice corpora, whose
+           file names (anxiety, sleep, grief, ...) are the topic labels
+
+Labels a source already provides are kept; scores are stored alongside, so
+retrieval can filter by emotion or topic without running a model per query.
+Everything enrichment adds, and the provenance near-duplicate removal
+records, can be stripped again with source_metadata, which document ids are
+computed from, so enriched and raw copies of a record get the same id.
+"""
+import logging
+from typing import Any, Dict, List, Optional
+
+from langchain.schema import Document
+
+from utils.dedup import PROVENANCE_FIELDS
+from utils.model_registry import EMOTION_CLASSIFIER, get_model, registry
+
+logger = logging.getLogger(__name__)
+
+KNOWLEDGE_TOPIC_CLASSIFIER = "knowledge-topic-prototypes"
+# Bump when labelling changes, so enriched metadata can be told apart
+ENRICHMENT_VERSION = 1
+# Topic values that mean "not labelled" in the source data
+UNLABELLED_TOPICS = ("", "general")
+ENRICHMENT_FIELDS = ("emotion_scores", "topic_scores", "enrichment_version", "source_labels")
+
+
+def source_metadata(metadata: Dict[str, Any]) -> Dict[str, Any]:
+    """metadata as it was before enrichment and provenance merging"""
+    original = {key: value for key, value in metadata.items()
+                if key not in ENRICHMENT_FIELDS and key not in PROVENANCE_FIELDS}
+    for field, value in metadata.get("source_labels", {}).items():
+        if value is None:
+            original.pop(field, None)
+        else:
+            original[field] = value
+    return original
+
+
+def _set_label(metadata: Dict[str, Any], field: str, label: str):
+    """Set a classifier label, remembering the source value it replaces"""
+    metadata.setdefault("source_labels", {}).setdefault(field, metadata.get(field))
+    metadata[field] = label
+
+
+def _load_knowledge_topic_classifier(responses_dir: str = "data/responses", advice_dir: str = "data/advice"):
+    from utils.prototype_classifier import PrototypeClassifier, load_corpus_texts
+
+    prototypes: Dict[str, List[str]] = {}
+    for folder in (responses_dir, advice_dir):
+        for topic, texts in load_corpus_texts(folder).items():
+            prototypes.setdefault(topic, []).extend(texts)
+    return PrototypeClassifier({topic: texts for topic, texts in prototypes.items() if texts})
+
+
+registry.register(KNOWLEDGE_TOPIC_CLASSIFIER, _load_knowledge_topic_classifier)
+
+
+class DocumentEnricher:
+    def __init__(self, batch_size: int = 32, max_chars: int = 1000):
+        self.batch_size = batch_size
+        self.max_chars = max_chars
+        self.documents = 0
+        self.labelled = {EMOTION_CLASSIFIER: 0, KNOWLEDGE_TOPIC_CLASSIFIER: 0}
+        # A classifier that fails to load is skipped for the rest of the run
+        self.disabled: Dict[str, str] = {}
+
+    def _classify(self, name: str, texts: List[str]) -> Optional[List[Any]]:
+        if name in self.disabled:
+            return None
+        try:
+            model = get_model(name)
+            if name == EMOTION_CLASSIFIER:
+                return model(texts, batch_size=self.batch_size, truncation=True)
+            return model.score_batch(texts)
+        except Exception as e:
+            logger.error(f"Enrichment with {name} disabled, documents will not get its labels: {e}")
+            self.disabled[name] = str(e)
+            return None
+
+    def enrich(self, docs: List[Document]) -> List[Document]:
+        """Add emotion and topic labels with scores to docs in place"""
+        for start in range(0, len(docs), self.batch_size):
+            batch = docs[start:start + self.batch_size]
+            texts = [doc.page_content[:self.max_chars] for doc in batch]
+
+            emotions = self._classify(EMOTION_CLASSIFIER, texts)
+            if emotions is not None:
+                for doc, ranked in zip(batch, emotions):
+                    # A single-text call may come back unwrapped
+                    ranked = ranked if isinstance(ranked, list) else [ranked]
+                    doc.metadata["emotion_scores"] = {e["label"]: round(float(e["score"]), 4) for e in ranked}
+                    if not doc.metadata.get("emotion"):
+                        _set_label(doc.metadata, "emotion", ranked[0]["label"])
+                self.labelled[EMOTION_CLASSIFIER] += len(batch)
+
+            topics = self._classify(KNOWLEDGE_TOPIC_CLASSIFIER, texts)
+            if topics is not None:
+                for doc, result in zip(batch, topics):
+                    doc.metadata["topic_scores"] = {label: round(score, 4) for label, score
+                                                    in zip(result["labels"][:3], result["scores"][:3])}
+                    if doc.metadata.get("topic", "") in UNLABELLED_TOPICS:
+                        _set_label(doc.metadata, "topic", result["labels"][0])
+                self.labelled[KNOWLEDGE_TOPIC_CLASSIFIER] += len(batch)
+
+            if emotions is not None or topics is not None:
+                for doc in batch:
+                    doc.metadata["enrichment_version"] = ENRICHMENT_VERSION
+            self.documents += len(batch)
+        return docs
+
+    def stats(self) -> Dict[str, Any]:
+        """Documents seen and labelled per classifier; disabled maps a classifier that failed to its error"""
+        return {
+            "documents": self.documents,
+            "labelled": dict(self.labelled),
+            "enabled": not self.disabled,
+            "disabled": dict(self.disabled)
+        }
@@ -0,0 +1,77 @@
+# utils/extraction_cache.py
+"""On-disk cache of documents extracted from source files.
+
+Entries are keyed by the file's content hash, the extraction unit (a whole
+file, a PDF page range, or a small value such as a PDF's page count) and the
+processor version. An unchanged file is
+therefore read back instead of parsed, and bumping the processor version
+invalidates everything extracted by older parsing code. Each entry is one
+JSON file written atomically, so concurrent workers can share the cache.
+"""
+import json
+import os
+import threading
+from typing import Any, Dict, List, Optional
+
+from langchain.schema import Document
+
+from utils.hashing import content_hash
+
+DEFAULT_CACHE_DIR = "vector_store/extraction_cache"
+
+
+class ExtractionCache:
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(file_digest: str, unit: str, version: int) -> str:
+        return content_hash(f"{version}:{unit}:{file_digest}")
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], f"{key}.json")
+
+    def get_value(self, key: str) -> Optional[Any]:
+        """A JSON value stored with put_value, or None"""
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                value = json.load(f)
+        except (OSError, ValueError):
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return value
+
+    def put_value(self, key: str, value: Any):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.tmp-{os.getpid()}-{threading.get_ident()}"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(value, f, default=str)
+        os.replace(tmp_path, path)
+
+    def get(self, key: str) -> Optional[List[Document]]:
+        entries = self.get_value(key)
+        if entries is None:
+            return None
+        return [Document(page_content=entry["page_content"], metadata=entry["metadata"]) for entry in entries]
+
+    def put(self, key: str, docs: List[Document]):
+        self.put_value(key, [{"page_content": doc.page_content, "metadata": doc.metadata} for doc in docs])
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "hit_rate": self.hits / lookups if lookups else 0.0}
+
+
+def get_extraction_cache() -> Optional[ExtractionCache]:
+    """Cache under EXTRACTION_CACHE_DIR; None if the cache is disabled"""
+    directory = os.getenv("EXTRACTION_CACHE_DIR", DEFAULT_CACHE_DIR)
+    return ExtractionCache(directory) if directory else None
@@ -0,0 +1,16 @@
+# utils/hashing.py
+import hashlib
+
+
+def content_hash(text: str) -> str:
+    """Stable 128-bit hex digest of a text, used to detect new or changed records"""
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def file_hash(path: str, block_size: int = 1 << 20) -> str:
+    """content_hash-sized digest of a file's bytes, read in blocks"""
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
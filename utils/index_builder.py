@@ -1,53 +1,335 @@
 # utils/index_builder.py
+"""Streaming, parallel index build for the mental health resources.
+
+    load -> chunk  (the document processor's pool, one task per file, PDF page
+                    range or JSONL byte range)
+    embed -> index (main process, batches of batch_size chunks)
+
+At most a few tasks are in flight and chunks are flushed to the index in
+fixed-size batches, so peak memory depends on the largest task and the batch
+size, not on the size of the document set. Progress is checkpointed by task;
+an interrupted build resumes from the last checkpoint, and documents that
+were indexed after it are recognised by their content-hash ids and skipped.
+
+Builds write into a new, unpublished version directory (utils.index_versions)
+and publish it only when finished, so running chat workers keep serving the
+previous index until they hot-reload the new one.
+"""
+import json
 import os
 import logging
+import shutil
+import time
 from pathlib import Path
-from typing import Optional
+from typing import Any, Dict, List, Optional
 
-from utils.document_processor import MentalHealthDocumentProcessor
+from utils.dedup import NearDuplicateFilter, merge_provenance
+from utils.document_processor import ExtractionUnit, MentalHealthDocumentProcessor
+from utils.enrichment import DocumentEnricher
+from utils.index_versions import new_version_dir, prune_versions, publish, unpublished_versions
 from services.retrieval_service import MentalHealthRetrievalService as RetrievalService
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-def build_mental_health_index(data_dir: str = "data/mental_health_resources") -> bool:
+CHECKPOINT_FILE = "build_checkpoint.json"
+
+
+def _task_key(unit: ExtractionUnit) -> str:
+    """Identifies a task and the file version it read, so edited files are redone"""
+    path, start, end, _, _ = unit
+    stat = os.stat(path)
+    return f"{path}:{start}-{end}:{stat.st_size}:{int(stat.st_mtime)}"
+
+
+class StageTimer:
+    def __init__(self):
+        self.items: Dict[str, int] = {}
+        self.seconds: Dict[str, float] = {}
+
+    def add(self, stage: str, items: int, seconds: float):
+        self.items[stage] = self.items.get(stage, 0) + items
+        self.seconds[stage] = self.seconds.get(stage, 0.0) + seconds
+
+    def report(self) -> Dict[str, Dict[str, float]]:
+        """Items and busy seconds per stage; load/chunk seconds are summed over workers"""
+        return {
+            stage: {
+                "items": self.items[stage],
+                "seconds": round(self.seconds[stage], 3),
+                "per_second": round(self.items[stage] / self.seconds[stage], 1) if self.seconds[stage] else 0.0
+            }
+            for stage in self.items
+        }
+
+
+class IndexBuildPipeline:
+    def __init__(
+        self,
+        data_dir: str,
+        retrieval_service: RetrievalService,
+        workers: Optional[int] = None,
+        batch_size: int = 256,
+        checkpoint_every: int = 20,
+        split_bytes: int = 8 * 1024 * 1024,
+        output_dir: Optional[str] = None,
+        enrich: bool = True
+    ):
+        self.data_dir = data_dir
+        self.retrieval_service = retrieval_service
+        self.workers = workers or os.cpu_count() or 1
+        self.batch_size = batch_size
+        self.checkpoint_every = checkpoint_every
+        self.split_bytes = split_bytes
+        self.output_dir = output_dir or new_version_dir(retrieval_service.vector_store_path)
+        self.checkpoint_path = os.path.join(self.output_dir, CHECKPOINT_FILE)
+        self.timer = StageTimer()
+        self.processor = MentalHealthDocumentProcessor(workers=self.workers)
+        self.enricher = DocumentEnricher() if enrich else None
+        self.completed: List[str] = []
+        self.chunk_count = 0
+        self._indexed_chunks = 0
+        self._pending_chunks: list = []
+        self._pending_keys: List[str] = []
+        # Near-duplicates are dropped across tasks too; kept entries are a pending chunk
+        # or, once indexed, its docstore id
+        self.dedup = NearDuplicateFilter()
+        self._kept: list = []
+        self._pending_kept: List[int] = []
+        self._worker_dropped = 0
+        # Store ids present when the build started, and those matched again by re-extracted
+        # chunks; baseline chunks that are not confirmed came from changed or removed files
+        self._baseline: set = set()
+        self._confirmed: set = set()
+        self._updated = 0
+        self.removed = 0
+        self._batches_since_checkpoint = 0
+
+    def _load_checkpoint(self) -> Dict[str, Any]:
+        if not os.path.exists(self.checkpoint_path):
+            return {}
+        with open(self.checkpoint_path, "r", encoding="utf-8") as f:
+            checkpoint = json.load(f)
+        if checkpoint.get("data_dir") != self.data_dir:
+            return {}
+        return checkpoint
+
+    def _save_checkpoint(self):
+        # The store is saved first; tasks listed here are then guaranteed to be in it
+        self.retrieval_service.vector_store.save_local(self.output_dir)
+        tmp_path = f"{self.checkpoint_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"data_dir": self.data_dir, "completed": self.completed,
+                       "chunks": self._indexed_chunks, "baseline": sorted(self._baseline),
+                       "confirmed": sorted(self._confirmed), "stages": self.timer.report()}, f)
+        os.replace(tmp_path, self.checkpoint_path)
+        self._batches_since_checkpoint = 0
+
+    def _flush(self, force: bool = False):
+        """Embed and index pending chunks in batches; tasks become complete once all their chunks are in"""
+        if not force and len(self._pending_chunks) < self.batch_size:
+            return
+        while self._pending_chunks:
+            batch = self._pending_chunks[:self.batch_size]
+            del self._pending_chunks[:self.batch_size]
+            kept_positions = self._pending_kept[:self.batch_size]
+            del self._pending_kept[:self.batch_size]
+            if self.enricher is not None:
+                # Ids leave enrichment labels out, so re-extracted chunks still match stored ones
+                started = time.perf_counter()
+                self.enricher.enrich(batch)
+                self.timer.add("enrich", len(batch), time.perf_counter() - started)
+            doc_ids = [self.retrieval_service._document_id(chunk) for chunk in batch]
+
+            started = time.perf_counter()
+            vectors = self.retrieval_service.embeddings.embed_documents([c.page_content for c in batch])
+            embedded = time.perf_counter()
+            if not self.retrieval_service.index_documents(batch, embeddings=vectors, save=False):
+                raise RuntimeError("Indexing a batch failed")
+            for position, doc_id in zip(kept_positions, doc_ids):
+                self._kept[position] = doc_id
+            self.timer.add("embed", len(batch), embedded - started)
+            self.timer.add("index", len(batch), time.perf_counter() - embedded)
+            self._batches_since_checkpoint += 1
+
+        self.completed.extend(self._pending_keys)
+        self._pending_keys = []
+        self._indexed_chunks = self.chunk_count
+        if force or self._batches_since_checkpoint >= self.checkpoint_every:
+            self._save_checkpoint()
+
+    def _seed_dedup(self, checkpoint: Dict[str, Any]):
+        """Register chunks already in the store, so new copies of them are dropped"""
+        vector_store = self.retrieval_service.vector_store
+        for doc_id in vector_store.index_to_docstore_id.values():
+            if self.dedup.add(vector_store.docstore.search(doc_id).page_content) is None:
+                self._kept.append(doc_id)
+        self.dedup.seen = self.dedup.dropped = 0
+        # A resumed build already holds chunks it added itself; keep the original baseline
+        self._baseline = set(checkpoint.get("baseline", vector_store.index_to_docstore_id.values()))
+        self._confirmed = set(checkpoint.get("confirmed", []))
+
+    def _drop_duplicates(self, chunks: list) -> list:
+        kept = []
+        for chunk in chunks:
+            self.dedup.seen += 1
+            signature = self.dedup.signature(chunk.page_content)
+            match = self.dedup.find(signature)
+            target = None if match is None else self._kept[match]
+            if isinstance(target, str):
+                doc_id, target = target, self.retrieval_service.vector_store.docstore.search(target)
+                same_source = target.metadata.get("source") == chunk.metadata.get("source")
+                if same_source and target.page_content != chunk.page_content:
+                    # An edit of a stored chunk: index the new text, the old one goes as stale
+                    target = None
+                else:
+                    self._confirmed.add(doc_id)
+                    if not same_source and merge_provenance(target.metadata, chunk.metadata):
+                        self._updated += 1
+                    self.dedup.dropped += 1
+                    continue
+            elif target is not None:
+                merge_provenance(target.metadata, chunk.metadata)
+                self.dedup.dropped += 1
+                continue
+
+            self.dedup.register(signature)
+            self._pending_kept.append(len(self._kept))
+            self._kept.append(chunk)
+            kept.append(chunk)
+        return kept
+
+    def _remove_stale(self):
+        """Drop chunks of files that changed or were removed since the store was built.
+
+        Only chunks with a source file are considered; other documents, such
+        as the local Q&A dataset, are not managed by this build.
+        """
+        vector_store = self.retrieval_service.vector_store
+        current = set(vector_store.index_to_docstore_id.values())
+        stale = [doc_id for doc_id in self._baseline - self._confirmed
+                 if doc_id in current and vector_store.docstore.search(doc_id).metadata.get("source")]
+        if stale:
+            vector_store.delete(stale)
+            logger.info(f"Removed {len(stale)} chunks of changed or removed files")
+        self.removed = len(stale)
+
+    def dedup_report(self) -> Dict[str, float]:
+        """Near-duplicate chunks dropped in workers (within a task) and here (across tasks)"""
+        chunks = self.dedup.seen + self._worker_dropped
+        dropped = self.dedup.dropped + self._worker_dropped
+        return {"chunks": chunks, "dropped": dropped, "dropped_ratio": round(dropped / chunks, 4) if chunks else 0.0}
+
+    def _plan(self) -> List[ExtractionUnit]:
+        data_path = Path(self.data_dir)
+        if not data_path.exists():
+            logger.error(f"Directory not found: {self.data_dir}")
+            return []
+        files = sorted(p for p in data_path.iterdir() if p.is_file())
+        return self.processor.plan_units(files, split_bytes=self.split_bytes)
+
+    def run(self, resume: bool = True) -> Dict[str, Any]:
+        started = time.perf_counter()
+        tasks = self._plan()
+        checkpoint = self._load_checkpoint() if resume else {}
+        done = set(checkpoint.get("completed", []))
+        # Chunk ids continue where the checkpoint stopped, so replayed chunks hash the same
+        self.chunk_count = self._indexed_chunks = checkpoint.get("chunks", 0)
+        first_chunk = self.chunk_count
+        todo = [(task, _task_key(task)) for task in tasks]
+        self.completed = [key for _, key in todo if key in done]
+        todo = [(task, key) for task, key in todo if key not in done]
+        logger.info(f"Building index from {self.data_dir}: {len(todo)} of {len(tasks)} tasks to run "
+                    f"on {self.workers} workers")
+        self._seed_dedup(checkpoint)
+
+        # Results come back in task order; the processor bounds how many are in flight
+        results = self.processor.run_units([task for task, _ in todo], chunk=True)
+        for (_, key), result in zip(todo, results):
+            chunks = result["docs"]
+            dedup_started = time.perf_counter()
+            n_chunks = len(chunks)
+            chunks = self._drop_duplicates(chunks)
+            self._worker_dropped += result["dropped"]
+            self.timer.add("dedup", n_chunks, time.perf_counter() - dedup_started)
+            for chunk in chunks:
+                chunk.metadata["chunk_id"] = self.chunk_count
+                self.chunk_count += 1
+            self.timer.add("load", result["documents"], result["load_seconds"])
+            self.timer.add("chunk", n_chunks, result["chunk_seconds"])
+            self._pending_chunks.extend(chunks)
+            self._pending_keys.append(key)
+            self._flush()
+
+        self._remove_stale()
+        self._flush(force=True)
+        os.remove(self.checkpoint_path)
+        stats = {"tasks": len(tasks), "resumed_tasks": len(tasks) - len(todo), "chunks": self.chunk_count,
+                 "added": self.chunk_count - first_chunk, "removed": self.removed,
+                 "updated": self._updated,
+                 "dedup": self.dedup_report(),
+                 "enrichment": self.enricher.stats() if self.enricher is not None else None,
+                 "seconds": round(time.perf_counter() - started, 3),
+                 "stages": self.timer.report()}
+        logger.info(f"Index build finished: {stats}")
+        return stats
+
+
+def _resumable_version(root: str) -> Optional[str]:
+    """Newest unpublished version left behind by an interrupted build"""
+    for version_dir in unpublished_versions(root):
+        if os.path.exists(os.path.join(version_dir, CHECKPOINT_FILE)):
+            return version_dir
+    return None
+
+
+def build_mental_health_index(data_dir: str = "data/mental_health_resources", resume: bool = True,
+                              workers: Optional[int] = None, batch_size: int = 256,
+                              rebuild: bool = False, enrich: bool = True) -> bool:
     """
     Build and update the vector index from mental health resources
-    
+
     Args:
         data_dir: Directory containing mental health resources
-        
+        resume: Continue an interrupted build from its checkpoint
+        workers: Parsing processes (defaults to all cores)
+        batch_size: Chunks embedded and indexed per batch
+        rebuild: Start from an empty index instead of the published one
+        enrich: Label chunks with emotion and topic classifiers as they are indexed
+
     Returns:
         bool: True if indexing succeeded, False otherwise
     """
     try:
-        logger.info(f"Building index from {data_dir}...")
-        
-        processor = MentalHealthDocumentProcessor()
-        retrieval_service = RetrievalService()
-        
-        documents = processor.process_directory(data_dir)
-        if not documents:
-            logger.error("No documents found in directory")
-            return False
-            
-        logger.info(f"Processing {len(documents)} documents...")
-        
-        chunks = processor.chunk_documents(documents)
-        if not chunks:
+        retrieval_service = RetrievalService(reload_interval=0, load_local_data=False)
+        root = retrieval_service.vector_store_path
+        output_dir = _resumable_version(root) if resume else None
+        if output_dir:
+            logger.info(f"Resuming build in {output_dir}")
+            retrieval_service.vector_store = retrieval_service._load_store(output_dir)
+        else:
+            output_dir = new_version_dir(root)
+            if rebuild:
+                retrieval_service.vector_store = retrieval_service._empty_vector_store()
+
+        pipeline = IndexBuildPipeline(data_dir, retrieval_service, workers=workers, batch_size=batch_size,
+                                      output_dir=output_dir, enrich=enrich)
+        stats = pipeline.run(resume=resume)
+        if not stats["dedup"]["chunks"] and not stats["resumed_tasks"]:
             logger.error("No chunks created from documents")
+            shutil.rmtree(output_dir, ignore_errors=True)
             return False
-            
-        logger.info(f"Created {len(chunks)} chunks for indexing")
-        
-        success = retrieval_service.index_documents(chunks)
-        if success:
-            logger.info("Index built successfully")
-        else:
-            logger.error("Failed to build index")
-            
-        return success
-        
+        changed = stats["added"] or stats["removed"] or stats["updated"] or stats["resumed_tasks"]
+        if not changed and not rebuild:
+            logger.info("Index already up to date; nothing to publish")
+            shutil.rmtree(output_dir, ignore_errors=True)
+            return True
+
+        publish(root, output_dir)
+        prune_versions(root)
+        logger.info(f"Published index version {output_dir}")
+        return True
+
     except Exception as e:
         logger.error(f"Error building index: {e}")
         return False
@@ -56,20 +338,16 @@ def build_mental_health_index(data_dir: str = "data/mental_health_resources") ->
 def clear_and_rebuild_index(data_dir: str = "data/mental_health_resources") -> bool:
     """
     Completely rebuild the index from scratch
-    
+
     Args:
         data_dir: Directory containing source files
-        
+
     Returns:
         bool: True if successful rebuild
     """
     try:
-        retrieval_service = RetrievalService()
-        if not retrieval_service.clear_index():
-            logger.error("Failed to clear existing index")
-            return False
-            
-        return build_mental_health_index(data_dir)
+        # The current index keeps serving until the rebuilt one is published
+        return build_mental_health_index(data_dir, resume=False, rebuild=True)
     except Exception as e:
         logger.error(f"Error during rebuild: {e}")
         return False
@@ -77,4 +355,3 @@ def clear_and_rebuild_index(data_dir: str = "data/mental_health_resources") -> b
 
 if __name__ == "__main__":
     build_mental_health_index()
-    
\ No newline at end of file
@@ -0,0 +1,94 @@
+# utils/index_versions.py
+"""Versioned index directories with atomic publish.
+
+    <root>/versions/<version>/   one complete index per version
+    <root>/CURRENT               name of the published version
+
+Builds write a fresh version directory and publish it by atomically replacing
+CURRENT, so readers always see either the old or the new index, never a
+half-written one. A root that still holds index files directly (the layout
+before versions existed) is served as-is until the first publish.
+"""
+import os
+import shutil
+import time
+from typing import List, Optional
+
+POINTER_FILE = "CURRENT"
+VERSIONS_DIR = "versions"
+LEGACY_MARKER = "index.faiss"
+
+
+def versions_root(root: str) -> str:
+    return os.path.join(root, VERSIONS_DIR)
+
+
+def list_versions(root: str) -> List[str]:
+    """Version names, oldest first"""
+    path = versions_root(root)
+    if not os.path.isdir(path):
+        return []
+    return sorted(name for name in os.listdir(path) if os.path.isdir(os.path.join(path, name)))
+
+
+def current_version(root: str) -> Optional[str]:
+    pointer = os.path.join(root, POINTER_FILE)
+    if not os.path.exists(pointer):
+        return None
+    with open(pointer, "r", encoding="utf-8") as f:
+        return f.read().strip() or None
+
+
+def current_dir(root: str, legacy_marker: str = LEGACY_MARKER) -> Optional[str]:
+    """Directory of the published index, the legacy root, or None if there is no index"""
+    version = current_version(root)
+    if version:
+        return os.path.join(versions_root(root), version)
+    if os.path.exists(os.path.join(root, legacy_marker)):
+        return root
+    return None
+
+
+def new_version_dir(root: str) -> str:
+    """Create an empty, unpublished version directory"""
+    # Names sort in creation order: UTC time to the nanosecond, then the pid
+    seconds, nanos = divmod(time.time_ns(), 10 ** 9)
+    name = f"{time.strftime('%Y%m%d-%H%M%S', time.gmtime(seconds))}.{nanos:09d}-{os.getpid()}"
+    path = os.path.join(versions_root(root), name)
+    os.makedirs(path)
+    return path
+
+
+def publish(root: str, version_dir: str):
+    """Atomically make version_dir the published index"""
+    name = os.path.basename(os.path.normpath(version_dir))
+    if os.path.normpath(os.path.dirname(os.path.normpath(version_dir))) != os.path.normpath(versions_root(root)):
+        raise ValueError(f"{version_dir} is not a version of {root}")
+    tmp_path = os.path.join(root, f"{POINTER_FILE}.tmp-{os.getpid()}")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(name)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, os.path.join(root, POINTER_FILE))
+
+
+def unpublished_versions(root: str) -> List[str]:
+    """Version directories newer than the published one, newest first"""
+    current = current_version(root) or ""
+    return [os.path.join(versions_root(root), name)
+            for name in reversed(list_versions(root)) if name > current]
+
+
+def prune_versions(root: str, keep: int = 2):
+    """Delete all but the newest keep versions older than the published one.
+
+    A worker may still serve a pruned version. Pruning relies on POSIX unlink
+    semantics for that: files a worker has open or memory-mapped stay readable
+    until it closes them, even after they are deleted.
+    """
+    current = current_version(root)
+    if not current:
+        return
+    older = [name for name in list_versions(root) if name < current]
+    for name in older[:max(len(older) - keep, 0)]:
+        shutil.rmtree(os.path.join(versions_root(root), name), ignore_errors=True)
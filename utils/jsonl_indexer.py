@@ -1,44 +1,276 @@
 import json
+import logging
 import os
+import re
+from typing import Dict, List, Set
 import faiss
 import numpy as np
-from sentence_transformers import SentenceTransformer
+from utils.ann_index import (
+    base_index, build_index, configure_search, factory_string, load_config, reconstruct_by_ids, save_config
+)
+from utils.batching import get_batcher
+from utils.compact_store import CompactTextStore
+from utils.embedding_cache import get_embedding_cache
+from utils.hashing import content_hash
+from utils.index_versions import current_dir, new_version_dir, prune_versions, publish
+from utils.lru_cache import LRUCache
+from utils.model_registry import get_sentence_transformer, sentence_transformer_name
+
+logger = logging.getLogger(__name__)
+
+WHITESPACE = re.compile(r"\s+")
+MANIFEST_VERSION = 1
+# Tombstoned entries cost extra search candidates, and every removed record leaves a dead
+# entry in the text store; sync compacts past either limit, whatever the index type
+MAX_TOMBSTONES = 1000
+MAX_DEAD_RATIO = 0.1
+
+
+def normalize_query(query):
+    """Cache key and encoder input for a query: lowercased, whitespace collapsed"""
+    return WHITESPACE.sub(" ", query).strip().lower()
+
 
 class JsonlSemanticRetriever:
-    def __init__(self, jsonl_path, index_path="vector_store/jsonl.index", model_name='all-MiniLM-L6-v2'):
+    """Semantic Q&A retrieval over a FAISS index of sentence embeddings.
+
+    index_type selects the FAISS structure (see utils.ann_index); nprobe and
+    ef_search are query-time knobs for the IVF and HNSW types. A saved index
+    built with a different type or build settings is rebuilt on load.
+
+    Passages are stored next to the index as a CompactTextStore
+    (<name>.texts.bin/.idx), memory-mapped on load, so only the k passages a
+    query returns are ever decoded.
+
+    A manifest (<name>.manifest.json) maps the content hash of every indexed
+    passage to its vector id, so sync() only embeds new or changed records and
+    removes deleted ones. Run sync() from a build job or at startup; it is not
+    safe to call while other threads are searching.
+
+    Every save writes the index, passages, config and manifest into a new
+    version under <index_path without extension>/versions and publishes it
+    through utils.index_versions, so other processes never open a mix of two
+    saves. Indexes saved beside index_path before versions existed are loaded
+    from there until the first save.
+    """
+
+    def __init__(self, jsonl_path, index_path="vector_store/jsonl.index", model_name='all-MiniLM-L6-v2',
+                 index_type=None, nlist=None, hnsw_m=32, pq_m=None, nprobe=16, ef_search=64,
+                 query_cache_size=None):
         self.jsonl_path = jsonl_path
         self.index_path = index_path
-        self.model = SentenceTransformer(model_name)
+        self.index_type = index_type or os.getenv("SEMANTIC_INDEX_TYPE", "flat")
+        self.build_params = {"nlist": nlist, "hnsw_m": hnsw_m, "pq_m": pq_m}
+        self.nprobe = nprobe
+        self.ef_search = ef_search
+        self.model = get_sentence_transformer(model_name)
+        self.embedding_cache = get_embedding_cache(sentence_transformer_name(model_name))
+        self.encoder = get_batcher(sentence_transformer_name(model_name), "encode")
+        self.query_cache = LRUCache(
+            query_cache_size if query_cache_size is not None else int(os.getenv("QUERY_CACHE_SIZE", "10000"))
+        )
+        self.versions_root = os.path.splitext(index_path)[0]
+        self._use_dir(self._published_dir())
         self.index = None
-        self.texts = []
+        self.texts = CompactTextStore()
+        self.records: Dict[str, int] = {}
+        self.tombstones: Set[int] = set()
 
         self.load_or_create_index()
 
-    def load_or_create_index(self):
-        if os.path.exists(self.index_path) and os.path.exists("vector_store/texts.npy"):
-            self.index = faiss.read_index(self.index_path)
-            self.texts = np.load("vector_store/texts.npy", allow_pickle=True).tolist()
-        else:
-            self._build_index()
+    def _published_dir(self) -> str:
+        """Directory of the published version, or of an unversioned index beside index_path"""
+        published = current_dir(self.versions_root, legacy_marker=os.path.basename(self.index_path))
+        return published or os.path.dirname(self.index_path) or "."
 
-    def _build_index(self):
+    def _use_dir(self, directory: str):
+        """Point the index, text store and manifest paths at the files in directory"""
+        name = os.path.basename(self.versions_root)
+        self.index_dir = directory
+        self.index_file = os.path.join(directory, os.path.basename(self.index_path))
+        self.texts_path = os.path.join(directory, name + ".texts")
+        self.manifest_path = os.path.join(directory, name + ".manifest.json")
+
+    def _saved_index_matches(self):
+        config = load_config(self.index_file)
+        if config.get("index_type") != self.index_type:
+            return False
+        return all(config.get(key) == value for key, value in self.build_params.items() if value is not None)
+
+    def _read_passages(self) -> Dict[str, str]:
+        """Content hash -> passage for every Q&A record in the JSONL, in file order"""
+        passages = {}
         with open(self.jsonl_path, "r", encoding="utf-8") as f:
             for line in f:
                 data = json.loads(line)
                 if "question" in data and "answer" in data:
-                    self.texts.append(f"Q: {data['question']}\nA: {data['answer']}")
+                    passage = f"Q: {data['question']}\nA: {data['answer']}"
+                    passages.setdefault(content_hash(passage), passage)
+        return passages
+
+    def _load_manifest(self) -> bool:
+        if not os.path.exists(self.manifest_path):
+            return False
+        with open(self.manifest_path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+        if manifest.get("version") != MANIFEST_VERSION:
+            return False
+        self.records = manifest["records"]
+        self.tombstones = set(manifest.get("tombstones", []))
+        return True
 
-        embeddings = self.model.encode(self.texts, show_progress_bar=True)
-        embeddings = np.array(embeddings).astype("float32")
+    def load_or_create_index(self):
+        # Indexes from before the manifest have no stable ids and are rebuilt once
+        if (os.path.exists(self.index_file) and CompactTextStore.exists(self.texts_path)
+                and self._saved_index_matches() and self._load_manifest() and self._open_texts()):
+            self.index = faiss.read_index(self.index_file)
+            if os.path.getmtime(self.jsonl_path) > os.path.getmtime(self.manifest_path):
+                logger.info(f"Synced {self.index_dir}: {self.sync()}")
+        else:
+            self._build_index(self._read_passages())
+        configure_search(self.index, nprobe=self.nprobe, ef_search=self.ef_search)
+
+    def _open_texts(self) -> bool:
+        try:
+            self.texts = CompactTextStore.open(self.texts_path)
+            return True
+        except ValueError as e:
+            # A save interrupted between the text store's two files
+            logger.warning(f"Rebuilding {self.index_dir}: {e}")
+            return False
+
+    def _encode(self, passages: List[str]) -> np.ndarray:
+        embeddings = self.model.encode(passages, show_progress_bar=len(passages) > 1000)
+        return np.asarray(embeddings, dtype="float32")
+
+    def _embed(self, passages: List[str]) -> np.ndarray:
+        """Passage embeddings, encoding only text the embedding cache has not seen"""
+        if self.embedding_cache is None:
+            return self._encode(passages)
+        return self.embedding_cache.embed(passages, self._encode)
+
+    def _build_index(self, passages: Dict[str, str]):
+        hashes = list(passages)
+        texts = [passages[h] for h in hashes]
+        embeddings = self._embed(texts)
+
+        self.index = build_index(embeddings, self.index_type, ids=np.arange(len(texts)), **self.build_params)
+        self.texts = CompactTextStore(texts)
+        self.records = {h: i for i, h in enumerate(hashes)}
+        self.tombstones = set()
+        self._save()
+
+    def _save(self):
+        """Write everything into a new version and publish it"""
+        self._use_dir(new_version_dir(self.versions_root))
+        self.texts.save(self.texts_path)
+        faiss.write_index(self.index, self.index_file)
+        save_config(self.index_file, {
+            "index_type": self.index_type,
+            "factory": factory_string(self.index_type, self.index.d, self.index.ntotal, **self.build_params),
+            "dim": int(self.index.d),
+            "ntotal": int(self.index.ntotal),
+            **self.build_params
+        })
+        # Written last: a manifest newer than the JSONL means the index is in sync
+        with open(self.manifest_path, "w", encoding="utf-8") as f:
+            json.dump({"version": MANIFEST_VERSION, "records": self.records,
+                       "tombstones": sorted(self.tombstones)}, f)
+        publish(self.versions_root, self.index_dir)
+        # Text stores of pruned versions stay readable to processes that still have them mapped
+        prune_versions(self.versions_root)
 
-        self.index = faiss.IndexFlatL2(embeddings.shape[1])
-        self.index.add(embeddings)
+    def sync(self) -> Dict[str, int]:
+        """Bring the index in line with the JSONL, embedding only new or changed records"""
+        passages = self._read_passages()
+        added = [h for h in passages if h not in self.records]
+        removed = [h for h in self.records if h not in passages]
 
-        os.makedirs("vector_store", exist_ok=True)
-        faiss.write_index(self.index, self.index_path)
-        np.save("vector_store/texts.npy", self.texts)
+        if not added and not removed:
+            # The JSONL was touched without changing; a new version records that it is in sync
+            self._save()
+            return {"added": 0, "removed": 0, "unchanged": len(passages), "tombstones": len(self.tombstones)}
+
+        # Text ids are positions, so the store only ever grows between compactions
+        texts = CompactTextStore.open(self.texts_path, use_mmap=False)
+        if removed:
+            self._remove_ids([self.records.pop(h) for h in removed])
+        if added:
+            new_texts = [passages[h] for h in added]
+            ids = np.arange(len(texts), len(texts) + len(added))
+            for text in new_texts:
+                texts.append(text)
+            self.index.add_with_ids(self._embed(new_texts), ids)
+            self.records.update(zip(added, ids.tolist()))
+        self.texts.close()
+        self.texts = texts
+        # Text ids are never reused, so removed records stay in the store until compaction
+        dead = len(self.texts) - len(self.records)
+        if len(self.tombstones) > MAX_TOMBSTONES or dead > MAX_DEAD_RATIO * len(self.texts):
+            self._compact()
+        self._save()
+        self.texts = CompactTextStore.open(self.texts_path)
+        configure_search(self.index, nprobe=self.nprobe, ef_search=self.ef_search)
+        return {"added": len(added), "removed": len(removed), "unchanged": len(passages) - len(added),
+                "tombstones": len(self.tombstones)}
+
+    def _remove_ids(self, ids: List[int]):
+        # Removing from an IVF index inside an IndexIDMap2 leaves the IVF lists with ids
+        # the map no longer has, so IVF entries are hidden like HNSW ones instead
+        if faiss.try_extract_index_ivf(base_index(self.index)) is not None:
+            self.tombstones.update(ids)
+            return
+        try:
+            self.index.remove_ids(np.asarray(ids, dtype="int64"))
+        except RuntimeError:
+            # HNSW graphs cannot delete; hide the entries until the next compaction
+            self.tombstones.update(ids)
+
+    def _compact(self):
+        """Rebuild without tombstoned entries, reusing stored vectors instead of re-embedding"""
+        live = sorted(self.records.items(), key=lambda item: item[1])
+        vectors = reconstruct_by_ids(self.index, np.array([i for _, i in live], dtype="int64"))
+        self.texts = CompactTextStore(self.texts[i] for _, i in live)
+        self.index = build_index(vectors, self.index_type, ids=np.arange(len(live)), **self.build_params)
+        self.records = {h: n for n, (h, _) in enumerate(live)}
+        self.tombstones = set()
+
+    def _search(self, vectors: np.ndarray, k: int) -> List[List[str]]:
+        fetch = min(k + len(self.tombstones), self.index.ntotal) if self.tombstones else k
+        D, I = self.index.search(vectors, max(fetch, 1))
+        # Approximate indexes return -1 when fewer than k neighbours are found
+        return [[self.texts[i] for i in row if i >= 0 and i not in self.tombstones][:k] for row in I]
+
+    def embed_queries(self, queries):
+        """Query embeddings as a float32 matrix, encoding only cache misses, in one call"""
+        keys = [normalize_query(q) for q in queries]
+        vectors = [self.query_cache.get(key) for key in keys]
+        missing = list(dict.fromkeys(key for key, vec in zip(keys, vectors) if vec is None))
+        if missing:
+            encoded = np.asarray(self.model.encode(missing, batch_size=64), dtype="float32")
+            fresh = dict(zip(missing, encoded))
+            for key, vec in fresh.items():
+                self.query_cache.put(key, vec)
+            vectors = [fresh[key] if vec is None else vec for key, vec in zip(keys, vectors)]
+        return np.vstack(vectors).astype("float32", copy=False)
 
     def retrieve(self, query, k=3):
-        query_vec = self.model.encode([query]).astype("float32")
-        D, I = self.index.search(query_vec, k)
-        return [self.texts[i] for i in I[0]]
+        key = normalize_query(query)
+        query_vec = self.query_cache.get(key)
+        if query_vec is None:
+            # Single queries share the micro-batcher with other request threads
+            query_vec = np.asarray(self.encoder.submit(key), dtype="float32")
+            self.query_cache.put(key, query_vec)
+        return self._search(query_vec.reshape(1, -1), k)[0]
+
+    def retrieve_batch(self, queries, k=3):
+        """Top k passages for each query, with one encode call and one index search"""
+        if not queries:
+            return []
+        return self._search(self.embed_queries(queries), k)
+
+    def cache_stats(self):
+        stats = {"query_cache": self.query_cache.stats()}
+        if self.embedding_cache is not None:
+            stats["embedding_cache"] = self.embedding_cache.stats()
+        return stats
@@ -0,0 +1,231 @@
+# utils/keyword_matcher.py
+"""Compiled multi-pattern matcher for mental health keywords and phrases.
+
+The keyword list and the emotional phrase patterns are compiled once at import
+into a single Aho-Corasick automaton, so a message is scanned in one linear pass
+regardless of how many phrases are registered.
+"""
+import itertools
+import re
+from collections import deque
+from typing import Dict, Iterable, List, NamedTuple, Tuple
+
+MENTAL_HEALTH_KEYWORDS = [
+    "feel", "feeling", "emotion", "emotional", "mood", "sad", "happy", "angry", "fear", "scared",
+    "afraid", "nervous", "anxious", "worried", "stressed", "overwhelmed", "depressed", "lonely",
+    "isolated", "hopeless", "helpless", "worthless", "guilty", "ashamed", "embarrassed", "proud",
+    "confident", "excited", "joy", "content", "peaceful", "calm", "relaxed", "tired", "exhausted",
+    "mental", "psychological", "psychiatric", "therapy", "counsel", "psych", "mind", "brain",
+    "thought", "thinking", "memory", "concentration", "focus", "sleep", "insomnia", "appetite",
+    "eating", "energy", "motivation", "self-esteem", "confidence", "self-care", "well-being",
+    "cope", "coping", "handle", "manage", "deal", "struggle", "challenge", "difficult", "hard",
+    "bad", "good", "better", "worse", "improve", "help", "support", "advice", "guidance",
+    "relationship", "family", "friend", "work", "job", "school", "study", "pressure", "stress",
+    "trauma", "grief", "loss", "change", "transition", "adjust", "adapt", "crisis", "emergency",
+    "love", "loved", "loving", "need", "needed", "want", "wanted", "desire", "desired", "miss",
+    "missing", "care", "cared", "caring", "someone", "somebody", "person", "people", "partner",
+    "friend", "friendship", "family", "parent", "child", "sibling", "brother", "sister", "mother",
+    "father", "spouse", "wife", "husband", "boyfriend", "girlfriend", "crush", "dating", "breakup",
+    "broken", "heart", "heartbroken", "rejection", "rejected", "abandon", "abandoned", "alone",
+    "lonely", "isolation", "isolated", "connection", "connect", "connected", "belong", "belonging",
+    "accept", "accepted", "reject", "rejected", "understand", "understood", "listen", "heard",
+    "hate", "hated", "hating", "dislike", "unwanted", "unloved", "useless", "failure", "loser",
+    "ugly", "stupid", "dumb", "hopeless", "helpless", "pathetic", "worthless", "inadequate",
+    "insecure", "self-doubt", "self-loathing", "self-harm", "cutting", "suicidal", "suicide",
+    "end my life", "kill myself", "don't want to live", "overdose", "hang myself", "jump off",
+    "self-destructive", "self-sabotage", "panic", "panic attack", "breakdown", "meltdown",
+    "burnout", "exhausted", "drained", "empty", "numb", "dissociate", "disconnected", "triggered",
+    "flashback", "nightmare", "ptsd", "traumatized", "abuse", "bullied", "harassed", "humiliated",
+    "betrayed", "abandonment", "neglected", "unworthy", "unlovable", "unimportant", "ignored",
+    "invisible", "outcast", "alone", "no friends", "can't connect", "social anxiety", "phobia",
+    "paranoia", "delusional", "hearing voices", "psychosis", "mania", "manic", "bipolar",
+    "borderline", "bpd", "ocd", "eating disorder", "anorexia", "bulimia", "body dysmorphia",
+    "self-image", "self-worth", "self-confidence", "self-esteem", "self-hate", "self-pity",
+    "self-blame", "guilt", "shame", "regret", "remorse", "despair", "misery", "suffering",
+    "emotional pain", "hurt", "heartache", "grieving", "mourning", "loss", "death", "died",
+    "passed away", "funeral", "bereavement", "divorce", "breakup", "cheated", "lied to",
+    "gaslighting", "manipulated", "toxic", "narcissist", "sociopath", "psychopath", "violence",
+    "assault", "rape", "molestation", "trafficking", "addiction", "alcoholic", "drugs", "overdose",
+    "relapse", "sobriety", "recovery", "therapy", "counseling", "psychiatrist", "psychologist",
+    "medication", "antidepressants", "ssri", "prozac", "zoloft", "xanax", "valium", "klonopin",
+    "hospitalization", "mental ward", "psych ward", "sectioned", "5150", "suicide watch",
+    "crisis line", "hotline", "help me", "save me", "i can't take it", "i give up", "i quit",
+    "i'm done", "no way out", "trapped", "no hope", "no future", "nothing matters", "why bother",
+    "what's the point", "meaningless", "purposeless", "why am I here", "existential", "nihilism",
+    "dark thoughts", "intrusive thoughts", "voices", "hallucinations", "delusions", "paranoid",
+    "persecuted", "stalked", "watched", "spied on", "conspiracy", "government", "fbi", "cia",
+    "they're after me", "people talk about me", "whispers", "laughing at me", "judging me",
+    "mocking me", "bullying me", "gossip", "rumors", "lied about", "framed", "set up", "betrayed",
+    "backstabbed", "used", "manipulated", "controlled", "dominated", "abused", "victimized",
+    "scapegoat", "black sheep", "rebel", "outcast", "misfit", "weirdo", "freak", "alien",
+    "different", "don't fit in", "no one understands", "alone in this world", "no one cares",
+    "no one listens", "no one helps", "ignored", "dismissed", "invalidated", "gaslit", "crazy",
+    "insane", "psycho", "mental case", "unstable", "broken", "damaged", "unfixable", "too much",
+    "too sensitive", "too emotional", "too needy", "too clingy", "too dependent", "too weak",
+    "pathetic", "failure", "disappointment", "embarrassment", "shameful", "regretful", "sorry",
+    "apologize", "forgive me", "i messed up", "i ruined everything", "it's all my fault",
+    "i deserve this", "i deserve pain", "i deserve to die", "i'm a burden", "i'm worthless",
+    "i'm useless", "i'm nothing", "i'm nobody", "i don't matter", "i hate myself", "i hate my life",
+    "i wish i was dead", "i wish i was never born", "i want to disappear", "i want to sleep forever",
+    "i can't go on", "i can't do this anymore", "make it stop", "end the pain", "end the suffering",
+    "no more", "enough", "i give up", "i surrender", "i quit", "i'm done", "goodbye", "farewell",
+    "last words", "final message", "no one will miss me", "they'll be better off", "no one cares",
+    "the world is cruel", "life is pain", "existence is suffering", "why was i born", "what's the point",
+    "nothing gets better", "it never ends", "i'm stuck", "i'm trapped", "no escape", "no way out",
+    "helpless", "powerless", "weak", "fragile", "broken beyond repair", "too damaged to fix",
+    "lost cause", "hopeless case", "beyond help", "too far gone", "irredeemable", "monster",
+    "demon", "evil", "cursed", "doomed", "damned", "hell", "punishment", "karma", "fate",
+    "destiny", "why me", "what did i do", "i didn't ask for this", "i don't deserve this",
+    "life isn't fair", "the universe hates me", "god hates me", "no higher power", "abandoned by god",
+    "prayed but nothing", "faith lost", "no belief", "no hope", "no light", "only darkness",
+    "void", "emptiness", "numb", "dead inside", "soulless", "heartless", "cold", "unfeeling",
+    "robot", "zombie", "going through motions", "fake smile", "mask", "pretending", "acting",
+    "no real emotions", "hollow", "shell", "ghost", "walking dead", "barely alive", "just existing",
+    "not living", "surviving", "enduring", "suffering", "waiting to die", "waiting for death",
+    "longing for death", "death wish", "suicidal ideation", "planning suicide", "suicide method",
+    "suicide note", "final letter", "last goodbye", "no turning back", "no second thoughts",
+    "ready to die", "prepared to die", "accepting death", "welcoming death", "death is peace",
+    "death is freedom", "death is escape", "no more pain", "no more suffering", "eternal sleep",
+    "rest in peace", "finally free", "release", "liberation", "end of pain", "end of suffering",
+    "no more tears", "no more sadness", "no more anger", "no more fear", "no more anxiety",
+    "no more stress", "no more pressure", "no more expectations", "no more disappointment",
+    "no more failure", "no more shame", "no more guilt", "no more regret", "no more loneliness",
+    "no more heartbreak", "no more betrayal", "no more abuse", "no more trauma", "no more memories",
+    "no more past", "no more future", "no more present", "no more time", "no more existence",
+    "nothingness", "void", "oblivion", "nonexistence", "peace at last", "silence", "darkness",
+    "eternal rest", "final sleep", "never wake up", "never again", "the end", "goodbye forever"
+]
+
+# Emotional phrase templates. "{a|b}" expands to each alternative, so every
+# template compiles to a finite set of literal phrases.
+EMOTIONAL_PATTERNS = [
+    "i {feel|am feeling} ",
+    "i'm ",
+    "i am ",
+    "makes me feel ",
+    "feel like ",
+    "feeling ",
+    "i have been feeling ",
+    "i've been feeling ",
+    "i have been ",
+    "i've been ",
+    "i {need|want|love|miss|care about} ",
+    "i'm {in love|heartbroken|lonely|alone} ",
+    "no one {understands|listens|cares} ",
+    "someone {doesn't|does not} {love|care|understand} ",
+    "i feel {alone|lonely|rejected|abandoned} ",
+    "i {can't|cannot} {find|get} {someone|anyone} ",
+    "i {wish|want} {someone|somebody} ",
+    "i {don't|do not} have {anyone|someone} "
+]
+
+KEYWORD = "keyword"
+EMOTIONAL_PATTERN = "emotional_pattern"
+
+_TEMPLATE_PART = re.compile(r"\{([^}]*)\}|([^{]+)")
+
+
+def expand_template(template: str) -> List[str]:
+    """Expand a phrase template into all of the literal phrases it matches"""
+    options = []
+    for alternatives, literal in _TEMPLATE_PART.findall(template):
+        if alternatives:
+            options.append(alternatives.split("|"))
+        else:
+            options.append([literal])
+    return ["".join(parts) for parts in itertools.product(*options)]
+
+
+class KeywordMatch(NamedTuple):
+    start: int
+    end: int
+    phrase: str
+    category: str
+
+
+class KeywordMatcher:
+    """Aho-Corasick automaton over lowercased phrases grouped by category"""
+
+    def __init__(self, phrases_by_category: Dict[str, Iterable[str]]):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._output: List[List[Tuple[int, str, str]]] = [[]]
+        self._size = 0
+
+        for category, phrases in phrases_by_category.items():
+            for phrase in phrases:
+                self._add(phrase.lower(), category)
+        self._build_failure_links()
+
+    def __len__(self) -> int:
+        return self._size
+
+    def _add(self, phrase: str, category: str):
+        if not phrase:
+            return
+        state = 0
+        for char in phrase:
+            nxt = self._goto[state].get(char)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[state][char] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append([])
+            state = nxt
+        entry = (len(phrase), phrase, category)
+        if entry not in self._output[state]:
+            self._output[state].append(entry)
+            self._size += 1
+
+    def _build_failure_links(self):
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, nxt in self._goto[state].items():
+                queue.append(nxt)
+                fallback = self._fail[state]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                target = self._goto[fallback].get(char, 0)
+                self._fail[nxt] = target if target != nxt else 0
+                self._output[nxt] = self._output[nxt] + self._output[self._fail[nxt]]
+
+    def _scan(self, text: str):
+        goto, fail, output = self._goto, self._fail, self._output
+        state = 0
+        for i, char in enumerate(text):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if output[state]:
+                yield i + 1, output[state]
+
+    def find_all(self, text: str) -> List[KeywordMatch]:
+        """Return every phrase occurrence; offsets index into ``text.lower()``"""
+        matches = []
+        for end, entries in self._scan(text.lower()):
+            for length, phrase, category in entries:
+                matches.append(KeywordMatch(end - length, end, phrase, category))
+        return matches
+
+    def categories(self, text: str) -> List[str]:
+        """Return the distinct categories matched in text"""
+        return sorted({match.category for match in self.find_all(text)})
+
+    def contains_any(self, text: str) -> bool:
+        """Return True on the first phrase occurrence without collecting matches"""
+        for _ in self._scan(text.lower()):
+            return True
+        return False
+
+
+MENTAL_HEALTH_MATCHER = KeywordMatcher({
+    KEYWORD: MENTAL_HEALTH_KEYWORDS,
+    EMOTIONAL_PATTERN: [phrase for template in EMOTIONAL_PATTERNS for phrase in expand_template(template)]
+})
+
+
+def find_mental_health_matches(text: str) -> List[KeywordMatch]:
+    """Return all mental health keyword and emotional phrase matches in text"""
+    return MENTAL_HEALTH_MATCHER.find_all(text)
@@ -1,12 +1,19 @@
 import os
 from dotenv import load_dotenv
-from google import generativeai as genai
+from utils.model_registry import get_model, registry
 
 load_dotenv()
 
-genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
+GEMINI_MODEL = "gemini-2.0-flash"
 
-model = genai.GenerativeModel("gemini-2.0-flash")
+
+def _load_gemini():
+    from google import generativeai as genai
+    genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
+    return genai.GenerativeModel(GEMINI_MODEL)
+
+
+registry.register(GEMINI_MODEL, _load_gemini)
 
 def generate_dynamic_llm(prompt: str) -> str:
     try:
@@ -21,6 +28,7 @@ def generate_dynamic_llm(prompt: str) -> str:
         
         full_prompt = f"{system_prompt}\n\nUser: {prompt}"
         
+        model = get_model(GEMINI_MODEL)
         response = model.generate_content(full_prompt)
         
         # Check if response has expected text
@@ -0,0 +1,159 @@
+# utils/model_registry.py
+"""Process-wide registry of lazily loaded models.
+
+Every transformer pipeline and embedding model is registered here under a name
+and loaded on first use, so callers in different modules share one resident
+instance per process instead of each holding their own copy.
+"""
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, List
+
+logger = logging.getLogger(__name__)
+
+ZERO_SHOT_CLASSIFIER = "zero-shot-classification"
+TOXICITY_CLASSIFIER = "toxicity-classification"
+EMOTION_CLASSIFIER = "emotion-classification"
+
+DEFAULT_EMBEDDING_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+
+
+def _torch_device() -> int:
+    import torch
+    return 0 if torch.cuda.is_available() else -1
+
+
+def _load_zero_shot_classifier():
+    from transformers import pipeline
+    return pipeline("zero-shot-classification", model="facebook/bart-large-mnli")
+
+
+def _load_toxicity_classifier():
+    from transformers import pipeline
+    return pipeline(
+        "text-classification",
+        model="unitary/toxic-bert",
+        device=_torch_device(),
+        max_length=512,
+        truncation=True
+    )
+
+
+def _load_emotion_classifier():
+    from transformers import pipeline
+    return pipeline(
+        "text-classification",
+        model="SamLowe/roberta-base-go_emotions",
+        device=_torch_device(),
+        top_k=3
+    )
+
+
+def _estimate_bytes(model: Any) -> int:
+    """Best-effort size of a model's parameters in bytes"""
+    module = getattr(model, "model", model)
+    parameters = getattr(module, "parameters", None)
+    if not callable(parameters):
+        return 0
+    try:
+        return sum(p.numel() * p.element_size() for p in parameters())
+    except Exception:
+        return 0
+
+
+class ModelRegistry:
+    def __init__(self):
+        self._factories: Dict[str, Callable[[], Any]] = {}
+        self._models: Dict[str, Any] = {}
+        self._load_seconds: Dict[str, float] = {}
+        self._load_locks: Dict[str, threading.Lock] = {}
+        self._lock = threading.Lock()
+
+    def register(self, name: str, factory: Callable[[], Any]):
+        """Register a factory; the model is not loaded until first requested"""
+        with self._lock:
+            self._factories[name] = factory
+            self._load_locks.setdefault(name, threading.Lock())
+
+    def is_registered(self, name: str) -> bool:
+        return name in self._factories
+
+    def is_loaded(self, name: str) -> bool:
+        return name in self._models
+
+    def names(self) -> List[str]:
+        return list(self._factories)
+
+    def get(self, name: str) -> Any:
+        """Return the shared instance for name, loading it on first use"""
+        model = self._models.get(name)
+        if model is not None:
+            return model
+
+        if name not in self._factories:
+            raise KeyError(f"Unknown model: {name}")
+
+        # One lock per model so unrelated loads can proceed in parallel
+        with self._load_locks[name]:
+            model = self._models.get(name)
+            if model is None:
+                logger.info(f"Loading model {name}...")
+                start = time.perf_counter()
+                model = self._factories[name]()
+                self._load_seconds[name] = time.perf_counter() - start
+                self._models[name] = model
+                logger.info(f"Loaded model {name} in {self._load_seconds[name]:.1f}s")
+        return model
+
+    def unload(self, name: str):
+        """Drop the shared instance so it can be garbage collected"""
+        with self._load_locks.get(name, self._lock):
+            self._models.pop(name, None)
+            self._load_seconds.pop(name, None)
+
+    def status(self) -> Dict[str, Dict[str, Any]]:
+        """Report which registered models are resident and how large they are"""
+        report = {}
+        for name in self.names():
+            model = self._models.get(name)
+            report[name] = {
+                "loaded": model is not None,
+                "load_seconds": round(self._load_seconds.get(name, 0.0), 3),
+                "parameter_bytes": _estimate_bytes(model) if model is not None else 0
+            }
+        return report
+
+
+registry = ModelRegistry()
+registry.register(ZERO_SHOT_CLASSIFIER, _load_zero_shot_classifier)
+registry.register(TOXICITY_CLASSIFIER, _load_toxicity_classifier)
+registry.register(EMOTION_CLASSIFIER, _load_emotion_classifier)
+
+
+def get_model(name: str) -> Any:
+    """Return a shared model from the process-wide registry"""
+    return registry.get(name)
+
+
+def _canonical_embedding_name(model_name: str) -> str:
+    if "/" not in model_name:
+        return f"sentence-transformers/{model_name}"
+    return model_name
+
+
+def sentence_transformer_name(model_name: str = DEFAULT_EMBEDDING_MODEL) -> str:
+    """Registry name for a SentenceTransformer, registering it if needed"""
+    model_name = _canonical_embedding_name(model_name)
+    name = f"sentence-transformer:{model_name}"
+    if not registry.is_registered(name):
+        def _load():
+            from sentence_transformers import SentenceTransformer
+            return SentenceTransformer(model_name)
+        registry.register(name, _load)
+    return name
+
+
+def get_sentence_transformer(model_name: str = DEFAULT_EMBEDDING_MODEL):
+    """Return the shared SentenceTransformer for model_name"""
+    return registry.get(sentence_transformer_name(model_name))
@@ -0,0 +1,105 @@
+# utils/partitioned_index.py
+"""Per-value sub-indexes over a LangChain FAISS store.
+
+Filtering a FAISS similarity search by metadata fetches extra candidates from
+the global index and drops non-matching ones afterwards, so a rare value
+either costs a much larger search or comes back with fewer than k results.
+Here the store's vectors are grouped by the value of each partition field
+(e.g. emotion, topic) into their own flat indexes. A filtered query searches
+only its partition, which is never larger than the global index and holds
+every match, so it returns min(k, matches) results.
+
+Partitions are built from the store's own vectors (no re-embedding) and are
+immutable; a changed store gets a new PartitionedIndex.
+
+Every partition holds its own copy of its vectors, so each field adds one
+copy of the store's vectors. With the default emotion and topic fields, the
+store and its partitions take about 3x the memory of the store's vectors.
+"""
+import logging
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import faiss
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+def partition_key(value) -> str:
+    return str(value or "").strip().lower()
+
+
+class Partition:
+    def __init__(self, positions: np.ndarray, vectors: np.ndarray):
+        # positions[i] is the global index position of local vector i
+        self.positions = positions
+        self.index = faiss.IndexFlatL2(vectors.shape[1])
+        self.index.add(vectors)
+
+    def __len__(self) -> int:
+        return len(self.positions)
+
+    def search(self, query: np.ndarray, k: int, within: Optional[np.ndarray] = None) -> np.ndarray:
+        """Global positions of the k nearest vectors, optionally only among global positions in within"""
+        params = None
+        if within is not None:
+            local = np.flatnonzero(np.isin(self.positions, within))
+            if not len(local):
+                return np.empty(0, dtype="int64")
+            params = faiss.SearchParameters(sel=faiss.IDSelectorBatch(local.astype("int64")))
+            k = min(k, len(local))
+        _, local_ids = self.index.search(query, min(k, len(self)), params=params)
+        return self.positions[local_ids[0][local_ids[0] >= 0]]
+
+
+class PartitionedIndex:
+    def __init__(self, vector_store, fields: Sequence[str] = ("emotion", "topic")):
+        self.vector_store = vector_store
+        self.fields = tuple(fields)
+        self.ntotal = vector_store.index.ntotal
+        self.partitions: Dict[str, Dict[str, Partition]] = {field: {} for field in self.fields}
+
+        if not self.ntotal:
+            return
+        vectors = vector_store.index.reconstruct_n(0, self.ntotal)
+        groups: Dict[Tuple[str, str], List[int]] = {}
+        for position, doc_id in vector_store.index_to_docstore_id.items():
+            doc = vector_store.docstore.search(doc_id)
+            metadata = getattr(doc, "metadata", None) or {}
+            for field in self.fields:
+                key = partition_key(metadata.get(field))
+                if key:
+                    groups.setdefault((field, key), []).append(position)
+        for (field, key), positions in groups.items():
+            positions = np.array(sorted(positions), dtype="int64")
+            self.partitions[field][key] = Partition(positions, vectors[positions])
+        logger.info(f"Built {len(groups)} partitions over {self.ntotal} vectors")
+
+    def is_current(self, vector_store) -> bool:
+        return vector_store is self.vector_store and vector_store.index.ntotal == self.ntotal
+
+    def sizes(self) -> Dict[str, Dict[str, int]]:
+        return {field: {key: len(p) for key, p in partitions.items()}
+                for field, partitions in self.partitions.items()}
+
+    def search(self, query_vector: Sequence[float], filters: Dict[str, str], k: int) -> List[str]:
+        """Docstore ids of the k nearest documents matching all filters.
+
+        A filter value with no partition matches no documents, so the result
+        is empty.
+        """
+        selected = []
+        for field, value in filters.items():
+            partition = self.partitions.get(field, {}).get(partition_key(value))
+            if partition is None:
+                return []
+            selected.append(partition)
+        selected.sort(key=len)
+
+        query = np.asarray([query_vector], dtype="float32")
+        # Search the smallest partition, restricted to the others' members
+        within = None
+        for partition in selected[1:]:
+            within = partition.positions if within is None else np.intersect1d(within, partition.positions)
+        positions = selected[0].search(query, k, within)
+        return [self.vector_store.index_to_docstore_id[int(p)] for p in positions]
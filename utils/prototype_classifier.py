@@ -0,0 +1,85 @@
+# utils/prototype_classifier.py
+"""Embedding-prototype text classifier.
+
+Each label is represented by the normalised mean embedding of its example
+texts. Classifying a message costs one sentence embedding and a small matrix
+product, instead of one NLI forward pass per candidate label.
+"""
+import json
+import os
+from typing import Any, Dict, Iterable, List
+
+import numpy as np
+
+from utils.embedding_cache import get_embedding_cache
+from utils.model_registry import DEFAULT_EMBEDDING_MODEL, get_sentence_transformer, sentence_transformer_name
+
+
+def collect_texts(value: Any) -> List[str]:
+    """Flatten the strings out of a loaded responses/advice JSON value"""
+    if isinstance(value, str):
+        return [value]
+    if isinstance(value, dict):
+        value = list(value.values())
+    if isinstance(value, list):
+        texts = []
+        for item in value:
+            texts.extend(collect_texts(item))
+        return texts
+    return []
+
+
+def load_corpus_texts(folder_path: str) -> Dict[str, List[str]]:
+    """Load every JSON file in a folder as {file stem: [texts]}"""
+    corpus = {}
+    if not os.path.isdir(folder_path):
+        return corpus
+    for filename in sorted(os.listdir(folder_path)):
+        if filename.endswith(".json"):
+            with open(os.path.join(folder_path, filename), 'r', encoding='utf-8') as f:
+                corpus[filename[:-len(".json")]] = collect_texts(json.load(f))
+    return corpus
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+class PrototypeClassifier:
+    def __init__(self, prototypes: Dict[str, Iterable[str]], model_name: str = DEFAULT_EMBEDDING_MODEL):
+        self.model_name = model_name
+        self.labels = list(prototypes)
+        self.model = get_sentence_transformer(model_name)
+        # Prototype texts are fixed corpus content, so their embeddings are cached on disk
+        cache = get_embedding_cache(sentence_transformer_name(model_name))
+
+        centroids = []
+        for label in self.labels:
+            texts = list(prototypes[label])
+            if not texts:
+                raise ValueError(f"No prototype texts for label: {label}")
+            if cache is None:
+                embeddings = np.asarray(self.model.encode(texts), dtype="float32")
+            else:
+                embeddings = cache.embed(texts, self.model.encode)
+            centroids.append(_normalize(embeddings).mean(axis=0))
+        self.prototypes = _normalize(np.vstack(centroids))
+
+    def score_batch(self, texts: List[str]) -> List[Dict[str, Any]]:
+        """Score texts against every label, zero-shot pipeline style"""
+        embeddings = _normalize(np.asarray(self.model.encode(list(texts)), dtype="float32"))
+        similarities = embeddings @ self.prototypes.T
+
+        results = []
+        for text, row in zip(texts, similarities):
+            order = np.argsort(-row)
+            results.append({
+                "sequence": text,
+                "labels": [self.labels[i] for i in order],
+                "scores": [float(row[i]) for i in order]
+            })
+        return results
+
+    def __call__(self, text: str) -> Dict[str, Any]:
+        return self.score_batch([text])[0]
@@ -1,11 +1,10 @@
-import torch
-from transformers import pipeline
 from typing import Dict, Optional, List
 import re
+from utils.batching import get_batcher
+from utils.model_registry import EMOTION_CLASSIFIER, TOXICITY_CLASSIFIER, get_model
 
 class SafetyChecker:
     def __init__(self):
-        self.device = 0 if torch.cuda.is_available() else -1
         self.fallback_mode = False
         
         self.crisis_patterns = [
@@ -19,20 +18,11 @@ class SafetyChecker:
     def _load_models(self):
         """Safely load NLP models with fallback options"""
         try:
-            self.toxicity_checker = pipeline(
-                "text-classification",
-                model="unitary/toxic-bert",
-                device=self.device,
-                max_length=512,
-                truncation=True
-            )
-            
-            self.emotion_detector = pipeline(
-                "text-classification",
-                model="SamLowe/roberta-base-go_emotions",
-                device=self.device,
-                top_k=3  
-            )
+            get_model(TOXICITY_CLASSIFIER)
+            get_model(EMOTION_CLASSIFIER)
+            # Calls go through shared batchers so concurrent checks share a forward pass
+            self.toxicity_checker = get_batcher(TOXICITY_CLASSIFIER)
+            self.emotion_detector = get_batcher(EMOTION_CLASSIFIER)
         except Exception as e:
             print(f"⚠️ Safety models loading failed: {str(e)}")
             self.fallback_mode = True
@@ -52,13 +42,13 @@ class SafetyChecker:
             
         if not self.fallback_mode:
             try:
-                tox_result = self.toxicity_checker(text[:1000])[0]  
+                tox_result = self.toxicity_checker.submit(text[:1000])
                 if tox_result['label'] == 'toxic' and tox_result['score'] > 0.85:  
                     return True
                     
                
-                emotions = self.emotion_detector(text[:1000])
-                for emotion in emotions[0]:
+                emotions = self.emotion_detector.submit(text[:1000])
+                for emotion in emotions:
                     if emotion['label'] in ['grief', 'despair'] and emotion['score'] > 0.9:
                         return True
             except Exception as e:
@@ -105,7 +95,7 @@ class SafetyChecker:
             
         if not self.fallback_mode:
             try:
-                emotions = self.emotion_detector(text[:1000])[0]
+                emotions = self.emotion_detector.submit(text[:1000])
                 negative_scores = sum(
                     e['score'] for e in emotions 
                     if e['label'] in ['grief', 'despair', 'fear']
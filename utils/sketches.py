@@ -0,0 +1,163 @@
+# utils/sketches.py
+"""Bounded-memory streaming frequency sketches.
+
+HeavyHitterCounter combines two classic sketches behind the same interface as
+services.conversation_stats.FrequencyCounter:
+
+* Space-Saving with ``capacity`` counters keeps the candidate heavy hitters.
+  Over a stream of N additions every tracked count overestimates the true
+  count by at most N / capacity, and every key whose true count exceeds
+  N / capacity is guaranteed to be tracked.
+* Count-Min with ``width`` x ``depth`` counters answers point queries for any
+  key. An estimate never underestimates, and exceeds the true count by more
+  than e * N / width with probability at most exp(-depth).
+
+Memory is fixed by those parameters and does not grow with the vocabulary.
+"""
+import base64
+import hashlib
+import heapq
+import math
+from array import array
+from typing import Any, Dict, List, Tuple
+
+# Rough per-key cost of a tracked Space-Saving entry (dict slot, key string, counts, heap entry)
+_BYTES_PER_TRACKED_KEY = 200
+_BYTES_PER_CMS_CELL = 8
+
+
+def _hash_pair(key: str) -> Tuple[int, int]:
+    digest = hashlib.blake2b(key.encode("utf-8"), digest_size=16).digest()
+    return int.from_bytes(digest[:8], "little"), int.from_bytes(digest[8:], "little") | 1
+
+
+class CountMinSketch:
+    def __init__(self, width: int = 2048, depth: int = 4):
+        self.width = width
+        self.depth = depth
+        self.table = array("q", bytes(_BYTES_PER_CMS_CELL * width * depth))
+        self.total = 0
+
+    def _cells(self, key: str):
+        h1, h2 = _hash_pair(key)
+        for row in range(self.depth):
+            yield row * self.width + (h1 + row * h2) % self.width
+
+    def add(self, key: str, n: int = 1):
+        for cell in self._cells(key):
+            self.table[cell] += n
+        self.total += n
+
+    def __getitem__(self, key: str) -> int:
+        return min(self.table[cell] for cell in self._cells(key))
+
+    def error_bound(self) -> float:
+        """Additive error e*N/width, exceeded with probability at most exp(-depth)"""
+        return math.e * self.total / self.width
+
+
+class SpaceSaving:
+    def __init__(self, capacity: int = 1000):
+        self.capacity = capacity
+        self.counts: Dict[str, int] = {}
+        self.errors: Dict[str, int] = {}
+        self.total = 0
+        # Min-heap of (count, key); stale entries are skipped lazily
+        self._heap: List[Tuple[int, str]] = []
+
+    def add(self, key: str, n: int = 1) -> int:
+        """Count key and return its (over)estimate"""
+        self.total += n
+        if key in self.counts:
+            self.counts[key] += n
+        elif len(self.counts) < self.capacity:
+            self.counts[key] = n
+            self.errors[key] = 0
+        else:
+            min_count, min_key = self._pop_min()
+            del self.counts[min_key]
+            del self.errors[min_key]
+            self.counts[key] = min_count + n
+            self.errors[key] = min_count
+
+        heapq.heappush(self._heap, (self.counts[key], key))
+        if len(self._heap) > 4 * self.capacity:
+            self._heap = [(count, k) for k, count in self.counts.items()]
+            heapq.heapify(self._heap)
+        return self.counts[key]
+
+    def _pop_min(self) -> Tuple[int, str]:
+        while True:
+            count, key = heapq.heappop(self._heap)
+            if self.counts.get(key) == count:
+                return count, key
+
+    def error_bound(self) -> float:
+        """Maximum overestimate of any tracked count, N / capacity"""
+        return self.total / self.capacity
+
+
+class HeavyHitterCounter:
+    """Top-k counter backed by Space-Saving and Count-Min sketches"""
+
+    def __init__(self, capacity: int = 1000, width: int = 2048, depth: int = 4, top_k: int = 10):
+        self.summary = SpaceSaving(capacity)
+        self.sketch = CountMinSketch(width, depth)
+        self.top_k = top_k
+
+    @classmethod
+    def from_memory_budget(cls, budget_bytes: int, depth: int = 4, top_k: int = 10) -> "HeavyHitterCounter":
+        """Split a byte budget evenly between the two sketches"""
+        half = max(budget_bytes // 2, 1)
+        capacity = max(half // _BYTES_PER_TRACKED_KEY, top_k)
+        width = max(half // (_BYTES_PER_CMS_CELL * depth), 16)
+        return cls(capacity, width, depth, top_k)
+
+    def add(self, key: str, n: int = 1):
+        self.summary.add(key, n)
+        self.sketch.add(key, n)
+
+    def __getitem__(self, key: str) -> int:
+        if key in self.summary.counts:
+            return min(self.summary.counts[key], self.sketch[key])
+        return self.sketch[key]
+
+    def __len__(self) -> int:
+        return len(self.summary.counts)
+
+    def items(self):
+        return self.summary.counts.items()
+
+    def most_common(self, n: int = 10) -> List[Tuple[str, int]]:
+        # Tracked keys only; capacity is small and fixed, so this sort is bounded
+        return sorted(self.summary.counts.items(), key=lambda x: x[1], reverse=True)[:n]
+
+    def error_bounds(self) -> Dict[str, float]:
+        return {
+            "space_saving": self.summary.error_bound(),
+            "count_min": self.sketch.error_bound()
+        }
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "type": "sketch",
+            "capacity": self.summary.capacity,
+            "width": self.sketch.width,
+            "depth": self.sketch.depth,
+            "total": self.summary.total,
+            "counters": {key: [count, self.summary.errors[key]] for key, count in self.summary.counts.items()},
+            "count_min": base64.b64encode(self.sketch.table.tobytes()).decode("ascii")
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any], top_k: int = 10) -> "HeavyHitterCounter":
+        counter = cls(data["capacity"], data["width"], data["depth"], top_k)
+        counter.summary.total = counter.sketch.total = data.get("total", 0)
+        for key, (count, error) in data.get("counters", {}).items():
+            counter.summary.counts[key] = count
+            counter.summary.errors[key] = error
+        counter.summary._heap = [(count, key) for key, count in counter.summary.counts.items()]
+        heapq.heapify(counter.summary._heap)
+        if data.get("count_min"):
+            counter.sketch.table = array("q", base64.b64decode(data["count_min"]))
+        return counter